@@ -0,0 +1,188 @@
+# app/ss2gd/audio_devices.py
+from __future__ import annotations
+import os, sys, time, atexit, threading, subprocess
+from typing import List, Optional, Tuple
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[audio] {msg}", file=sys.stderr, flush=True)
+
+# 監視していない（短命プロセス）場合のスナップショット有効期限
+_UNWATCHED_TTL = 2.0
+# イベントが連続した時にまとめて再取得するまでの待ち
+_DEBOUNCE = 0.1
+
+# ------ backends ------
+def _pulsectl():
+    """pulsectl（libpulse ネイティブプロトコル）があれば返す。無ければ None。"""
+    try:
+        import pulsectl  # type: ignore
+        return pulsectl
+    except Exception:
+        return None
+
+def _snapshot_native(pulse) -> Tuple[Optional[str], List[str]]:
+    sink = pulse.server_info().default_sink_name or None
+    sources = [s.name for s in pulse.source_list()]
+    return sink, sources
+
+def _snapshot_pactl() -> Tuple[Optional[str], List[str]]:
+    """従来の pactl 出力パース（フォールバック）"""
+    sink = None
+    r = subprocess.run(["pactl", "info"], capture_output=True, text=True, check=False)
+    for line in r.stdout.splitlines():
+        if "Default Sink:" in line:
+            sink = line.split(":", 1)[1].strip() or None
+            break
+    sources: List[str] = []
+    r2 = subprocess.run(["pactl", "list", "short", "sources"], capture_output=True, text=True, check=False)
+    for ln in r2.stdout.splitlines():
+        cols = ln.split()
+        if len(cols) >= 2:
+            sources.append(cols[1])
+    return sink, sources
+
+# ------ registry ------
+class AudioDeviceRegistry:
+    """
+    PulseAudio / PipeWire(pipewire-pulse) のデバイス一覧キャッシュ。
+    一度だけ問い合わせ、watch() 後は変更イベント購読で自動更新する。
+    問い合わせはメモリ参照のみ（fork しない）。
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sink: Optional[str] = None
+        self._sources: List[str] = []
+        self._stamp = 0.0          # 0 = 未取得
+        self._watching = False
+        self._stop = threading.Event()
+        self._proc: Optional[subprocess.Popen] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- queries ----
+    def default_sink(self) -> Optional[str]:
+        self._ensure_fresh()
+        return self._sink
+
+    def sources(self) -> List[str]:
+        self._ensure_fresh()
+        return list(self._sources)
+
+    def monitor_sources(self) -> List[str]:
+        """*.monitor のソースのみ"""
+        return [s for s in self.sources() if ".monitor" in s]
+
+    def default_monitor(self) -> Optional[str]:
+        """Default Sink の .monitor → 無ければ最初の monitor"""
+        self._ensure_fresh()
+        with self._lock:
+            sink, sources = self._sink, self._sources
+        if sink:
+            return sink + ".monitor"
+        for s in sources:
+            if "monitor" in s:
+                return s
+        return None
+
+    # ---- update ----
+    def refresh(self) -> None:
+        """即時に再取得（設定ダイアログの Refresh 等）"""
+        pc = _pulsectl()
+        try:
+            if pc is not None:
+                with pc.Pulse("ss2gd-audio-query") as pulse:
+                    sink, sources = _snapshot_native(pulse)
+            else:
+                sink, sources = _snapshot_pactl()
+        except Exception as e:
+            _dbg(f"query failed: {e}")
+            sink, sources = None, []
+        self._store(sink, sources)
+
+    def _store(self, sink: Optional[str], sources: List[str]) -> None:
+        with self._lock:
+            self._sink, self._sources, self._stamp = sink, list(sources), time.monotonic()
+        _dbg(f"default sink={sink!r}, {len(sources)} sources")
+
+    def _ensure_fresh(self) -> None:
+        if self._stamp and (self._watching or time.monotonic() - self._stamp < _UNWATCHED_TTL):
+            return
+        self.refresh()
+
+    # ---- change events ----
+    def watch(self) -> "AudioDeviceRegistry":
+        """常駐プロセス向け：変更イベントを購読してキャッシュを最新に保つ（冪等）"""
+        with self._lock:
+            if self._watching:
+                return self
+            self._watching = True
+        self._stop.clear()
+        target = self._watch_native if _pulsectl() is not None else self._watch_pactl
+        self._thread = threading.Thread(target=target, name="ss2gd-audio-watch", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        p = self._proc
+        if p and p.poll() is None:
+            try: p.terminate()
+            except Exception: pass
+        with self._lock:
+            self._watching = False
+
+    def _watch_native(self) -> None:
+        pc = _pulsectl()
+        def on_event(_ev):
+            raise pc.PulseLoopStop
+        try:
+            with pc.Pulse("ss2gd-audio-watch") as pulse:
+                self._store(*_snapshot_native(pulse))
+                pulse.event_mask_set("sink", "source", "server")
+                pulse.event_callback_set(on_event)
+                while not self._stop.is_set():
+                    pulse.event_listen(timeout=1.0)
+                    if self._stop.is_set():
+                        break
+                    self._store(*_snapshot_native(pulse))
+        except Exception as e:
+            _dbg(f"native watch failed, fallback to pactl: {e}")
+            if not self._stop.is_set():
+                self._watch_pactl()
+
+    def _watch_pactl(self) -> None:
+        """`pactl subscribe` を 1 プロセスだけ常駐させ、関係イベントで再取得"""
+        self.refresh()
+        try:
+            self._proc = subprocess.Popen(["pactl", "subscribe"], stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, text=True)
+        except Exception as e:
+            _dbg(f"pactl subscribe failed: {e}")
+            with self._lock:
+                self._watching = False    # TTL ベースに戻す
+            return
+        pending: List[threading.Timer] = []
+        def flush() -> None:
+            pending.clear()
+            self.refresh()
+        for line in self._proc.stdout:
+            if self._stop.is_set():
+                break
+            if (" on sink" in line or " on source" in line or " on server" in line) and not pending:
+                t = threading.Timer(_DEBOUNCE, flush); t.daemon = True
+                pending.append(t); t.start()
+        with self._lock:
+            self._watching = False
+
+_registry: Optional[AudioDeviceRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_audio_registry() -> AudioDeviceRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AudioDeviceRegistry()
+            atexit.register(_registry.close)
+        return _registry
+
+__all__ = ["AudioDeviceRegistry", "get_audio_registry"]
@@ -0,0 +1,211 @@
+# app/ss2gd/bandwidth.py
+"""
+アップロードの帯域制限（トークンバケット）と優先度。
+
+長い録画のアップロードが上り回線を使い切ると、通話が途切れ、その間に撮ったスクショも
+録画の後ろで待たされる。
+  - 上限は settings.json の "bandwidth"：
+      {"limit_kbps": 0, "metered_kbps": 2000,
+       "schedule": [{"from": "09:00", "to": "18:00", "kbps": 4000}]}
+    schedule（最初に一致したもの）→ 従量制回線なら metered_kbps → limit_kbps の順。0 = 無制限
+  - 従量制かどうかは NetworkManager の Metered（busctl。SS2GD_METERED=1/0 で上書き）
+  - 制御はチャンクの境界で行う。録画は次のチャンクを送る前に
+      1) バケットからチャンク分のトークンを取り
+      2) 優先度の高い転送（スクショ）があれば終わるのを待つ
+    スクショはバケットを待たない（取った分は後続の録画チャンクが返す）
+  - 上限がある時は録画のチャンクを小さくする（1 チャンク ≒ CHUNK_SECONDS 秒）。
+    割り込みの待ち時間もこれで決まる
+  - スクショは CLI など別プロセスのこともあるので、転送中は CFG_DIR/uploads/ に印を置く
+"""
+from __future__ import annotations
+import os, sys, time, itertools, threading, subprocess
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from .config import CFG_DIR, get_settings
+from .tracing import span
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[bw] {msg}", file=sys.stderr, flush=True)
+
+PRIO_SHOT = 0
+PRIO_VIDEO = 1
+
+ALIGN = 256 * 1024          # resumable のチャンクは 256 KiB の倍数
+CHUNK_SECONDS = 2.0
+PREEMPT_MAX = 60.0          # セッションが切れないよう、割り込みで待つのはここまで
+METERED_TTL = 60.0
+MARK_DIR = CFG_DIR / "uploads"
+
+_metered: Optional[tuple] = None   # (値, 調べた時刻)
+
+def is_metered() -> bool:
+    global _metered
+    env = os.environ.get("SS2GD_METERED")
+    if env:
+        return env not in ("0", "no", "false")
+    now = time.monotonic()
+    if _metered and now - _metered[1] < METERED_TTL:
+        return _metered[0]
+    val = False
+    try:
+        # NMMetered: 1 = yes, 3 = guess-yes
+        r = subprocess.run(["busctl", "--system", "get-property", "org.freedesktop.NetworkManager",
+                            "/org/freedesktop/NetworkManager", "org.freedesktop.NetworkManager", "Metered"],
+                           capture_output=True, text=True, timeout=2.0, check=False)
+        val = r.returncode == 0 and r.stdout.split()[-1:] in (["1"], ["3"])
+    except Exception as e:
+        _dbg(f"metered check failed: {e}")
+    _metered = (val, now)
+    return val
+
+def current_limit(now: Optional[float] = None) -> int:
+    """今の上限（bytes/s、0 = 無制限）"""
+    st = get_settings()
+    t = time.localtime(now)
+    cur = t.tm_hour * 60 + t.tm_min
+    for a, b, kbps in st.upload_schedule:
+        # 日をまたぐ範囲（22:00-06:00）も
+        if (a <= cur < b) if a <= b else (cur >= a or cur < b):
+            return kbps * 1000 // 8
+    if st.upload_metered_kbps and is_metered():
+        return st.upload_metered_kbps * 1000 // 8
+    return st.upload_limit_kbps * 1000 // 8
+
+class TokenBucket:
+    """rate: bytes/s（0 = 無制限）。burst を超える要求は借りて、次の呼び出しが返す"""
+    def __init__(self, rate: int = 0, burst: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self._tokens = 0.0
+        self._t = time.monotonic()
+
+    def _fill(self) -> None:
+        now = time.monotonic()
+        cap = self.burst or self.rate * CHUNK_SECONDS
+        self._tokens = min(cap, self._tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def set_rate(self, rate: int) -> None:
+        with self._lock:
+            if rate != self.rate:
+                self._fill()
+                self.rate = rate
+                _dbg(f"rate -> {rate} B/s")
+
+    def consume(self, n: int, wait: bool = True) -> float:
+        """n バイト分のトークンを取る（足りなければ貯まるまで待つ）。戻り: 待った秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                if not self.rate:
+                    self._tokens = 0.0
+                    return waited
+                self._fill()
+                if self._tokens >= 0 or not wait:
+                    self._tokens -= n
+                    return waited
+                need = -self._tokens / self.rate
+            # 上限の変更に追従できるよう細切れに寝る
+            d = min(need, 0.5)
+            time.sleep(d)
+            waited += d
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+class UploadScheduler:
+    def __init__(self, mark_dir: os.PathLike | str = MARK_DIR):
+        self._cond = threading.Condition()
+        self._active: Dict[int, int] = {}
+        self._seq = itertools.count()
+        self._mark_dir = os.fspath(mark_dir)
+        self.bucket = TokenBucket()
+
+    @contextmanager
+    def transfer(self, prio: int) -> Iterator[None]:
+        """1 つのアップロードの間。優先度の高い転送がある間、低い方はチャンク境界で止まる"""
+        mark = None
+        if prio == PRIO_SHOT:
+            mark = os.path.join(self._mark_dir, f"{prio}.{os.getpid()}.{next(self._seq)}")
+            try:
+                os.makedirs(self._mark_dir, exist_ok=True)
+                open(mark, "w").close()
+            except OSError:
+                mark = None
+        with self._cond:
+            self._active[prio] = self._active.get(prio, 0) + 1
+        try:
+            yield
+        finally:
+            if mark:
+                try: os.remove(mark)
+                except OSError: pass
+            with self._cond:
+                self._active[prio] -= 1
+                self._cond.notify_all()
+
+    def _higher(self, prio: int) -> bool:
+        if any(n for p, n in self._active.items() if p < prio):
+            return True
+        # 別プロセスの転送（落ちたプロセスの印は消す）
+        try:
+            names = os.listdir(self._mark_dir)
+        except OSError:
+            return False
+        me = os.getpid()
+        for name in names:
+            try:
+                p, pid, _ = name.split(".")
+                p, pid = int(p), int(pid)
+            except ValueError:
+                continue
+            if pid == me or p >= prio:
+                continue
+            if _alive(pid):
+                return True
+            try: os.remove(os.path.join(self._mark_dir, name))
+            except OSError: pass
+        return False
+
+    def chunk(self, prio: int, nbytes: int) -> None:
+        """次のチャンクを送る直前に呼ぶ"""
+        self.bucket.set_rate(current_limit())
+        waited = self.bucket.consume(nbytes, wait=prio > PRIO_SHOT)
+        if waited:
+            _dbg(f"shaped {nbytes} bytes: waited {waited:.2f}s")
+        # バケットを待っている間に始まったスクショも先に通す（送る直前に見る）
+        if prio > PRIO_SHOT:
+            with self._cond:
+                if self._higher(prio):
+                    with span("upload.preempted", prio=prio):
+                        deadline = time.monotonic() + PREEMPT_MAX
+                        while self._higher(prio) and time.monotonic() < deadline:
+                            # 別プロセスの終了は通知されないので短い間隔で見直す
+                            self._cond.wait(min(0.2, deadline - time.monotonic()))
+
+    def chunk_size(self, default: int) -> int:
+        """上限がある時は 1 チャンク ≒ CHUNK_SECONDS 秒（256 KiB 単位）"""
+        rate = current_limit()
+        if not rate:
+            return default
+        return max(ALIGN, min(default, int(rate * CHUNK_SECONDS) // ALIGN * ALIGN))
+
+_scheduler: Optional[UploadScheduler] = None
+
+def get_scheduler() -> UploadScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = UploadScheduler()
+    return _scheduler
+
+__all__ = ["UploadScheduler", "TokenBucket", "get_scheduler", "current_limit", "is_metered",
+           "PRIO_SHOT", "PRIO_VIDEO"]
@@ -2,8 +2,9 @@
 import os, sys, argparse, webbrowser, time
 
 from .screenshot_portal import take_interactive_screenshot, PortalError
-from .drive_uploader import upload_and_share, sign_in
+from .drive_uploader import upload_and_share, sign_in, warm_up
 from .clipboard import copy_to_clipboard, keep_clipboard_alive
+from .tracing import span
 
 def _debug(msg: str):
     if os.environ.get("SS2GD_DEBUG"):
@@ -11,8 +12,65 @@ def _debug(msg: str):
 
 # ---- commands ----
 
-def cmd_shot():
+def cmd_shot(args=None):
     """矩形スクショ → Drive アップロード → クリップボード & ブラウザ"""
+    if getattr(args, "last", False):
+        with span("shot", last=True):
+            return _cmd_shot_last()
+    with span("shot"):
+        _cmd_shot()
+
+def _cmd_shot_last():
+    """前回の矩形をダイアログ無しで（ScreenCast の復元セッションから 1 フレーム）"""
+    from .config import get_last_region
+    from .fast_shot import get_fast_shooter
+    rect = get_last_region()
+    warm_up()
+    if not rect:
+        # 初回だけ矩形を選ぶ（選んだ矩形は次回以降の --last に使われる）
+        from PySide6.QtWidgets import QApplication
+        from .region_select import select_rect
+        QApplication.instance() or QApplication(sys.argv)
+        try:
+            rect = select_rect()
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            sys.exit(1)
+    _debug(f"fast shot rect={rect}")
+    shooter = get_fast_shooter()
+    try:
+        link = shooter.shoot(tuple(rect), on_link=_copy_early)
+    except Exception as e:
+        print(f"Screenshot failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        shooter.close()
+    _share(link)
+
+def _copy_early(link: str):
+    """ID を先取りできた時：アップロード完了を待たずにリンクをクリップボードへ"""
+    _debug(f"early link: {link}")
+    try: copy_to_clipboard(link)
+    except Exception: pass
+
+def _share(link: str):
+    # クリップボード（失敗しても続行）
+    try:
+        copy_to_clipboard(link)
+        keep_clipboard_alive(1500)
+    except Exception:
+        pass
+
+    # 必ずブラウザも開く
+    try:
+        with span("browser.open"): webbrowser.open(link)
+    except Exception:
+        pass
+
+    print(link)
+
+def _cmd_shot():
+    warm_up()   # 矩形を選んでいる間にトークン・接続を用意
     _debug("take_interactive_screenshot()")
     try:
         # attempt 1
@@ -32,22 +90,12 @@ def cmd_shot():
     if path.lower().endswith((".jpg", ".jpeg")):
         mime = "image/jpeg"
 
-    link = upload_and_share(path, mime, os.path.basename(path))
-
-    # クリップボード（失敗しても続行）
     try:
-        copy_to_clipboard(link)
-        keep_clipboard_alive(1500)
-    except Exception:
-        pass
-
-    # 必ずブラウザも開く
-    try:
-        webbrowser.open(link)
-    except Exception:
-        pass
-
-    print(link)
+        link = upload_and_share(path, mime, os.path.basename(path), on_link=_copy_early)
+    except Exception as e:
+        print(f"Upload failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    _share(link)
 
 def cmd_auth():
     """Googleサインイン（必要なら）"""
@@ -75,7 +123,7 @@ def cmd_record(args):
     fps = int(getattr(args, "fps", 30))
     _debug(f"record duration={dur}s fps={fps}")
 
-    path = record_region_to_file(duration_sec=dur, framerate=fps)
+    path = record_region_to_file(duration_sec=dur, framerate=fps, **_record_geom(args))
     link = upload_recorded_file(path)
 
     try:
@@ -84,15 +132,92 @@ def cmd_record(args):
     except Exception:
         pass
     try:
-        webbrowser.open(link)
+        with span("browser.open"): webbrowser.open(link)
     except Exception:
         pass
     print(link)
 
-def cmd_record_ui(_args):
+def cmd_recordings(args):
+    """進行中の録画を一覧／停止（別プロセスの UI が始めた録画も対象）"""
+    from .recorder import list_recordings, stop_recording
+    recs = list_recordings()
+    if args.stop or args.stop_all:
+        ids = [r.id for r in recs] if args.stop_all else [args.stop]
+        for rid in ids:
+            link = stop_recording(rid, open_browser=not args.no_open, copy_link=not args.no_open)
+            if link: print(f"{rid}  {link}")
+        return
+    if not recs:
+        print("No active recordings")
+        return
+    for r in recs:
+        ts = time.strftime("%H:%M:%S", time.localtime(r.started))
+        rect = "x".join(str(v) for v in r.rect[2:]) + f"+{r.rect[0]}+{r.rect[1]}" if r.rect else "-"
+        print(f"{r.id}  pid={r.pid}  since {ts}  region={rect}  {r.file}")
+
+def cmd_history(args):
+    """ローカルのアップロード履歴を検索（Drive API は呼ばない）"""
+    import json
+    from .history import get_history
+    h = get_history()
+    q = " ".join(args.query or [])
+    t0 = time.perf_counter()
+    rows = h.search(q, limit=args.limit, kind=args.kind)
+    _debug(f"history query {q!r}: {len(rows)} rows in {(time.perf_counter()-t0)*1000:.1f} ms")
+
+    if args.json:
+        print(json.dumps([r.to_dict() for r in rows], ensure_ascii=False, indent=2))
+        return
+    for r in rows:
+        ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(r.uploaded))
+        print(f"{ts}  {(r.kind or '-'):<8} {r.name}  {r.link}")
+
+    if rows and (args.copy or args.open):
+        link = rows[0].link
+        if args.copy:
+            try:
+                copy_to_clipboard(link)
+                keep_clipboard_alive(1500)
+            except Exception:
+                pass
+        if args.open:
+            try: webbrowser.open(link)
+            except Exception: pass
+
+def cmd_gc(args):
+    """録画・一時ファイルの掃除（--dry-run は消さずに一覧）"""
+    from .retention import get_retention
+    policy = {}
+    if args.max_mb is not None: policy["max_bytes"] = args.max_mb << 20
+    if args.max_age_days is not None: policy["max_age"] = args.max_age_days * 86400.0
+    if args.include_unuploaded: policy["evict_unuploaded"] = True
+    r = get_retention().collect(dry_run=args.dry_run, **policy)
+    for f in r["removed"]:
+        print(f"{'would remove' if args.dry_run else 'removed'}  {f['size'] / 1e6:8.1f} MB  "
+              f"{'uploaded' if f['uploaded'] else 'LOCAL ONLY':<10}  {f['reason']:<24}  {f['path']}")
+    for path, err in r["failed"]:
+        print(f"failed  {path}: {err}", file=sys.stderr)
+    print(f"{len(r['removed'])} files, {r['freed'] / 1e6:.1f} MB {'would be ' if args.dry_run else ''}freed; "
+          f"{r['total_after'] / 1e6:.1f} MB kept")
+
+def cmd_record_ui(args):
     """Start/Stop ができる録画専用UIを起動（起動直後に矩形選択）"""
     from .ui.record import run_window
-    run_window()
+    run_window(stream=args.stream, dual=args.dual, **_record_geom(args))
+
+def _record_geom(args) -> dict:
+    """--max-width/--max-height/--pixels/--vfr（未指定は設定値）"""
+    mw, mh = getattr(args, "max_width", None), getattr(args, "max_height", None)
+    return {"max_size": None if mw is None and mh is None else (mw or 0, mh or 0),
+            "pixel_mode": getattr(args, "pixels", None), "vfr": getattr(args, "vfr", None)}
+
+def _add_record_geom(p) -> None:
+    p.add_argument("--max-width", type=int, help="cap output width (keeps aspect; 0 = no cap)")
+    p.add_argument("--max-height", type=int, help="cap output height (keeps aspect; 0 = no cap)")
+    p.add_argument("--pixels", choices=["physical", "logical"],
+                   help="record HiDPI screens at native (physical) or scaled (logical) resolution")
+    p.add_argument("--vfr", action=argparse.BooleanOptionalAction, default=None,
+                   help="variable frame rate: only encode frames where the screen changed")
 
 # ---- entrypoint ----
 
@@ -100,7 +225,9 @@ def main():
     p = argparse.ArgumentParser(prog="ss2gd")
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("shot")
+    p_shot = sub.add_parser("shot")
+    p_shot.add_argument("--last", action="store_true",
+                        help="re-capture the last selected region without a dialog (ScreenCast restore token)")
     sub.add_parser("auth")
     sub.add_parser("settings")
 
@@ -110,18 +237,47 @@ def main():
     p_rec = sub.add_parser("record")
     p_rec.add_argument("--duration", type=int, default=5)
     p_rec.add_argument("--fps", type=int, default=30)
+    _add_record_geom(p_rec)
 
     # ★ 録画UI
-    sub.add_parser("record-ui")
+    p_recui = sub.add_parser("record-ui")
+    _add_record_geom(p_recui)
+    p_recui.add_argument("--stream", action=argparse.BooleanOptionalAction, default=None,
+                         help="upload while recording instead of writing a file first")
+    p_recui.add_argument("--dual", action=argparse.BooleanOptionalAction, default=None,
+                         help="also encode a low-bitrate copy in the same pipeline and upload that one")
+
+    p_recs = sub.add_parser("recordings", help="list / stop recordings in progress")
+    p_recs.add_argument("--stop", metavar="ID", help="stop one recording and upload it")
+    p_recs.add_argument("--stop-all", action="store_true", help="stop and upload every recording")
+    p_recs.add_argument("--no-open", action="store_true", help="don't copy/open the link")
+
+    p_gc = sub.add_parser("gc", help="delete uploaded recordings / temp files over the size or age limit")
+    p_gc.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    p_gc.add_argument("--max-mb", type=int, help="size budget (default: settings retention.max_mb)")
+    p_gc.add_argument("--max-age-days", type=int, help="age limit for uploaded files (default: settings)")
+    p_gc.add_argument("--include-unuploaded", action="store_true",
+                      help="also delete recordings that were never uploaded when over budget")
+
+    p_hist = sub.add_parser("history", help="search uploaded links (local index)")
+    p_hist.add_argument("query", nargs="*", help="words matched against file name / path / type")
+    p_hist.add_argument("-n", "--limit", type=int, default=20)
+    p_hist.add_argument("--kind", choices=["shot", "record"], help="filter by capture type")
+    p_hist.add_argument("--json", action="store_true")
+    p_hist.add_argument("--copy", action="store_true", help="copy the newest match to the clipboard")
+    p_hist.add_argument("--open", action="store_true", help="open the newest match in the browser")
 
     a = p.parse_args()
 
-    if a.cmd == "shot":     return cmd_shot()
+    if a.cmd == "shot":     return cmd_shot(a)
     if a.cmd == "auth":     return cmd_auth()
     if a.cmd == "settings": return cmd_settings()
     if a.cmd == "tray":     return cmd_tray(a)
     if a.cmd == "record":   return cmd_record(a)
     if a.cmd == "record-ui":return cmd_record_ui(a)
+    if a.cmd == "history":  return cmd_history(a)
+    if a.cmd == "recordings": return cmd_recordings(a)
+    if a.cmd == "gc":       return cmd_gc(a)
 
 if __name__ == "__main__":
     main()
@@ -3,11 +3,17 @@ import sys
 from PySide6.QtGui import QGuiApplication, QClipboard
 from PySide6.QtCore import QMimeData, QEventLoop, QTimer
 
+from .tracing import span
+
 def _app() -> QGuiApplication:
     return QGuiApplication.instance() or QGuiApplication(sys.argv)
 
 def copy_to_clipboard(text: str) -> None:
     """テキストをクリップボード（+ X11 の Selection があればそこにも）に入れる。"""
+    with span("clipboard"):
+        _copy(text)
+
+def _copy(text: str) -> None:
     app = _app()
     cb: QClipboard = app.clipboard()
     mime = QMimeData()
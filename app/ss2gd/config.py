@@ -1,7 +1,9 @@
 # app/ss2gd/config.py
 from __future__ import annotations
-import os, json
+import os, json, copy, threading
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 APP_ID = "com.ss2gd.SS2GDrive"
 
@@ -25,19 +27,213 @@ SETTINGS_PATH      = CFG_DIR / "settings.json"
 CLIENT_SECRET_PATH = CFG_DIR / "client_secret.json"
 TOKEN_PATH         = CFG_DIR / "token.json"
 
+@dataclass(frozen=True)
+class EncodeProfile:
+    """録画の出力 1 本分。0 はエンコーダの既定（大きさは無制限）"""
+    video_kbps: int = 0
+    audio_kbps: int = 128
+    max_width: int = 0
+    max_height: int = 0
+
+    @classmethod
+    def from_dict(cls, d: Any, default: "EncodeProfile") -> "EncodeProfile":
+        d = d if isinstance(d, dict) else {}
+        def _n(key: str) -> int:
+            try: return max(0, int(d.get(key, getattr(default, key)) or 0))
+            except Exception: return getattr(default, key)
+        return cls(**{k: _n(k) for k in ("video_kbps", "audio_kbps", "max_width", "max_height")})
+
+# 2 本同時に書く時の共有用（アップロードする方）の既定
+SHARE_PROFILE = EncodeProfile(video_kbps=1000, audio_kbps=64, max_width=1280, max_height=720)
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    settings.json の型付きビュー（読み取り専用）。
+    ホットパスではこちらを使う。未知キーは raw / get() から参照できる。
+    """
+    upload_folder_id: Optional[str] = None
+    upload_folder_path: Optional[str] = None   # 例 "SS2GDrive/{kind}/%Y/%m"（upload_folder_id 配下、無ければマイドライブ直下）
+    publish_anyone: bool = True
+    image_format: str = "png"
+    jpeg_quality: int = 90
+    audio_mode: str = "auto"
+    audio_device: Optional[str] = None
+    screencast_restore_token: Optional[str] = None
+    record_max_width: int = 0            # 0 = 無制限
+    record_max_height: int = 0
+    record_pixel_mode: str = "physical"  # physical: 画面の実ピクセル / logical: スケーリング後の論理ピクセル
+    record_vfr: bool = False             # 画面に変化があったフレームだけを符号化
+    record_stream: bool = False          # ファイルを経由せず録画しながら Drive へ送る
+    record_keep_local: bool = True       # ストリーミング時もローカルに保存する（I/O 優先度 idle）
+    record_dual: bool = False            # 保存用（archive）と共有用（share）を 1 回のキャプチャから同時に書く
+    record_archive: EncodeProfile = EncodeProfile()        # 大きさの上限は record_max_width/height
+    record_share: EncodeProfile = SHARE_PROFILE            # アップロードする方（dual の時だけ）
+    retention_max_mb: int = 0            # 録画・一時ファイルの合計上限（0 = 無制限）
+    retention_max_age_days: int = 0      # これより古いアップロード済みファイルは消す（0 = 無期限）
+    retention_evict_unuploaded: bool = False  # 上限を超えたら未アップロードの録画も消す
+    upload_limit_kbps: int = 0           # アップロードの帯域上限（0 = 無制限）
+    upload_metered_kbps: int = 0         # 従量制回線での上限（0 = limit_kbps と同じ）
+    upload_schedule: Tuple[Tuple[int, int, int], ...] = ()   # (開始分, 終了分, kbps)。時間帯ごとの上限
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Settings":
+        d = d if isinstance(d, dict) else {}
+        audio = d.get("audio") if isinstance(d.get("audio"), dict) else {}
+        try:
+            quality = int(d.get("jpeg_quality", 90))
+        except Exception:
+            quality = 90
+        tok = d.get("screencast_restore_token")
+        rec = d.get("record") if isinstance(d.get("record"), dict) else {}
+        def _px(key: str) -> int:
+            try: return max(0, int(rec.get(key) or 0))
+            except Exception: return 0
+        pixel_mode = str(rec.get("pixel_mode") or "physical").lower().strip()
+        ret = d.get("retention") if isinstance(d.get("retention"), dict) else {}
+        def _n(key: str) -> int:
+            try: return max(0, int(ret.get(key) or 0))
+            except Exception: return 0
+        bw = d.get("bandwidth") if isinstance(d.get("bandwidth"), dict) else {}
+        def _kbps(v: Any) -> int:
+            try: return max(0, int(v or 0))
+            except Exception: return 0
+        schedule = []
+        for r in bw.get("schedule") or []:
+            try:
+                a, b = (int(h) * 60 + int(m) for h, m in (str(r[k]).split(":") for k in ("from", "to")))
+                schedule.append((a, b, _kbps(r.get("kbps"))))
+            except Exception:
+                continue
+        return cls(
+            upload_folder_id=(d.get("upload_folder_id") or None),
+            upload_folder_path=(str(d.get("upload_folder_path") or "").strip().strip("/") or None),
+            publish_anyone=bool(d.get("publish_anyone", True)),
+            image_format=str(d.get("image_format") or "png").lower(),
+            jpeg_quality=quality,
+            audio_mode=str(audio.get("mode") or "auto").lower().strip(),
+            audio_device=(str(audio.get("device") or "").strip() or None),
+            screencast_restore_token=tok if isinstance(tok, str) and tok else None,
+            record_max_width=_px("max_width"),
+            record_max_height=_px("max_height"),
+            record_pixel_mode=pixel_mode if pixel_mode in ("physical", "logical") else "physical",
+            record_vfr=bool(rec.get("vfr", False)),
+            record_stream=bool(rec.get("stream", False)),
+            record_keep_local=bool(rec.get("keep_local", True)),
+            record_dual=bool(rec.get("dual", False)),
+            record_archive=EncodeProfile.from_dict(rec.get("archive"), EncodeProfile()),
+            record_share=EncodeProfile.from_dict(rec.get("share"), SHARE_PROFILE),
+            retention_max_mb=_n("max_mb"),
+            retention_max_age_days=_n("max_age_days"),
+            retention_evict_unuploaded=bool(ret.get("evict_unuploaded", False)),
+            upload_limit_kbps=_kbps(bw.get("limit_kbps")),
+            upload_metered_kbps=_kbps(bw.get("metered_kbps")),
+            upload_schedule=tuple(schedule),
+            raw=d,
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.raw.get(key, default)
+
+SettingsListener = Callable[[Settings], None]
+
+class _SettingsCache:
+    """
+    settings.json のメモリキャッシュ。
+    アクセス毎に stat（mtime_ns/size/inode）だけで検証し、変わった時だけ再パースする。
+    設定ダイアログは別プロセスなので、変更はここで検知して購読者へ通知する。
+    """
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._sig: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+        self._obj = Settings()
+        self._listeners: List[SettingsListener] = []
+
+    def _stat_sig(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self) -> Settings:
+        sig = self._stat_sig()
+        if self._loaded and sig == self._sig:
+            return self._obj
+        return self._reload(sig)
+
+    def _reload(self, sig: Optional[Tuple[int, int, int]]) -> Settings:
+        changed = False
+        with self._lock:
+            if not (self._loaded and sig == self._sig):
+                d: Dict[str, Any] = {}
+                if sig is not None:
+                    try:
+                        d = json.loads(self._path.read_text(encoding="utf-8"))
+                    except Exception:
+                        d = {}
+                new = Settings.from_dict(d)
+                changed = self._loaded and new.raw != self._obj.raw
+                self._obj, self._sig, self._loaded = new, sig, True
+            obj = self._obj
+        if changed:
+            self._notify(obj)
+        return obj
+
+    def store(self, d: Dict[str, Any]) -> None:
+        """save_settings 直後に呼ぶ。再読込せずにキャッシュを差し替える。"""
+        with self._lock:
+            new = Settings.from_dict(copy.deepcopy(d))
+            changed = self._loaded and new.raw != self._obj.raw
+            self._obj, self._sig, self._loaded = new, self._stat_sig(), True
+        if changed:
+            self._notify(new)
+
+    def subscribe(self, cb: SettingsListener) -> Callable[[], None]:
+        with self._lock:
+            self._listeners.append(cb)
+        def unsubscribe() -> None:
+            with self._lock:
+                try: self._listeners.remove(cb)
+                except ValueError: pass
+        return unsubscribe
+
+    def _notify(self, obj: Settings) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for cb in listeners:
+            try:
+                cb(obj)
+            except Exception:
+                pass
+
+_settings_cache = _SettingsCache(SETTINGS_PATH)
+
+def get_settings() -> Settings:
+    """キャッシュ済みの型付き設定を返す（変更があれば自動で再読込）。"""
+    return _settings_cache.get()
+
+def refresh_settings() -> Settings:
+    """ファイル監視（QFileSystemWatcher 等）から呼ぶ。変更があれば購読者へ通知される。"""
+    return _settings_cache.get()
+
+def subscribe_settings(cb: SettingsListener) -> Callable[[], None]:
+    """設定変更の購読。戻り値を呼ぶと購読解除。コールバックは検知したスレッドで呼ばれる。"""
+    return _settings_cache.subscribe(cb)
+
 def load_settings() -> dict:
-    try:
-        if SETTINGS_PATH.exists():
-            return json.loads(SETTINGS_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        pass
-    return {}
+    """変更用の dict コピーを返す（キャッシュ本体は書き換えない）。"""
+    return copy.deepcopy(get_settings().raw)
 
 def save_settings(d: dict) -> None:
     CFG_DIR.mkdir(parents=True, exist_ok=True)
     tmp = SETTINGS_PATH.with_suffix(".json.tmp")
     tmp.write_text(json.dumps(d, ensure_ascii=False, indent=2), encoding="utf-8")
     os.replace(tmp, SETTINGS_PATH)
+    _settings_cache.store(d)
 
 def ensure_videos_dir() -> str:
     p = Path.home() / "Videos" / "SS2GDrive"
@@ -56,9 +252,7 @@ def load_embedded_client_config() -> dict | None:
 def get_screencast_restore_token() -> str | None:
     """保存済みの ScreenCast restore_token（無ければ None）"""
     try:
-        st = load_settings()
-        tok = st.get("screencast_restore_token")
-        return tok if isinstance(tok, str) and tok else None
+        return get_settings().screencast_restore_token
     except Exception:
         return None
 
@@ -67,3 +261,35 @@ def set_screencast_restore_token(token: str) -> None:
     st = load_settings()
     st["screencast_restore_token"] = token
     save_settings(st)
+
+# ---- last region helpers ----
+
+def get_last_region() -> tuple[int, int, int, int] | None:
+    """最後に select_rect で選んだ矩形 (x,y,w,h)（無ければ None）"""
+    try:
+        r = get_settings().get("last_region")
+        if isinstance(r, (list, tuple)) and len(r) == 4 and int(r[2]) > 0 and int(r[3]) > 0:
+            return tuple(int(v) for v in r)  # type: ignore[return-value]
+    except Exception:
+        pass
+    return None
+
+def get_last_region_scale() -> float:
+    """前回の矩形があった画面の devicePixelRatio（HiDPI の切り出し用）"""
+    try: return float(get_settings().get("last_region_scale") or 1.0)
+    except Exception: return 1.0
+
+def get_last_region_screens() -> list:
+    """前回の矩形を選んだ時の画面ごとの [x,y,w,h,devicePixelRatio]（モニタごとに比率が違う合成用）"""
+    try:
+        return [list(s) for s in get_settings().get("last_region_screens") or [] if len(s) == 5]
+    except Exception:
+        return []
+
+def set_last_region(rect: tuple[int, int, int, int], scale: float = 1.0, screens=None) -> None:
+    st = load_settings()
+    st["last_region"] = [int(v) for v in rect]
+    st["last_region_scale"] = float(scale or 1.0)
+    if screens is not None:
+        st["last_region_screens"] = [[int(v) for v in s[:4]] + [float(s[4])] for s in screens]
+    save_settings(st)
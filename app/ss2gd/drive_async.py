@@ -0,0 +1,392 @@
+# app/ss2gd/drive_async.py
+"""
+asyncio だけで書いた軽量の Drive v3 クライアント（googleapiclient / httplib2 を import しない）。
+
+SS2GD_DRIVE_CLIENT=async の時、upload_and_share はこちらを使う。
+  - 対応: resumable / multipart アップロード、permissions.create、files.get / list / create（メタデータ）、
+    files.generateIds、about.get
+  - HTTP/1.1 keep-alive の接続をホストごとにプール（最大 POOL_PER_HOST 本）。DNS/TLS は初回だけ
+  - イベントループはプロセスに 1 つ（専用スレッド）。同時に何本アップロードしてもスレッドは増えない
+  - 同期の呼び出し元には run()、ID プールやフォルダ解決には googleapiclient と同じ形の
+    files()/permissions()/about() を出す（.execute() でループに投げて待つ）
+  - トークンは token_refresher の Credentials を共有。401 なら 1 回だけ更新してやり直す
+"""
+from __future__ import annotations
+import os, ssl, sys, json, time, uuid, asyncio, threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlencode
+
+from .drive_uploader import GOOGLEAPIS, DRIVE_ENDPOINT, _metadata, _create_retry, _mtime, _EarlyLink
+from .drive_ids import view_link
+from .bandwidth import get_scheduler, PRIO_SHOT, PRIO_VIDEO
+from .token_refresher import get_token_refresher, _left
+from .config import get_settings
+from .tracing import span
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[drive-async] {msg}", file=sys.stderr, flush=True)
+
+POOL_PER_HOST = 8
+IDLE_TIMEOUT = 55.0          # これより長く寝ていた接続は使わない（サーバ側の keep-alive 切れ）
+CHUNK = 8 << 20
+MULTIPART_MAX = 5 << 20      # これ以下の画像は 1 往復の multipart
+RETRIES = 5
+
+class DriveError(RuntimeError):
+    def __init__(self, status: int, body: bytes = b""):
+        super().__init__(f"Drive API HTTP {status}: {body[:200]!r}")
+        self.status = status
+        self.body = body
+
+# ---------- HTTP/1.1 ----------
+class _Conn:
+    __slots__ = ("reader", "writer", "used")
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader, self.writer, self.used = reader, writer, time.monotonic()
+
+class _Response:
+    __slots__ = ("status", "headers", "body")
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status, self.headers, self.body = status, headers, body
+
+    def json(self) -> Any:
+        return json.loads(self.body or b"{}")
+
+Key = Tuple[str, str, int]
+
+class _Pool:
+    """(scheme, host, port) ごとのアイドル接続"""
+    def __init__(self):
+        self._idle: Dict[Key, List[_Conn]] = {}
+        self._sem: Dict[Key, asyncio.Semaphore] = {}
+        self._ssl: Optional[ssl.SSLContext] = None
+
+    def sem(self, key: Key) -> asyncio.Semaphore:
+        if key not in self._sem:
+            self._sem[key] = asyncio.Semaphore(POOL_PER_HOST)
+        return self._sem[key]
+
+    async def get(self, key: Key) -> Tuple[_Conn, bool]:
+        """戻り: (接続, 使い回しか)"""
+        idle = self._idle.get(key) or []
+        now = time.monotonic()
+        while idle:
+            c = idle.pop()
+            if now - c.used < IDLE_TIMEOUT and not c.reader.at_eof():
+                return c, True
+            c.writer.close()
+        scheme, host, port = key
+        if scheme == "https" and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        with span("drive.connect", host=host):
+            r, w = await asyncio.open_connection(host, port, ssl=self._ssl if scheme == "https" else None)
+        return _Conn(r, w), False
+
+    def put(self, key: Key, c: _Conn) -> None:
+        c.used = time.monotonic()
+        self._idle.setdefault(key, []).append(c)
+
+    def close(self) -> None:
+        for conns in self._idle.values():
+            for c in conns:
+                c.writer.close()
+        self._idle.clear()
+
+async def _read_response(r: asyncio.StreamReader, method: str) -> Tuple[_Response, bool]:
+    """戻り: (レスポンス, 接続を使い回せるか)"""
+    line = await r.readline()
+    if not line:
+        raise ConnectionResetError("connection closed by server")
+    parts = line.decode("latin-1").split(None, 2)
+    status = int(parts[1])
+    headers: Dict[str, str] = {}
+    while True:
+        h = await r.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    keep = headers.get("connection", "").lower() != "close" and parts[0] == "HTTP/1.1"
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return _Response(status, headers, b""), keep
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            n = int((await r.readline()).split(b";")[0].strip() or b"0", 16)
+            if n == 0:
+                while (await r.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            body += await r.readexactly(n)
+            await r.readexactly(2)
+        return _Response(status, headers, bytes(body)), keep
+    if "content-length" in headers:
+        return _Response(status, headers, await r.readexactly(int(headers["content-length"]))), keep
+    return _Response(status, headers, await r.read()), False
+
+# ---------- client ----------
+class AsyncDrive:
+    def __init__(self, endpoint: Optional[str] = DRIVE_ENDPOINT):
+        self._endpoint = endpoint
+        self._pool = _Pool()
+        self._creds = None
+
+    def _url(self, url: str) -> str:
+        if self._endpoint and url.startswith(GOOGLEAPIS):
+            return self._endpoint + url[len(GOOGLEAPIS):]
+        return url
+
+    async def _token(self, force: bool = False) -> str:
+        c = self._creds
+        if force or c is None or not c.valid or _left(c) < 60:
+            # 更新はネットワーク往復なのでループの外で（同じ Credentials を全員で共有）
+            margin = float("inf") if force else 60.0
+            c = self._creds = await asyncio.to_thread(get_token_refresher().credentials, margin)
+            if c is None:
+                raise RuntimeError("Not signed in to Google Drive")
+        return c.token
+
+    async def request(self, method: str, url: str, *, params: Optional[Dict[str, Any]] = None,
+                      body: bytes = b"", headers: Optional[Dict[str, str]] = None, ok=(200,)) -> _Response:
+        url = self._url(url)
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode({k: str(v).lower() if isinstance(v, bool) else v
+                                                             for k, v in params.items() if v is not None})
+        u = urlsplit(url)
+        key: Key = (u.scheme, u.hostname or "", u.port or (443 if u.scheme == "https" else 80))
+        target = u.path + (f"?{u.query}" if u.query else "")
+        authed = False
+        for attempt in range(3):
+            hdr = {"Host": u.netloc, "Authorization": f"Bearer {await self._token(force=authed)}",
+                   "Content-Length": str(len(body)), "User-Agent": "SS2GDrive"}
+            hdr.update(headers or {})
+            head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdr.items()) + "\r\n"
+            async with self._pool.sem(key):
+                conn, reused = await self._pool.get(key)
+                try:
+                    with span("drive.request", method=method, path=u.path, conn="reused" if reused else "new"):
+                        conn.writer.write(head.encode("latin-1"))
+                        if body:
+                            conn.writer.write(body)
+                        await conn.writer.drain()
+                        resp, keep = await _read_response(conn.reader, method)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    conn.writer.close()
+                    # アイドル中にサーバが閉じていた接続：新しい接続で 1 回だけやり直す
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                if keep:
+                    self._pool.put(key, conn)
+                else:
+                    conn.writer.close()
+            if resp.status == 401 and not authed:
+                authed = True
+                continue
+            if resp.status not in ok:
+                raise DriveError(resp.status, resp.body)
+            return resp
+        raise DriveError(resp.status, resp.body)
+
+    async def call(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                   body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """JSON の API 呼び出し（path は /drive/v3/...）"""
+        data = json.dumps(body).encode() if body is not None else b""
+        hdr = {"Content-Type": "application/json; charset=UTF-8"} if body is not None else {}
+        return (await self.request(method, GOOGLEAPIS + path, params=params, body=data, headers=hdr)).json()
+
+    # ---- upload ----
+    async def upload(self, path: str, meta: Dict[str, Any], mime: str, *, prio: int = PRIO_SHOT,
+                     fields: str = "id,webViewLink") -> Dict[str, Any]:
+        size = os.path.getsize(path)
+        sched = get_scheduler()
+        with sched.transfer(prio):
+            if size <= MULTIPART_MAX and prio == PRIO_SHOT:
+                data = await asyncio.to_thread(_read_all, path)
+                await asyncio.to_thread(sched.chunk, prio, size)
+                return await self._multipart(meta, mime, data, fields)
+            return await self._resumable(path, size, meta, mime, prio, fields)
+
+    async def _multipart(self, meta: Dict[str, Any], mime: str, data: bytes, fields: str) -> Dict[str, Any]:
+        b = uuid.uuid4().hex
+        body = (f"--{b}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(meta)}\r\n"
+                f"--{b}\r\nContent-Type: {mime}\r\n\r\n").encode() + data + f"\r\n--{b}--\r\n".encode()
+        r = await self.request("POST", f"{GOOGLEAPIS}/upload/drive/v3/files",
+                               params={"uploadType": "multipart", "supportsAllDrives": True, "fields": fields},
+                               body=body, headers={"Content-Type": f'multipart/related; boundary="{b}"'})
+        return r.json()
+
+    async def _resumable(self, path: str, size: int, meta: Dict[str, Any], mime: str, prio: int,
+                         fields: str) -> Dict[str, Any]:
+        sched = get_scheduler()
+        r = await self.request("POST", f"{GOOGLEAPIS}/upload/drive/v3/files",
+                               params={"uploadType": "resumable", "supportsAllDrives": True, "fields": fields},
+                               body=json.dumps(meta).encode(),
+                               headers={"Content-Type": "application/json; charset=UTF-8",
+                                        "X-Upload-Content-Type": mime, "X-Upload-Content-Length": str(size)})
+        uri = r.headers["location"]
+        chunk = sched.chunk_size(CHUNK)
+        off, tries = 0, 0
+        with open(path, "rb") as f:
+            while True:
+                f.seek(off)
+                data = await asyncio.to_thread(f.read, chunk)
+                rng = f"bytes {off}-{off + len(data) - 1}/{size}" if data else f"bytes */{size}"
+                await asyncio.to_thread(sched.chunk, prio, len(data))
+                try:
+                    r = await self.request("PUT", uri, body=data, headers={"Content-Range": rng},
+                                           ok=(200, 201, 308))
+                except (DriveError, ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+                    if isinstance(e, DriveError) and e.status in (404, 410):
+                        raise
+                    tries += 1
+                    if tries > RETRIES:
+                        raise
+                    _dbg(f"chunk at {off} failed ({e}); resuming (try {tries})")
+                    await asyncio.sleep(min(30.0, 0.5 * 2 ** tries))
+                    # 受領済みの位置を問い合わせる
+                    try:
+                        q = await self.request("PUT", uri, headers={"Content-Range": f"bytes */{size}"},
+                                               ok=(200, 201, 308))
+                        if q.status != 308:
+                            return q.json()
+                        off = _acked(q.headers)
+                    except Exception:
+                        pass
+                    continue
+                if r.status != 308:
+                    return r.json()
+                off, tries = _acked(r.headers), 0
+
+    async def warm(self) -> None:
+        await self.call("GET", "/drive/v3/about", {"fields": "kind"})
+
+    # ---- googleapiclient 互換（同期。ID プール・フォルダ解決・warm_up 用） ----
+    def files(self) -> "_Files":
+        return _Files(self)
+
+    def permissions(self) -> "_Permissions":
+        return _Permissions(self)
+
+    def about(self) -> "_About":
+        return _About(self)
+
+def _read_all(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _acked(headers: Dict[str, str]) -> int:
+    r = headers.get("range")
+    return int(r.rsplit("-", 1)[1]) + 1 if r else 0
+
+class _Req:
+    def __init__(self, fn: Callable[[], Any]):
+        self._fn = fn
+
+    def execute(self) -> Any:
+        return run(self._fn())
+
+class _Files:
+    def __init__(self, d: AsyncDrive): self._d = d
+    def list(self, **kw) -> _Req:
+        return _Req(lambda: self._d.call("GET", "/drive/v3/files", kw))
+    def get(self, fileId: str, **kw) -> _Req:
+        return _Req(lambda: self._d.call("GET", f"/drive/v3/files/{fileId}", kw))
+    def create(self, body: Dict[str, Any], **kw) -> _Req:
+        return _Req(lambda: self._d.call("POST", "/drive/v3/files", kw, body))
+    def generateIds(self, **kw) -> _Req:
+        return _Req(lambda: self._d.call("GET", "/drive/v3/files/generateIds", kw))
+
+class _Permissions:
+    def __init__(self, d: AsyncDrive): self._d = d
+    def create(self, fileId: str, body: Dict[str, Any], **kw) -> _Req:
+        return _Req(lambda: self._d.call("POST", f"/drive/v3/files/{fileId}/permissions", kw, body))
+
+class _About:
+    def __init__(self, d: AsyncDrive): self._d = d
+    def get(self, **kw) -> _Req:
+        return _Req(lambda: self._d.call("GET", "/drive/v3/about", kw))
+
+# ---------- loop ----------
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[AsyncDrive] = None
+_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ss2gd-drive-loop", daemon=True).start()
+        return _loop
+
+def run(coro, timeout: Optional[float] = None) -> Any:
+    """同期の呼び出し元から：共有ループで実行して結果を待つ（ループのスレッドからは呼ばない）"""
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("drive_async.run() called from the Drive event loop; await instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
+def get_client() -> AsyncDrive:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = AsyncDrive()
+        return _client
+
+# ---------- upload_and_share ----------
+async def upload_and_share_async(filepath: str, mime_type: str = "image/png", description: str = "captured by SS2GDrive",
+                                 *, kind: Optional[str] = None, region=None,
+                                 on_link: Optional[Callable[[str], None]] = None) -> str:
+    """drive_uploader.upload_and_share と同じ動作（ループ上で動くので、同時に何本でも）"""
+    d = get_client()
+    kind = kind or ("record" if mime_type.startswith("video/") else "shot")
+    prio = PRIO_VIDEO if mime_type.startswith("video/") else PRIO_SHOT
+    el = _EarlyLink(on_link)
+    await asyncio.to_thread(el.announce)
+    size = os.path.getsize(filepath)
+    try:
+        with span("upload.create", size=size, mime=mime_type, preallocated=bool(el.fid), client="async") as sp:
+            refresh = False
+            for _attempt in range(3):
+                # フォルダ ID がキャッシュに無い時だけ往復する（同期 API なのでループの外で）
+                body = await asyncio.to_thread(_metadata, d, os.path.basename(filepath), description, kind,
+                                               refresh=refresh)
+                if el.fid:
+                    body["id"] = el.fid
+                try:
+                    resp = await d.upload(filepath, body, mime_type, prio=prio)
+                    break
+                except DriveError as e:
+                    nxt = _create_retry(e.status, el.fid, refresh, kind)
+                    if nxt == "discard":
+                        await asyncio.to_thread(el.discard)
+                    elif nxt == "refresh":
+                        refresh = True
+                    else:
+                        raise
+            file_id = resp["id"]; sp.set(file_id=file_id)
+        if get_settings().publish_anyone:
+            with span("upload.permission"):
+                await d.call("POST", f"/drive/v3/files/{file_id}/permissions", {"supportsAllDrives": True},
+                             {"type": "anyone", "role": "reader"})
+        link = view_link(file_id) if el.fid else resp.get("webViewLink")
+        if not link:
+            with span("upload.link"):
+                link = (await d.call("GET", f"/drive/v3/files/{file_id}",
+                                     {"fields": "webViewLink", "supportsAllDrives": True}))["webViewLink"]
+    except Exception as e:
+        el.failed(e)
+        raise
+    await asyncio.to_thread(el.done, link, name=body["name"], local_path=os.path.abspath(filepath),
+                            size=size, drive_id=file_id, kind=kind, region=region, mime=mime_type,
+                            created=_mtime(filepath))
+    return link
+
+__all__ = ["AsyncDrive", "DriveError", "get_client", "run", "upload_and_share_async"]
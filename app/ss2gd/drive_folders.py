@@ -0,0 +1,108 @@
+# app/ss2gd/drive_folders.py
+"""
+アップロード先をフォルダ ID ではなくパス（例: "SS2GDrive/{kind}/%Y/%m"）で指定する。
+
+パスの各段を files().list で引くと 1 段ごとに往復が増えるので、
+解決済みのフォルダ ID を CFG_DIR/folders.json に持つ。
+  - 無い段だけ list → 無ければ create（作ったものもキャッシュ）
+  - キャッシュは検証しない。アップロードが 404（親が消えた）になった時だけ invalidate して引き直す
+  - {kind} や日付（strftime）のテンプレートは展開後のパスで引くので、定常状態では API 呼び出し 0
+"""
+from __future__ import annotations
+import os, json, time, threading
+from typing import Dict, List, Optional
+
+from .config import CFG_DIR
+from .tracing import span
+
+FOLDER_CACHE_PATH = CFG_DIR / "folders.json"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+KIND_FOLDERS = {"shot": "Screenshots", "fastshot": "Screenshots", "record": "Recordings"}
+
+def render_path(template: str, kind: Optional[str] = None, when: Optional[float] = None) -> List[str]:
+    """テンプレート → パスの段。{kind} は Screenshots / Recordings、% は strftime"""
+    s = template.replace("{kind}", KIND_FOLDERS.get(kind or "", (kind or "Other").capitalize()))
+    s = time.strftime(s, time.localtime(when)) if "%" in s else s
+    return [seg.strip() for seg in s.replace("\\", "/").split("/") if seg.strip()]
+
+def _q(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("'", "\\'")
+
+class FolderResolver:
+    """キー "<root>/<a>/<b>" → フォルダ ID（プロセス間はファイルで共有）"""
+    def __init__(self, path: os.PathLike | str = FOLDER_CACHE_PATH):
+        self._path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[str, str]] = None
+
+    def _load(self) -> Dict[str, str]:
+        if self._cache is None:
+            try:
+                with open(self._path, "r", encoding="utf-8") as f:
+                    d = json.load(f)
+                self._cache = {str(k): str(v) for k, v in d.items()} if isinstance(d, dict) else {}
+            except Exception:
+                self._cache = {}
+        return self._cache
+
+    def _save(self) -> None:
+        tmp = f"{self._path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._cache, f, ensure_ascii=False, indent=0)
+            os.replace(tmp, self._path)
+        except OSError:
+            pass
+
+    def cached(self, segments: List[str], root: str = "root") -> Optional[str]:
+        with self._lock:
+            return self._load().get("/".join([root, *segments]))
+
+    def resolve(self, svc, segments: List[str], root: str = "root") -> str:
+        """パスのフォルダ ID。キャッシュに全段あれば API は呼ばない"""
+        hit = self.cached(segments, root)
+        if hit or not segments:
+            return hit or root
+        with self._lock, span("drive.folders", path="/".join(segments)):
+            cache = self._load()
+            parent = root
+            for i, name in enumerate(segments):
+                key = "/".join([root, *segments[:i + 1]])
+                fid = cache.get(key)
+                if not fid:
+                    fid = self._find(svc, parent, name) or self._create(svc, parent, name)
+                    cache[key] = fid
+                parent = fid
+            self._save()
+            return parent
+
+    def invalidate(self, segments: List[str], root: str = "root") -> None:
+        """404 の後に呼ぶ：その段と配下を忘れる（途中の段が消えた場合に備えて祖先も）"""
+        with self._lock:
+            cache = self._load()
+            prefix = "/".join([root, segments[0]]) if segments else root
+            for k in [k for k in cache if k == prefix or k.startswith(prefix + "/")]:
+                cache.pop(k)
+            self._save()
+
+    def _find(self, svc, parent: str, name: str) -> Optional[str]:
+        q = f"name='{_q(name)}' and mimeType='{FOLDER_MIME}' and '{_q(parent)}' in parents and trashed=false"
+        r = svc.files().list(q=q, fields="files(id)", pageSize=1, spaces="drive",
+                             supportsAllDrives=True, includeItemsFromAllDrives=True).execute()
+        files = r.get("files") or []
+        return files[0]["id"] if files else None
+
+    def _create(self, svc, parent: str, name: str) -> str:
+        body = {"name": name, "mimeType": FOLDER_MIME, "parents": [parent],
+                "appProperties": {"uploader": "SS2GDrive"}}
+        return svc.files().create(body=body, fields="id", supportsAllDrives=True).execute()["id"]
+
+_resolver: Optional[FolderResolver] = None
+
+def get_folder_resolver() -> FolderResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = FolderResolver()
+    return _resolver
+
+__all__ = ["FolderResolver", "get_folder_resolver", "render_path", "FOLDER_CACHE_PATH"]
@@ -0,0 +1,112 @@
+# app/ss2gd/drive_ids.py
+"""
+files.generateIds で先にもらっておくファイル ID のプール。
+
+ID が決まっていれば共有 URL はアップロード前に作れる（file/d/<id>/view）。
+キャプチャ直後にリンクをクリップボードへ入れ、アップロードと公開設定はその後で済ませる。
+  - CFG_DIR/file_ids.json に保存し、CLI の 1 回限りのプロセスでも使えるようにする
+  - 取り出しは flock で排他（同じ ID を 2 回使うと create が失敗する）
+  - 残りが LOW を切ったらバックグラウンドで補充。古い ID（MAX_AGE 超）は使わない
+"""
+from __future__ import annotations
+import os, sys, json, time, fcntl, threading
+from typing import Any, Callable, List, Optional
+
+from .config import CFG_DIR
+from .tracing import span
+
+ID_POOL_PATH = CFG_DIR / "file_ids.json"
+POOL_SIZE = 10
+LOW = 3
+MAX_AGE = 24 * 3600.0
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[ids] {msg}", file=sys.stderr, flush=True)
+
+def view_link(file_id: str) -> str:
+    """Drive の webViewLink と同じ形"""
+    return f"https://drive.google.com/file/d/{file_id}/view?usp=drivesdk"
+
+class IdPool:
+    def __init__(self, path: os.PathLike | str = ID_POOL_PATH):
+        self._path = os.fspath(path)
+        self._refilling = threading.Lock()
+
+    def _locked(self, fn):
+        """プール（JSON）をプロセス間ロック下で読み書きする"""
+        with open(self._path + ".lock", "a") as lk:
+            fcntl.flock(lk, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self._path, "r", encoding="utf-8") as f:
+                        d = json.load(f)
+                    fetched = float(d.get("fetched") or 0)
+                    ids: List[str] = [str(i) for i in d.get("ids") or []] if time.time() - fetched < MAX_AGE else []
+                except Exception:
+                    ids, fetched = [], 0.0
+                ids, fetched, out = fn(ids, fetched)
+                tmp = f"{self._path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"ids": ids, "fetched": fetched}, f)
+                os.replace(tmp, self._path)
+                return out
+            finally:
+                fcntl.flock(lk, fcntl.LOCK_UN)
+
+    def size(self) -> int:
+        return self._locked(lambda ids, t: (ids, t, len(ids)))
+
+    def take(self, make_svc: Optional[Callable[[], Any]] = None) -> Optional[str]:
+        """
+        ID を 1 つ取り出す（無ければ None = 通常のアップロード）。残りが少なければ補充を始める。
+        make_svc は補充スレッドの中で呼ぶ（httplib2 の接続はスレッド間で共有できないので、
+        アップロード中の svc を渡さない）
+        """
+        fid, left = self._locked(lambda ids, t: (ids[1:], t, (ids[0] if ids else None, len(ids) - 1)))
+        if make_svc is not None and left < LOW:
+            self.refill_async(make_svc)
+        return fid
+
+    def refill(self, svc, count: int = POOL_SIZE) -> int:
+        if not self._refilling.acquire(False):
+            return 0
+        try:
+            with span("drive.generate_ids", count=count):
+                new = svc.files().generateIds(count=count, space="drive", type="files").execute().get("ids") or []
+            def put(ids, t):
+                now = time.time()
+                # 取得時刻は 1 つで持つので、半分以上古いプールは入れ替える
+                return (new, now, len(new)) if now - t >= MAX_AGE / 2 else (ids + new, t, len(new))
+            n = self._locked(put)
+            _dbg(f"refilled {n} ids")
+            return n
+        except Exception as e:
+            _dbg(f"generateIds failed: {e}")
+            return 0
+        finally:
+            self._refilling.release()
+
+    def refill_async(self, make_svc: Callable[[], Any]) -> None:
+        def run() -> None:
+            try:
+                svc = make_svc()
+            except Exception as e:
+                _dbg(f"refill service failed: {e}")
+                return
+            self.refill(svc)
+        threading.Thread(target=run, name="ss2gd-ids", daemon=True).start()
+
+    def discard(self) -> None:
+        """拒否された ID があった時など：プールを空にする"""
+        self._locked(lambda ids, t: ([], 0.0, None))
+
+_pool: Optional[IdPool] = None
+
+def get_id_pool() -> IdPool:
+    global _pool
+    if _pool is None:
+        _pool = IdPool()
+    return _pool
+
+__all__ = ["IdPool", "get_id_pool", "view_link", "ID_POOL_PATH"]
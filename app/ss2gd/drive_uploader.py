@@ -1,53 +1,225 @@
-import os
-from typing import Optional
+import os, sys, time, threading
+from typing import Callable, Optional
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from .config import CLIENT_SECRET_PATH, TOKEN_PATH, load_settings, load_embedded_client_config
-SCOPES=["https://www.googleapis.com/auth/drive.file"]
-def _load_creds()->Optional[Credentials]:
-    if os.path.exists(TOKEN_PATH):
-        try: return Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-        except Exception: return None
-    return None
-def _save_creds(creds:Credentials)->None:
-    os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
-    with open(TOKEN_PATH,"w") as f: f.write(creds.to_json())
+# googleapiclient / httplib2 / oauthlib は重いので使う時に import する（async クライアントでは読まない）
+from .tracing import span
+from .history import record_upload
+from .drive_folders import get_folder_resolver, render_path
+from .drive_ids import get_id_pool, view_link, LOW as LOW_IDS
+from .notify import notify
+from .bandwidth import get_scheduler, PRIO_SHOT, PRIO_VIDEO
+from .token_refresher import SCOPES, get_token_refresher, load_creds as _load_creds, save_creds as _save_creds
+from .config import CLIENT_SECRET_PATH, get_settings, load_embedded_client_config
+GOOGLEAPIS="https://www.googleapis.com"
+# ベンチ/検証用：Drive API の向け先を差し替える（例: http://127.0.0.1:8765 の fake_drive）
+DRIVE_ENDPOINT=(os.environ.get("SS2GD_DRIVE_ENDPOINT") or "").rstrip("/") or None
+# upload_and_share の実装: "googleapiclient"（既定）| "async"（drive_async。1 つのイベントループで多重化）
+CLIENT=(os.environ.get("SS2GD_DRIVE_CLIENT") or "googleapiclient").strip().lower()
+DEBUG=bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg:str)->None:
+    if DEBUG: print(f"[drive] {msg}", file=sys.stderr, flush=True)
+class _EndpointHttp:
+    """googleapis.com 宛てのリクエスト URI を DRIVE_ENDPOINT へ書き換える薄いラッパ"""
+    def __init__(self, http, endpoint:str): self._http=http; self._ep=endpoint
+    def request(self, uri, *args, **kwargs):
+        if uri.startswith(GOOGLEAPIS): uri=self._ep+uri[len(GOOGLEAPIS):]
+        return self._http.request(uri, *args, **kwargs)
+    def __getattr__(self, name): return getattr(self._http, name)
 def sign_in(interactive:bool=True)->bool:
-    creds=_load_creds()
-    if creds and creds.valid: return True
-    if creds and creds.expired and creds.refresh_token:
-        from google.auth.transport.requests import Request
-        try: creds.refresh(Request()); _save_creds(creds); return True
-        except Exception: pass
+    try:
+        creds=get_token_refresher().credentials()
+        if creds and creds.valid: return True
+    except Exception: pass
+    from google_auth_oauthlib.flow import InstalledAppFlow
     cfg=load_embedded_client_config()
     if cfg:
         flow=InstalledAppFlow.from_client_config(cfg, SCOPES)
-        creds=flow.run_local_server(open_browser=True, port=0); _save_creds(creds); return True
-    if not os.path.exists(CLIENT_SECRET_PATH):
-        raise FileNotFoundError(f"client_secret.json not found at {CLIENT_SECRET_PATH}")
-    flow=InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_PATH, SCOPES)
-    creds=flow.run_local_server(open_browser=True, port=0); _save_creds(creds); return True
+    else:
+        if not os.path.exists(CLIENT_SECRET_PATH):
+            raise FileNotFoundError(f"client_secret.json not found at {CLIENT_SECRET_PATH}")
+        flow=InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_PATH, SCOPES)
+    creds=flow.run_local_server(open_browser=True, port=0); _save_creds(creds)
+    get_token_refresher().reload(); return True
 def is_authorized()->bool:
     c=_load_creds(); return bool(c and c.valid)
-def _service():
-    creds=_load_creds()
+def _creds()->Credentials:
+    """有効なトークン（必要なら更新。全アップローダで 1 つの Credentials を共有）"""
+    try: creds=get_token_refresher().credentials()
+    except Exception: creds=None
     if not (creds and creds.valid):
-        sign_in(interactive=True); creds=_load_creds()
-    return build("drive","v3", credentials=creds)
-def upload_and_share(filepath:str, mime_type="image/png", description="captured by SS2GDrive"):
-    st=load_settings(); folder_id=st.get("upload_folder_id"); publish=bool(st.get("publish_anyone", True))
+        sign_in(interactive=True); creds=get_token_refresher().credentials()
+    return creds
+def authorized_http(creds:Optional[Credentials]=None):
+    """認可済み httplib2（トークン期限切れは自動更新）。googleapiclient を通さない PUT 等に使う"""
+    import httplib2, google_auth_httplib2
+    http=google_auth_httplib2.AuthorizedHttp(creds or _creds(), http=httplib2.Http())
+    return _EndpointHttp(http, DRIVE_ENDPOINT) if DRIVE_ENDPOINT else http
+def _build(creds:Credentials):
+    from googleapiclient.discovery import build
+    if not DRIVE_ENDPOINT: return build("drive","v3", credentials=creds)
+    return build("drive","v3", http=authorized_http(creds), static_discovery=True)
+def import_client()->None:
+    """使うクライアントのモジュールを先に読み込む（トレイのウォームスタート用）"""
+    if CLIENT=="async":
+        from . import drive_async  # noqa: F401
+        return
+    import googleapiclient.discovery, googleapiclient.http, googleapiclient.errors, httplib2, google_auth_httplib2  # noqa: F401
+# ---- warm-up ----
+# 矩形を選んでいる間に、トークン更新・DNS・TLS を済ませたサービスを 1 つ用意しておく。
+# httplib2 の接続はスレッド間で共有しないので、次の _service() が 1 回だけ受け取る。
+WARM_TTL=float(os.environ.get("SS2GD_WARM_TTL") or 120)   # サーバが keep-alive を切る前に使う
+REFRESH_MARGIN=300                                       # 期限までこれ未満ならついでに更新
+_warm_lock=threading.Lock()
+_warm:Optional[tuple]=None   # (service, 用意できた時刻, かかった秒)
+_warming=False
+def warm_up(background:bool=True)->None:
+    """キャプチャ開始時に呼ぶ。未サインインなら何もしない（対話サインインは本番の _service() に任せる）"""
+    global _warming
+    with _warm_lock:
+        # 温め中・温め済みなら二重には開かない
+        if _warming or (_warm and time.monotonic()-_warm[1]<WARM_TTL): return
+        _warming=True
+    if background:
+        threading.Thread(target=_warm_up, name="ss2gd-warmup", daemon=True).start()
+    else: _warm_up()
+def _warm_up()->None:
+    global _warm, _warming
+    t0=time.monotonic()
+    try:
+        with span("drive.warmup") as sp:
+            creds=get_token_refresher().credentials(margin=REFRESH_MARGIN)
+            if not (creds and creds.valid): return
+            if CLIENT=="async":
+                # 接続はクライアントのプールに残るので、_warm には入れない
+                from .drive_async import get_client
+                svc=get_client()
+            else: svc=_build(creds)
+            pool=get_id_pool()
+            # 接続を開く往復。ID が足りなければ補充を兼ねる
+            if pool.size()<LOW_IDS: pool.refill(svc)
+            else: svc.about().get(fields="kind").execute()
+            cost=time.monotonic()-t0; sp.set(cost_ms=int(cost*1000))
+        if CLIENT=="async": return
+        with _warm_lock: _warm=(svc, time.monotonic(), cost)
+    except Exception as e:
+        _dbg(f"warm-up failed: {e}")
+    finally:
+        with _warm_lock: _warming=False
+def _take_warm():
+    global _warm
+    with _warm_lock: w, _warm=_warm, None
+    return w if w and time.monotonic()-w[1]<WARM_TTL else None
+def _service():
+    with span("drive.service") as sp:
+        w=_take_warm()
+        if w:
+            # 温めておいた分（トークン更新・DNS・TLS）はクリティカルパスから消えている
+            sp.set(warm=True, saved_ms=int(w[2]*1000)); return w[0]
+        return _build(_creds())
+def _folder_target(kind:Optional[str]):
+    """(パスの段, 起点フォルダ) / パス指定が無ければ None"""
+    st=get_settings()
+    if not st.upload_folder_path: return None
+    return render_path(st.upload_folder_path, kind), st.upload_folder_id or "root"
+def _metadata(svc, name:str, description:str, kind:Optional[str]=None, *, refresh:bool=False)->dict:
+    """refresh=True: フォルダ ID のキャッシュを捨てて引き直す（アップロードが 404 になった後）"""
+    body={"name": name, "description": description, "appProperties":{"uploader":"SS2GDrive"}}
+    target=_folder_target(kind)
+    if target:
+        if refresh: get_folder_resolver().invalidate(*target)
+        body["parents"]=[get_folder_resolver().resolve(svc, *target)]
+    elif get_settings().upload_folder_id: body["parents"]=[get_settings().upload_folder_id]
+    return body
+def _create_retry(status:Optional[int], fid:Optional[str], refresh:bool, kind:Optional[str])->Optional[str]:
+    """create が失敗した時の次の手："discard" / "refresh" / None（諦める）"""
+    # 先取りした ID が使えない（期限切れ等）：プールを捨てて ID 無しでやり直す
+    if fid and status in (400, 409): return "discard"
+    # キャッシュしたフォルダが消されていた：パスを引き直して 1 回だけやり直す
+    if not refresh and status==404 and _folder_target(kind): return "refresh"
+    return None
+def _finish(svc, file_id:str, link:Optional[str]=None)->str:
+    """（公開設定）→リンク取得（ID を先に決めていれば link は分かっているので get しない）"""
+    if get_settings().publish_anyone:
+        with span("upload.permission"): svc.permissions().create(fileId=file_id, body={"type":"anyone","role":"reader"}).execute()
+    if link: return link
+    with span("upload.link"): fin=svc.files().get(fileId=file_id, fields="webViewLink", supportsAllDrives=True).execute()
+    return fin["webViewLink"]
+def _refill_service():
+    """ID プール補充スレッド用のサービス（アップロード中の svc の httplib2 接続は共有しない）"""
+    if CLIENT=="async":
+        # 1 つのイベントループで多重化するので共有してよい
+        from .drive_async import get_client
+        return get_client()
+    # バックグラウンドなので対話サインインはしない
+    creds=get_token_refresher().credentials()
+    if not (creds and creds.valid): raise RuntimeError("not signed in")
+    return _build(creds)
+def _notify_broken_link(e:BaseException)->None:
+    """先にコピーしたリンクが使えなくなった（アップロード失敗）"""
+    notify("SS2GDrive", f"Upload failed — the copied link will not work:\n{e}")
+class _EarlyLink:
+    """
+    ID の先取り → 先にリンクを渡す → 失敗したら通知 → 正しいリンクで上書き → 履歴。
+    upload_and_share（googleapiclient / async）の共通部分。async はメソッドを asyncio.to_thread で呼ぶ
+    """
+    def __init__(self, on_link:Optional[Callable[[str],None]]=None):
+        self.pool=get_id_pool(); self.on_link=on_link
+        self.fid=self.pool.take(_refill_service)
+        self.early=view_link(self.fid) if self.fid else None
+    def announce(self)->None:
+        if self.early and self.on_link: self.on_link(self.early)
+    def discard(self)->None:
+        """先取りした ID が使えなかった：プールを捨てて ID 無しで"""
+        self.pool.discard(); self.fid=None
+    def failed(self, e:BaseException)->None:
+        if self.early and self.on_link: _notify_broken_link(e)
+    def done(self, link:str, **record)->None:
+        if self.on_link and link!=self.early: self.on_link(link)   # ID を使えなかった：正しいリンクで上書き
+        record_upload(link=link, **record)
+def upload_and_share(filepath:str, mime_type="image/png", description="captured by SS2GDrive", *, kind:Optional[str]=None, region=None,
+                     on_link:Optional[Callable[[str],None]]=None):
+    """
+    アップロード→（公開設定）→リンク取得。結果はローカル履歴にも記録する。kind: "shot" | "record" | "fastshot" 等
+    on_link: 先取りした ID があれば、アップロード前にリンクを渡す（クリップボード用）。
+    その後に失敗した場合は「コピー済みのリンクは使えない」と通知してから例外を投げる。
+    """
+    if CLIENT=="async":
+        from .drive_async import run, upload_and_share_async
+        return run(upload_and_share_async(filepath, mime_type, description, kind=kind, region=region, on_link=on_link))
+    from googleapiclient.http import MediaFileUpload
+    from googleapiclient.errors import HttpError
     svc=_service()
-    body={"name": os.path.basename(filepath), "description": description, "appProperties":{"uploader":"SS2GDrive"}}
-    if folder_id: body["parents"]=[folder_id]
-    media=MediaFileUpload(filepath, mimetype=mime_type, chunksize=8*1024*1024, resumable=True)
-    req=svc.files().create(body=body, media_body=media, fields="id,webViewLink", supportsAllDrives=True)
-    resp=None
-    while resp is None:
-        status, resp=req.next_chunk()
-    file_id=resp["id"]
-    if publish: svc.permissions().create(fileId=file_id, body={"type":"anyone","role":"reader"}).execute()
-    fin=svc.files().get(fileId=file_id, fields="webViewLink", supportsAllDrives=True).execute()
-    link=fin["webViewLink"]
+    kind=kind or ("record" if mime_type.startswith("video/") else "shot")
+    el=_EarlyLink(on_link); el.announce()
+    # 動画は帯域上限に従い、スクショが来たらチャンクの境界で譲る
+    sched=get_scheduler(); prio=PRIO_VIDEO if mime_type.startswith("video/") else PRIO_SHOT
+    chunk=sched.chunk_size(8*1024*1024)
+    try:
+        media=MediaFileUpload(filepath, mimetype=mime_type, chunksize=chunk, resumable=True)
+        with span("upload.create", size=media.size(), mime=mime_type, preallocated=bool(el.fid)) as sp, sched.transfer(prio):
+            refresh=False
+            for _attempt in range(3):
+                body=_metadata(svc, os.path.basename(filepath), description, kind, refresh=refresh)
+                if el.fid: body["id"]=el.fid
+                req=svc.files().create(body=body, media_body=media, fields="id,webViewLink", supportsAllDrives=True)
+                try:
+                    resp=None
+                    while resp is None:
+                        sched.chunk(prio, min(chunk, media.size()-req.resumable_progress))
+                        status, resp=req.next_chunk()
+                    break
+                except HttpError as e:
+                    nxt=_create_retry(e.resp.status, el.fid, refresh, kind)
+                    if nxt=="discard": el.discard()
+                    elif nxt=="refresh": refresh=True
+                    else: raise
+            file_id=resp["id"]; sp.set(file_id=file_id)
+        link=_finish(svc, file_id, view_link(file_id) if el.fid else None)
+    except Exception as e:
+        el.failed(e); raise
+    el.done(link, name=body["name"], local_path=os.path.abspath(filepath), size=media.size(), drive_id=file_id,
+            kind=kind, region=region, mime=mime_type, created=_mtime(filepath))
     return link
+def _mtime(path:str)->Optional[float]:
+    try: return os.path.getmtime(path)
+    except OSError: return None
@@ -0,0 +1,240 @@
+# app/ss2gd/fast_shot.py
+"""
+ダイアログ無しの「前回の矩形でもう一枚」。
+
+Screenshot ポータル（毎回 interactive）ではなく、restore_token で復元した ScreenCast
+セッションの PipeWire ノードから 1 フレームだけ取り出し、前回 select_rect で選んだ矩形に
+切り抜いて保存→アップロードする。常駐プロセスではセッションを保持して使い回す。
+
+PNG は gst の pngenc（1 スレッド）を使わず、生の RGB フレームを受け取って image_encoder で
+並列に圧縮し、出来たブロックから順にアップロードへ流す（一時ファイルを作らない）。
+JPEG は従来どおり jpegenc → ファイル（SS2GD_SHOT_STREAM=0 なら PNG も）。
+"""
+from __future__ import annotations
+import os, sys, time, asyncio, threading, subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+from .screencast_portal import (open_screencast_session, close_screencast_session, plan_region_sources,
+                                PERSIST_UNTIL_REVOKED)
+from .config import (get_screencast_restore_token, get_settings, get_last_region, get_last_region_scale,
+                     get_last_region_screens)
+from .recorder import _video_src, _calc_crop
+from .tracing import span
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[fast] {msg}", file=sys.stderr, flush=True)
+
+GRAB_TIMEOUT = float(os.environ.get("SS2GD_FAST_TIMEOUT", "5"))
+STREAM = os.environ.get("SS2GD_SHOT_STREAM", "1").lower() not in ("0", "no", "false")
+
+def _shot_size(plan: List[Dict[str, Any]], rect: Tuple[int, int, int, int], scale: float) -> Tuple[int, int]:
+    """画像の大きさ（物理 px。録画と違い偶数には丸めない）。1 本なら切り出した大きさそのもの"""
+    if len(plan) == 1:
+        p = plan[0]
+        s = float(p.get("scale") or scale)
+        if s == scale:
+            lw, lh = p["size"]
+            top, left, right, bottom = _calc_crop(p, s, "physical")
+            return round(lw * s) - left - right, round(lh * s) - top - bottom
+    return round(rect[2] * scale), round(rect[3] * scale)
+
+def _shot_chain(fd_num: int, plan: List[Dict[str, Any]], rect: Tuple[int, int, int, int],
+                downstream: List[str], scale: float) -> List[str]:
+    """
+    1 フレームを RGB で downstream へ。録画用の _video_chain は I420（4:2:0）に落として偶数に丸めるので、
+    スクショでは使わない：ソースの形式（BGRx）のまま切り出し、そのまま RGB にする（縮小・丸め無し）。
+    画面ごとに比率が違う合成の時だけ、そのストリームを出力の比率に揃える。
+    """
+    scale = float(scale or 1.0)
+    w, h = _shot_size(plan, rect, scale)
+    def head(p: Dict[str, Any]) -> List[str]:
+        s = float(p.get("scale") or scale)
+        lw, lh = p["size"]
+        top, left, right, bottom = _calc_crop(p, s, "physical")
+        out = [*_video_src(fd_num, p["node_id"], (round(lw * s), round(lh * s))),
+               "!", "videoconvert", "!", "video/x-raw,format=BGRx",
+               "!", "videocrop", f"top={top}", f"left={left}", f"right={right}", f"bottom={bottom}"]
+        if s != scale:
+            ct, cl, cr, cb = p["crop"]
+            out += ["!", "videoscale", "!",
+                    f"video/x-raw,width={round((lw - cl - cr) * scale)},height={round((lh - ct - cb) * scale)}"]
+        return out
+    to_rgb = ["!", "videoconvert", "!", "video/x-raw,format=RGB"]
+    if len(plan) == 1:
+        return [*head(plan[0]), *to_rgb, *downstream]
+    args = ["compositor", "name=comp", "background=black",
+            *[f"sink_{i}::{key}={round(p[key] * scale)}" for i, p in enumerate(plan) for key in ("xpos", "ypos")],
+            "!", f"video/x-raw,format=BGRx,width={w},height={h}", *to_rgb, *downstream]
+    for i, p in enumerate(plan):
+        args += [*head(p), "!", "queue", "!", f"comp.sink_{i}"]
+    return args
+
+def _encoder(fmt: str, quality: int) -> List[str]:
+    if fmt in ("jpg", "jpeg"):
+        return ["jpegenc", f"quality={int(quality)}", "snapshot=true"]
+    return ["pngenc", "snapshot=true"]
+
+class FastShooter:
+    """ScreenCast セッションを保持し、1 フレームだけ切り出して画像にする"""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sess: Optional[Tuple[int, List[Dict[str, Any]], str, Any]] = None
+
+    # ---- portal session（専用スレッドのループで D-Bus 接続を生かしておく） ----
+    def _call(self, coro, timeout: float = 60.0):
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ss2gd-fastshot", daemon=True).start()
+            self._loop = loop
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _session(self) -> Tuple[int, List[Dict[str, Any]], str, Any]:
+        if self._sess is None:
+            _dbg("open screencast session (restore token)")
+            # CLI の `shot --last` は毎回別プロセスなので、取り消すまで有効なトークンにする
+            self._sess = self._call(open_screencast_session(restore_token=get_screencast_restore_token(),
+                                                            persist_mode=PERSIST_UNTIL_REVOKED))
+        return self._sess
+
+    def _drop_session(self) -> None:
+        sess, self._sess = self._sess, None
+        if not sess:
+            return
+        fd, _streams, path, bus = sess
+        try: os.close(fd)
+        except OSError: pass
+        try: self._call(close_screencast_session(bus, path), timeout=5.0)
+        except Exception as e: _dbg(f"close session: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop_session()
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    # ---- capture ----
+    def grab(self, rect: Tuple[int, int, int, int], out_path: Optional[str] = None) -> str:
+        """rect=(x,y,w,h) を 1 フレームだけ画像に。戻り: ファイルパス"""
+        st = get_settings()
+        ext = "jpg" if st.image_format in ("jpg", "jpeg") else "png"
+        out_path = out_path or os.path.join("/tmp", f"ss2gd-{os.getpid()}-{int(time.time()*1000)}.{ext}")
+        with self._lock:
+            for attempt in (1, 2):
+                fd, streams, _path, _bus = self._session()
+                # 矩形が複数モニタにまたがる場合は録画と同じく合成する
+                plan = plan_region_sources(streams, rect, get_last_region_screens())
+                pw_fd = os.dup(fd)    # セッションの fd は残す。全ストリームでこの 1 つを共有
+                args = ["gst-launch-1.0", "-q",
+                        *_shot_chain(pw_fd, plan, rect, [
+                            "!", *_encoder(ext, st.jpeg_quality),
+                            "!", "filesink", f"location={out_path}",
+                        ], get_last_region_scale())]
+                try:
+                    with span("fastshot.grab", streams=len(plan), attempt=attempt):
+                        r = subprocess.run(args, pass_fds=(pw_fd,), capture_output=True, text=True, timeout=GRAB_TIMEOUT)
+                    ok = r.returncode == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0
+                except subprocess.TimeoutExpired:
+                    ok, r = False, None
+                finally:
+                    os.close(pw_fd)
+                if ok:
+                    return out_path
+                _dbg(f"grab failed (attempt {attempt}): {(r.stderr if r else 'timeout')!r}")
+                # セッションが失効している可能性 → 開き直して 1 回だけ再試行
+                self._drop_session()
+        raise RuntimeError("fast shot: could not grab a frame from the screencast stream")
+
+    def grab_raw(self, rect: Tuple[int, int, int, int]) -> Tuple[bytes, int, int, int]:
+        """rect を 1 フレームだけ RGB で。戻り: (フレーム, 幅, 高さ, 1 行のバイト数)"""
+        scale = get_last_region_scale()
+        with self._lock:
+            for attempt in (1, 2):
+                fd, streams, _path, _bus = self._session()
+                plan = plan_region_sources(streams, rect, get_last_region_screens())
+                # 切り出した大きさそのもの（偶数に丸めない）
+                w, h = _shot_size(plan, rect, scale)
+                stride = (w * 3 + 3) & ~3        # GStreamer の RGB は行を 4 バイト境界に揃える
+                need = stride * h
+                pw_fd = os.dup(fd)    # セッションの fd は残す。全ストリームでこの 1 つを共有
+                args = ["gst-launch-1.0", "-q",
+                        *_shot_chain(pw_fd, plan, rect, ["!", "fdsink", "fd=1"], scale)]
+                frame = b""
+                try:
+                    p = subprocess.Popen(args, pass_fds=(pw_fd,), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                    killer = threading.Timer(GRAB_TIMEOUT, p.kill)
+                    killer.start()
+                    try:
+                        with span("fastshot.grab", streams=len(plan), attempt=attempt, raw=True):
+                            frame = p.stdout.read(need)
+                    finally:
+                        killer.cancel()
+                        # 1 フレームで足りるので、後は止める
+                        p.kill(); p.wait(); p.stdout.close()
+                except OSError as e:
+                    _dbg(f"raw grab failed to start: {e}")
+                finally:
+                    os.close(pw_fd)
+                if len(frame) == need:
+                    return frame, w, h, stride
+                _dbg(f"raw grab short read (attempt {attempt}): {len(frame)}/{need}")
+                self._drop_session()
+        raise RuntimeError("fast shot: could not grab a frame from the screencast stream")
+
+    def _shoot_png_stream(self, rect: Tuple[int, int, int, int], on_link=None) -> str:
+        """並列 PNG エンコード → そのまま resumable upload（エンコードと送信が重なる）"""
+        from .stream_upload import StreamUpload
+        from .image_encoder import encode_png
+        from .bandwidth import PRIO_SHOT
+        from .drive_uploader import _notify_broken_link
+        frame, w, h, stride = self.grab_raw(rect)
+        up = StreamUpload(f"ss2gd-{os.getpid()}-{int(time.time()*1000)}.png", "image/png",
+                          description=time.strftime("SS_%Y%m%d_%H%M%S"), kind="shot", region=rect,
+                          prio=PRIO_SHOT, on_link=on_link)
+        try:
+            encode_png(frame, w, h, up.write, stride=stride)
+        except BaseException as e:
+            # EOF を送ると欠けた PNG が確定してしまう。セッションごと取り消す
+            up.abort()
+            try: up.result()
+            except Exception: pass
+            if up.early_link:
+                _notify_broken_link(e)
+            raise
+        up.close_input()
+        try:
+            link = up.result()
+        except Exception as e:
+            if up.early_link:
+                _notify_broken_link(e)
+            raise
+        if on_link and link != up.early_link:
+            on_link(link)
+        return link
+
+    def shoot(self, rect: Optional[Tuple[int, int, int, int]] = None, on_link=None) -> str:
+        """前回の矩形（または指定矩形）を撮ってアップロード。戻り: リンク（on_link は upload_and_share へ）"""
+        from .drive_uploader import upload_and_share, warm_up
+        rect = rect or get_last_region()
+        if not rect:
+            raise RuntimeError("No previous region. Select one first.")
+        warm_up()   # grab と並行（呼び出し側で既に温めていれば二重には開かない）
+        with span("fastshot", rect=list(rect)):
+            if STREAM and get_settings().image_format not in ("jpg", "jpeg"):
+                return self._shoot_png_stream(rect, on_link)
+            path = self.grab(rect)
+            mime = "image/jpeg" if path.endswith(".jpg") else "image/png"
+            return upload_and_share(path, mime, time.strftime("SS_%Y%m%d_%H%M%S"), kind="shot", region=rect,
+                                    on_link=on_link)
+
+_shooter: Optional[FastShooter] = None
+
+def get_fast_shooter() -> FastShooter:
+    global _shooter
+    if _shooter is None:
+        _shooter = FastShooter()
+    return _shooter
+
+__all__ = ["FastShooter", "get_fast_shooter"]
@@ -0,0 +1,134 @@
+# app/ss2gd/gst_supervisor.py
+"""
+gst-launch の stdout/stderr を常に読み続ける監視役。
+
+パイプを読まないと、警告が多いパイプライン（や -v）でパイプバッファが埋まり、
+gst-launch が書き込みでブロック → 録画が途中で止まる。ここでは
+  - 行をメモリ上の固定長リング（最新 N 行）に保持
+  - ローテーションするログファイル（CFG_DIR/logs/gst.log）へ追記
+  - 要素の警告（フレーム落ち / "can't keep up" 等）を数えて録画の健全性として公開
+する。
+"""
+from __future__ import annotations
+import os, re, time, threading, subprocess
+import logging, logging.handlers
+from collections import deque
+from typing import Any, Deque, Dict, IO, List, Optional, Tuple
+
+from .config import CFG_DIR
+
+LOG_DIR = CFG_DIR / "logs"
+RING_LINES = int(os.environ.get("SS2GD_GST_RING_LINES") or 500)
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUPS = 3
+
+# gst-launch の警告/エラー行:  "WARNING: from element /GstPipeline:pipeline0/GstVp8Enc:vp8enc0: ..."
+_RE_MSG = re.compile(r"^(WARNING|ERROR): from element (\S+):\s+(.*)$")
+_RE_DROPPED = re.compile(r"(?:dropped|drop(?:ping)?)\s+(\d+)", re.I)
+# 「追いつけない」の文言だけ。"A lot of buffers are being dropped" 等のフレーム落ちは dropped で数える
+_KEEP_UP = ("can't keep up", "cannot keep up", "falling behind")
+
+_log_lock = threading.Lock()
+_logger: Optional[logging.Logger] = None
+
+def _gst_logger() -> logging.Logger:
+    global _logger
+    with _log_lock:
+        if _logger is None:
+            lg = logging.getLogger("ss2gd.gst")
+            lg.propagate = False
+            lg.setLevel(logging.INFO)
+            try:
+                LOG_DIR.mkdir(parents=True, exist_ok=True)
+                h = logging.handlers.RotatingFileHandler(LOG_DIR / "gst.log", maxBytes=LOG_MAX_BYTES,
+                                                         backupCount=LOG_BACKUPS, encoding="utf-8")
+                h.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                lg.addHandler(h)
+            except Exception:
+                lg.addHandler(logging.NullHandler())
+            _logger = lg
+        return _logger
+
+class GstSupervisor:
+    """Popen（stdout/stderr=PIPE）の出力を別スレッドで吸い出し、警告を集計する"""
+    def __init__(self, proc: subprocess.Popen, tag: str = "record", ring: int = RING_LINES):
+        self.proc = proc
+        self.tag = tag
+        self._ring: Deque[Tuple[float, str, str]] = deque(maxlen=max(10, ring))
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {"lines": 0, "warnings": 0, "errors": 0, "dropped": 0,
+                                       "cant_keep_up": 0, "last_warning": None, "started": time.time()}
+        self._log = _gst_logger()
+        self._threads: List[threading.Thread] = []
+        for name, stream in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+            if stream is None:
+                continue
+            t = threading.Thread(target=self._drain, args=(name, stream),
+                                 name=f"ss2gd-gst-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        self._log.info("[%s pid=%s] started: %s", tag, proc.pid,
+                       " ".join(proc.args) if isinstance(proc.args, (list, tuple)) else proc.args)
+
+    # ---- reader ----
+    def _drain(self, name: str, stream: IO) -> None:
+        try:
+            while True:
+                raw = stream.readline()
+                if not raw:
+                    break
+                line = (raw.decode("utf-8", "replace") if isinstance(raw, bytes) else raw).rstrip("\r\n")
+                if line:
+                    self._feed(name, line)
+        except Exception:
+            pass
+        finally:
+            try: stream.close()
+            except Exception: pass
+
+    def _feed(self, name: str, line: str) -> None:
+        with self._lock:
+            self._ring.append((time.time(), name, line))
+            st = self._stats
+            st["lines"] += 1
+            m = _RE_MSG.match(line)
+            if m:
+                level, element, text = m.groups()
+                st["errors" if level == "ERROR" else "warnings"] += 1
+                low = text.lower()
+                if any(k in low for k in _KEEP_UP):
+                    st["cant_keep_up"] += 1
+                d = _RE_DROPPED.search(text)
+                if d:
+                    st["dropped"] += int(d.group(1))
+                elif "dropped" in low:
+                    st["dropped"] += 1
+                st["last_warning"] = f"{element.rsplit('/', 1)[-1]}: {text}"[:300]
+            elif "dropped" in line.lower():
+                d = _RE_DROPPED.search(line)
+                st["dropped"] += int(d.group(1)) if d else 1
+        self._log.info("[%s pid=%s %s] %s", self.tag, self.proc.pid, name, line)
+
+    # ---- API ----
+    def health(self) -> Dict[str, Any]:
+        """録画の健全性（UI 表示用）"""
+        with self._lock:
+            h = dict(self._stats)
+        h["running"] = self.proc.poll() is None
+        h["elapsed"] = time.time() - h.pop("started")
+        return h
+
+    def tail(self, n: int = 50) -> str:
+        with self._lock:
+            rows = list(self._ring)[-n:]
+        return "\n".join(line for _t, _name, line in rows)
+
+    def join(self, timeout: float = 2.0) -> None:
+        """プロセス終了後、残りの出力を読み切るまで待つ"""
+        end = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, end - time.monotonic()))
+        self._log.info("[%s pid=%s] exited ret=%s %s", self.tag, self.proc.pid, self.proc.poll(),
+                       {k: v for k, v in self.health().items() if k != "last_warning"})
+
+__all__ = ["GstSupervisor", "LOG_DIR"]
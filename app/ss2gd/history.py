@@ -0,0 +1,178 @@
+# app/ss2gd/history.py
+"""
+アップロード履歴（ローカル SQLite + FTS5）。Drive API は一切呼ばない。
+
+upload_and_share が 1 件ずつ書き込み、`ss2gd history` とトレイの
+「Recent links」が参照する。数万件でもミリ秒で引けるよう、
+uploaded の索引と全文検索（name / local_path / kind）を持つ。
+"""
+from __future__ import annotations
+import os, json, time, sqlite3, threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Sequence
+
+from .config import CFG_DIR
+
+HISTORY_PATH = CFG_DIR / "history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads(
+    id         INTEGER PRIMARY KEY,
+    name       TEXT NOT NULL,
+    local_path TEXT,
+    size       INTEGER,
+    drive_id   TEXT,
+    link       TEXT NOT NULL,
+    kind       TEXT,
+    region     TEXT,
+    mime       TEXT,
+    created    REAL,
+    uploaded   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_uploaded ON uploads(uploaded DESC);
+CREATE INDEX IF NOT EXISTS uploads_path ON uploads(local_path);
+"""
+
+_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS uploads_fts USING fts5(
+    name, local_path, kind, content='uploads', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS uploads_ai AFTER INSERT ON uploads BEGIN
+    INSERT INTO uploads_fts(rowid, name, local_path, kind) VALUES (new.id, new.name, new.local_path, new.kind);
+END;
+CREATE TRIGGER IF NOT EXISTS uploads_ad AFTER DELETE ON uploads BEGIN
+    INSERT INTO uploads_fts(uploads_fts, rowid, name, local_path, kind) VALUES ('delete', old.id, old.name, old.local_path, old.kind);
+END;
+"""
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    id: int
+    name: str
+    local_path: Optional[str]
+    size: Optional[int]
+    drive_id: Optional[str]
+    link: str
+    kind: Optional[str]
+    region: Optional[Sequence[int]]
+    mime: Optional[str]
+    created: Optional[float]
+    uploaded: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+_COLS = "id, name, local_path, size, drive_id, link, kind, region, mime, created, uploaded"
+
+def _row(r: sqlite3.Row) -> HistoryEntry:
+    region = None
+    if r["region"]:
+        try: region = tuple(json.loads(r["region"]))
+        except Exception: region = None
+    return HistoryEntry(r["id"], r["name"], r["local_path"], r["size"], r["drive_id"], r["link"],
+                        r["kind"], region, r["mime"], r["created"], r["uploaded"])
+
+class History:
+    """スレッド毎に接続を持つ（sqlite3 の接続はスレッド間で共有しない）"""
+    def __init__(self, path: os.PathLike | str = HISTORY_PATH):
+        self._path = str(path)
+        self._local = threading.local()
+        self._fts: Optional[bool] = None
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=5.0)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            if self._fts is None:
+                try:
+                    db.executescript(_FTS)
+                    self._fts = True
+                except sqlite3.OperationalError:
+                    self._fts = False      # FTS5 無しビルドは LIKE 検索にフォールバック
+            self._local.db = db
+        return db
+
+    # ---- write ----
+    def add(self, *, name: str, link: str, local_path: Optional[str] = None, size: Optional[int] = None,
+            drive_id: Optional[str] = None, kind: Optional[str] = None, region: Optional[Sequence[int]] = None,
+            mime: Optional[str] = None, created: Optional[float] = None) -> int:
+        db = self._db()
+        with db:
+            cur = db.execute(
+                "INSERT INTO uploads(name, local_path, size, drive_id, link, kind, region, mime, created, uploaded)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (name, local_path, size, drive_id, link, kind,
+                 json.dumps([int(v) for v in region]) if region else None, mime, created, time.time()))
+        return int(cur.lastrowid)
+
+    def remove(self, entry_id: int) -> None:
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM uploads WHERE id=?", (entry_id,))
+
+    # ---- read ----
+    def recent(self, limit: int = 10, kind: Optional[str] = None) -> List[HistoryEntry]:
+        db = self._db()
+        if kind:
+            rows = db.execute(f"SELECT {_COLS} FROM uploads WHERE kind=? ORDER BY uploaded DESC LIMIT ?", (kind, limit))
+        else:
+            rows = db.execute(f"SELECT {_COLS} FROM uploads ORDER BY uploaded DESC LIMIT ?", (limit,))
+        return [_row(r) for r in rows]
+
+    def search(self, query: str, limit: int = 50, kind: Optional[str] = None) -> List[HistoryEntry]:
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return self.recent(limit, kind)
+        db = self._db()
+        args: List[Any] = []
+        if self._fts:
+            # 各語を前方一致のフレーズとして AND 検索
+            match = " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+            sql = (f"SELECT {', '.join('u.' + c.strip() for c in _COLS.split(','))} FROM uploads_fts f"
+                   " JOIN uploads u ON u.id = f.rowid WHERE uploads_fts MATCH ?")
+            args.append(match)
+        else:
+            sql = f"SELECT {_COLS} FROM uploads u WHERE 1=1"
+            for t in terms:
+                sql += " AND (u.name LIKE ? OR u.local_path LIKE ? OR u.kind LIKE ?)"
+                args += [f"%{t}%"] * 3
+        if kind:
+            sql += " AND u.kind=?"; args.append(kind)
+        # rowid は挿入順＝アップロード順。FTS5 は rowid 降順なら LIMIT で打ち切れる
+        sql += (" ORDER BY f.rowid DESC" if self._fts else " ORDER BY u.uploaded DESC") + " LIMIT ?"
+        args.append(limit)
+        return [_row(r) for r in db.execute(sql, args)]
+
+    def find_by_path(self, local_path: str) -> Optional[HistoryEntry]:
+        r = self._db().execute(f"SELECT {_COLS} FROM uploads WHERE local_path=? ORDER BY uploaded DESC LIMIT 1",
+                               (local_path,)).fetchone()
+        return _row(r) if r else None
+
+    def count(self) -> int:
+        return int(self._db().execute("SELECT COUNT(*) FROM uploads").fetchone()[0])
+
+_history: Optional[History] = None
+_history_lock = threading.Lock()
+
+def get_history() -> History:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = History()
+        return _history
+
+def record_upload(**kwargs: Any) -> Optional[int]:
+    """upload_and_share から呼ぶ。履歴の失敗でアップロードを失敗させない。"""
+    try:
+        return get_history().add(**kwargs)
+    except Exception as e:
+        if os.environ.get("SS2GD_DEBUG"):
+            print(f"[history] record failed: {e}", flush=True)
+        return None
+
+__all__ = ["History", "HistoryEntry", "get_history", "record_upload", "HISTORY_PATH"]
@@ -0,0 +1,87 @@
+# app/ss2gd/image_encoder.py
+"""
+大きなスクリーンショット用の並列 PNG エンコーダ（標準ライブラリだけ）。
+
+マルチモニタ HiDPI だと 30 メガピクセルを超え、1 スレッドの deflate だけで数秒かかる。
+pigz と同じく行をブロックに分けて並列に圧縮し、順番どおりに繋ぐ。
+  - 各ブロックは raw deflate。前のブロックの末尾 32 KiB を辞書にする（圧縮率をほぼ落とさない）
+  - 最後以外は Z_SYNC_FLUSH（バイト境界・BFINAL=0）で終わらせるので、そのまま連結できる
+  - adler32 は出来上がった順に足していく。ブロックごとに IDAT チャンクにして out() へ渡す
+    （全体を溜めずにアップロードへ流せる）
+  - zlib は圧縮中に GIL を離すので、スレッドで CPU コア数ぶん並ぶ
+行フィルタは None（0）固定。画素ごとの演算を Python でやると圧縮より遅くなるため。
+スクリーンショット（ベタ塗りと文字）では Sub/Up との差は小さい。
+"""
+from __future__ import annotations
+import os, zlib, struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .tracing import span
+
+BLOCK = 1 << 20          # 1 ブロックのおおよその大きさ（フィルタ後のバイト数）
+WINDOW = 32 * 1024       # deflate の窓（辞書として渡す長さ）
+THREADS = int(os.environ.get("SS2GD_ENCODE_THREADS") or 0) or (os.cpu_count() or 1)
+
+PNG_SIG = b"\x89PNG\r\n\x1a\n"
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)))
+
+def _rows(frame, y0: int, y1: int, row: int, stride: int) -> bytes:
+    """フィルタ None のスキャンライン（先頭に 0 バイト）"""
+    mv = memoryview(frame)
+    return b"".join(b"\x00" + mv[y * stride:y * stride + row] for y in range(y0, y1))
+
+def _deflate(data: bytes, zdict: Optional[bytes], level: int, last: bool) -> bytes:
+    c = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, *((zdict,) if zdict else ()))
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def encode_png(frame, width: int, height: int, out: Callable[[bytes], None], *, stride: Optional[int] = None,
+               level: int = 6, threads: int = THREADS) -> int:
+    """
+    RGB（8bit × 3）のフレームを PNG にして out() へ順に渡す。stride は 1 行のバイト数（パディング込み）。
+    戻り: 出力したバイト数
+    """
+    row = width * 3
+    stride = stride or row
+    rows_per = max(1, BLOCK // (row + 1))
+    spans = [(y, min(height, y + rows_per)) for y in range(0, height, rows_per)] or [(0, 0)]
+    total = 0
+    def emit(b: bytes) -> None:
+        nonlocal total
+        out(b); total += len(b)
+
+    with span("encode.png", width=width, height=height, blocks=len(spans), threads=threads):
+        emit(PNG_SIG + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        adler = 1
+        prev_tail: Optional[bytes] = None
+        with ThreadPoolExecutor(max(1, threads), thread_name_prefix="ss2gd-png") as ex:
+            pending: deque = deque()
+            def submit(i: int) -> None:
+                nonlocal prev_tail
+                y0, y1 = spans[i]
+                raw = _rows(frame, y0, y1, row, stride)
+                pending.append((raw, ex.submit(_deflate, raw, prev_tail, level, i == len(spans) - 1)))
+                prev_tail = raw[-WINDOW:]
+            ahead = max(2, threads * 2)       # 先に圧縮を始めておくブロック数（メモリの上限）
+            nxt = 0
+            while nxt < min(ahead, len(spans)):
+                submit(nxt); nxt += 1
+            first = True
+            while pending:
+                raw, fut = pending.popleft()
+                data = fut.result()
+                adler = zlib.adler32(raw, adler)
+                if nxt < len(spans):
+                    submit(nxt); nxt += 1
+                if first:
+                    data = b"\x78\x9c" + data; first = False   # zlib ヘッダ（deflate / 32K 窓）
+                if not pending:
+                    data += struct.pack(">I", adler)
+                emit(_chunk(b"IDAT", data))
+        emit(_chunk(b"IEND", b""))
+    return total
+
+__all__ = ["encode_png", "THREADS"]
@@ -0,0 +1,197 @@
+# app/ss2gd/record_controller.py
+"""
+録画プロセスの台帳。
+
+record_state.json（PID 1 つ）の代わりに、CFG_DIR/recordings/<id>.json を録画ごとに置く。
+  - 生存確認は pidfd（PID 再利用は /proc/<pid>/stat の starttime で見分ける）
+  - 終了待ちは pidfd を poll（親プロセスでなくても待てる。100ms ごとの waitpid は不要）
+  - 死んだ録画の台帳は list() のたびに掃除
+  - 領域の違う録画を同時にいくつでも持てる
+"""
+from __future__ import annotations
+import os, json, time, select, signal, threading
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, List, Optional
+
+from .config import CFG_DIR
+
+REGISTRY_DIR = CFG_DIR / "recordings"
+LEGACY_STATE_PATH = CFG_DIR / "record_state.json"
+
+def _starttime(pid: int) -> Optional[int]:
+    """プロセス開始時刻（clock ticks）。PID 再利用の判定に使う。居ない/ゾンビなら None"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        return None if fields[0] in (b"Z", b"X") else int(fields[19])
+    except Exception:
+        return None
+
+def _pidfd(pid: int) -> Optional[int]:
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None     # Python < 3.9 / Linux < 5.3 / 既に居ない
+
+def _reap(pid: int) -> None:
+    """自分の子ならゾンビを回収（他人の子なら何もしない）"""
+    try: os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError: pass
+    except OSError: pass
+
+def wait_exit(pid: int, timeout: Optional[float] = None) -> bool:
+    """pid の終了を待つ。戻り: 終了した(True) / タイムアウト(False)"""
+    fd = _pidfd(pid)
+    if fd is None:
+        # pidfd が使えない環境：/proc を見ながら待つ（間隔は徐々に伸ばす）
+        end = None if timeout is None else time.monotonic() + timeout
+        delay = 0.005
+        while _starttime(pid) is not None:
+            _reap(pid)
+            if end is not None and time.monotonic() >= end:
+                return False
+            time.sleep(delay); delay = min(delay * 2, 0.1)
+        return True
+    try:
+        p = select.poll()
+        p.register(fd, select.POLLIN)
+        ok = bool(p.poll(None if timeout is None else max(0, int(timeout * 1000))))
+    finally:
+        os.close(fd)
+    if ok:
+        _reap(pid)
+    return ok
+
+@dataclass
+class Recording:
+    id: str
+    pid: int
+    file: str
+    rect: Optional[List[int]] = None
+    starttime: Optional[int] = None
+    started: float = field(default_factory=time.time)
+    owner: int = field(default_factory=os.getpid)
+    first_frame_ms: Optional[int] = None
+    stream: bool = False                 # True: アップロードは owner のプロセスがパイプから行う
+
+    def alive(self) -> bool:
+        st = _starttime(self.pid)
+        if st is None:
+            return False
+        # 開始時刻が違えば PID が別プロセスに再利用されている
+        return self.starttime is None or st == self.starttime
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class RecordingController:
+    """録画の登録・列挙・停止。台帳はファイルなので UI と CLI の間で共有される"""
+    def __init__(self, root: os.PathLike | str = REGISTRY_DIR):
+        self._root = os.fspath(root)
+        self._lock = threading.Lock()
+
+    def _path(self, rec_id: str) -> str:
+        return os.path.join(self._root, f"{rec_id}.json")
+
+    def _write(self, rec: Recording) -> None:
+        os.makedirs(self._root, exist_ok=True)
+        tmp = self._path(rec.id) + f".{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rec.to_dict(), f)
+        os.replace(tmp, self._path(rec.id))
+
+    def _read(self, path: str) -> Optional[Recording]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                d = json.load(f)
+            return Recording(**{k: d[k] for k in Recording.__dataclass_fields__ if k in d})
+        except Exception:
+            return None
+
+    # ---- registry ----
+    def register(self, rec_id: str, pid: int, file: str, rect=None, *, stream: bool = False) -> Recording:
+        rec = Recording(id=rec_id, pid=int(pid), file=file, rect=list(rect) if rect else None,
+                        starttime=_starttime(pid), stream=bool(stream))
+        with self._lock:
+            self._write(rec)
+        return rec
+
+    def update(self, rec_id: str, **fields: Any) -> None:
+        with self._lock:
+            rec = self._read(self._path(rec_id))
+            if rec:
+                for k, v in fields.items():
+                    setattr(rec, k, v)
+                self._write(rec)
+
+    def remove(self, rec_id: str) -> None:
+        try: os.remove(self._path(rec_id))
+        except FileNotFoundError: pass
+
+    def get(self, rec_id: str) -> Optional[Recording]:
+        return self._read(self._path(rec_id))
+
+    def list(self, *, prune: bool = True) -> List[Recording]:
+        """生きている録画（古い順）。prune=True なら死んだものの台帳は消す"""
+        self._import_legacy()
+        out: List[Recording] = []
+        try:
+            names = os.listdir(self._root)
+        except FileNotFoundError:
+            return out
+        for n in names:
+            if not n.endswith(".json"):
+                continue
+            rec = self._read(os.path.join(self._root, n))
+            if rec is None:
+                continue
+            if rec.alive():
+                out.append(rec)
+            elif prune:
+                self.remove(rec.id)
+        out.sort(key=lambda r: r.started)
+        return out
+
+    def latest(self) -> Optional[Recording]:
+        recs = self.list()
+        return recs[-1] if recs else None
+
+    # ---- control ----
+    def stop(self, rec_id: str, timeout: float = 10.0) -> bool:
+        """SIGINT（gst-launch -e が EOS を流してファイルを閉じる）→ 終了を待つ。戻り: 正常に終了したか"""
+        rec = self.get(rec_id)
+        if rec is None or not rec.alive():
+            return True
+        try:
+            os.kill(rec.pid, signal.SIGINT)
+        except ProcessLookupError:
+            return True
+        if wait_exit(rec.pid, timeout):
+            return True
+        # EOS が流れきらない：強制終了（ファイル末尾は不完全になり得る）
+        try: os.kill(rec.pid, signal.SIGKILL)
+        except ProcessLookupError: pass
+        wait_exit(rec.pid, 2.0)
+        return False
+
+    def _import_legacy(self) -> None:
+        """旧 record_state.json が残っていれば台帳に移す（一度だけ）"""
+        try:
+            with open(LEGACY_STATE_PATH, "r", encoding="utf-8") as f:
+                st = json.load(f)
+            os.remove(LEGACY_STATE_PATH)
+        except Exception:
+            return
+        pid, path = int(st.get("pid") or 0), st.get("file")
+        if pid and path and _starttime(pid) is not None:
+            self.register(os.path.splitext(os.path.basename(path))[0], pid, path, st.get("rect"))
+
+_controller: Optional[RecordingController] = None
+
+def get_controller() -> RecordingController:
+    global _controller
+    if _controller is None:
+        _controller = RecordingController()
+    return _controller
+
+__all__ = ["Recording", "RecordingController", "get_controller", "wait_exit", "REGISTRY_DIR"]
@@ -1,14 +1,16 @@
 # app/ss2gd/record_region.py
 from __future__ import annotations
 import os, time, subprocess, signal, asyncio, threading, shlex
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
-from .screencast_portal import start_screencast_session
-from .region_select import select_rect            # (x,y,w,h)
-from .config import ensure_videos_dir
+from .screencast_portal import start_screencast_session, plan_region_sources
+from .recorder import _video_chain, _vp8enc, record_geometry, output_size
+from .region_select import select_rect, rect_scale, screen_scales  # (x,y,w,h)
+from .config import ensure_videos_dir, get_settings
 from .drive_uploader import upload_and_share
 from .clipboard import copy_to_clipboard
 from .notify import notify
+from .gst_supervisor import GstSupervisor
 
 DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
 
@@ -34,20 +36,11 @@ def _run_async(coro):
     if "err" in err: raise err["err"]
     return box["res"]
 
-def _build_crop(monitor_pos: Tuple[int,int], monitor_size: Tuple[int,int], rect: Tuple[int,int,int,int]):
-    mx, my = monitor_pos
-    mw, mh = monitor_size
-    x, y, w, h = rect
-    left   = max(0, x - mx)
-    top    = max(0, y - my)
-    right  = max(0, (mx + mw) - (x + w))
-    bottom = max(0, (my + mh) - (y + h))
-    return left, top, right, bottom
-
 def _gst_try(pipeline: List[str], pass_fds: List[int], duration_sec: int) -> tuple[int, str]:
-    """パイプラインを走らせ、SIGINTで終了。returncode と stderr を返す"""
+    """パイプラインを走らせ、SIGINTで終了。returncode と出力の末尾（リング）を返す"""
     if DEBUG: print("[record] run:", " ".join(shlex.quote(x) for x in pipeline))
     proc = subprocess.Popen(pipeline, pass_fds=pass_fds, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    sup = GstSupervisor(proc, tag="record-cli")   # 録画中も出力を吸い出す（パイプ詰まり防止）
     try:
         time.sleep(max(1, int(duration_sec)))
         proc.send_signal(signal.SIGINT)       # -e で EOS
@@ -59,15 +52,18 @@ def _gst_try(pipeline: List[str], pass_fds: List[int], duration_sec: int) -> tup
         for fd in pass_fds:
             try: os.close(fd)
             except Exception: pass
-    out, err = proc.communicate(timeout=1)
-    return ret, (err or "")
+    sup.join()
+    if DEBUG: print(f"[record] health: {sup.health()}")
+    return ret, sup.tail()
 
-def record_region_to_file(duration_sec: int = 5, framerate: int = 30) -> str:
+def record_region_to_file(duration_sec: int = 5, framerate: int = 30, *,
+                          max_size: Optional[Tuple[int,int]] = None, pixel_mode: Optional[str] = None,
+                          vfr: Optional[bool] = None) -> str:
     """
     1) portal で画面共有開始 → (fd, streams)
     2) 矩形選択
-    3) pipewiresrc (fd=) + (path/target-object/無指定) を試しつつ、
-       videoconvert→videoscale→videorate→caps→videocrop の順で安定化
+    3) recorder と同じ _video_chain（pipewiresrc→videoconvert→videorate→caps→videocrop）。
+       1 本なら pipewiresrc のノード指定（path/target-object/無指定）と形式を順に試す
     4) WebM で保存
     """
     if DEBUG: print("[record] start_screencast_session()")
@@ -75,79 +71,55 @@ def record_region_to_file(duration_sec: int = 5, framerate: int = 30) -> str:
     if not streams:
         raise RuntimeError("No screencast streams from portal")
 
-    node_id = int(streams[0]["node_id"])
-    mon_pos = streams[0]["position"] or (0, 0)
-    mon_size = streams[0]["size"] or (0, 0)
-
     if DEBUG: print("[record] region_select()")
     rect = select_rect()  # (x,y,w,h)
     if not rect or rect[2] <= 0 or rect[3] <= 0:
         raise RuntimeError("Canceled region selection")
 
-    left, top, right, bottom = _build_crop(mon_pos, mon_size, rect)
+    # 矩形と交差するストリームを選ぶ（複数モニタにまたがる場合は合成。画面ごとの比率で切り出す）
+    plan = plan_region_sources(streams, rect, screen_scales())
+    geom = record_geometry(rect_scale(rect), max_size, pixel_mode)
+    if vfr is None:
+        vfr = get_settings().record_vfr
     if DEBUG:
-        print(f"[record] node_id={node_id} monitor_pos={mon_pos} monitor_size={mon_size}")
-        print(f"[record] rect={rect} crop={left,top,right,bottom}")
+        ow, oh = output_size(rect, **geom)
+        print(f"[record] rect={rect} plan={plan} geom={geom} output={ow}x{oh} vfr={vfr}")
 
     out_dir = ensure_videos_dir()
     ts = time.strftime("%Y%m%d_%H%M%S")
     out_path = os.path.join(out_dir, f"REC_{ts}.webm")
 
-    # ターゲット指定のバリエーション
-    target_variants = [
-        ("path", str(node_id)),
-        ("target-object", str(node_id)),
-        None,  # 無指定
-    ]
-    # フォーマットのフォールバック
-    fmt_variants = ["I420", "BGRx", "RGBA"]
-    # フレームレート指定の有無もフォールバック
-    fps_variants = [True, False]
+    # 1 本の時だけフォールバックを試す：ノード指定（path / target-object / 無指定）× 形式 × レート指定の有無
+    # （VFR は固定レートにしない）。合成は既定の組み合わせだけ
+    if len(plan) > 1:
+        variants = [("path", "I420", True)]
+    else:
+        variants = [(tgt, fmt, use_fps) for tgt in ("path", "target-object", None)
+                    for fmt in ("I420", "BGRx", "RGBA") for use_fps in ([False] if vfr else [True, False])]
 
     last_err = ""
-    for tgt in target_variants:
-        for fmt in fmt_variants:
-            for use_fps in fps_variants:
-                dupfd = os.dup(fd)  # 毎回新しい FD を渡す
-                head = ["gst-launch-1.0", "-e", "pipewiresrc", f"fd={dupfd}", "do-timestamp=true"]
-                if tgt is not None:
-                    key, val = tgt
-                    head += [f"{key}={val}"]
-                    if DEBUG: print(f"[record] trying {key}={val}, format={fmt}, fps={'on' if use_fps else 'off'}")
-                else:
-                    if DEBUG: print(f"[record] trying (no target), format={fmt}, fps={'on' if use_fps else 'off'}")
-
-                caps = ["video/x-raw", f"format={fmt}"]
-                if use_fps:
-                    caps.append(f"framerate={int(framerate)}/1")
-
-                tail = [
-                    "!", "queue",
-                    "!", "videoconvert",
-                    "!", "videoscale",
-                    "!", "videorate",
-                    "!", ",".join(caps),    # capsfilter
-                    "!", "videocrop", f"top={top}", f"left={left}", f"right={right}", f"bottom={bottom}",
-                    "!", "queue",
-                    "!", "vp8enc", "deadline=1", "threads=4",
-                    "!", "webmmux", "streamable=true",
-                    "!", "filesink", f"location={out_path}", "sync=true"
-                ]
-
-                ret, err = _gst_try(head + tail, pass_fds=[dupfd], duration_sec=duration_sec)
-                last_err = err
-                if ret == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0:
-                    if DEBUG: print(f"[record] saved: {out_path}")
-                    return out_path
-                else:
-                    if DEBUG:
-                        print(f"[record] variant failed (ret={ret}). stderr:")
-                        print(err)
-                    try:
-                        if os.path.exists(out_path) and os.path.getsize(out_path) == 0:
-                            os.remove(out_path)
-                    except Exception:
-                        pass
+    for tgt, fmt, use_fps in variants:
+        pw_fd = os.dup(fd)  # 毎回新しい FD を渡す（全ストリームでこの 1 つを共有）
+        if DEBUG: print(f"[record] trying target={tgt or '(none)'}, format={fmt}, fps={'on' if use_fps else 'off'}")
+        pipeline = ["gst-launch-1.0", "-e", *_video_chain(pw_fd, plan, rect, framerate, [
+            "!", "queue",
+            "!", *_vp8enc(bool(vfr)),
+            "!", "webmmux", "streamable=true",
+            "!", "filesink", f"location={out_path}", "sync=true",
+        ], vfr=bool(vfr), target=tgt, fmt=fmt, fixed_rate=use_fps, **geom)]
+        ret, err = _gst_try(pipeline, pass_fds=[pw_fd], duration_sec=duration_sec)
+        last_err = err
+        if ret == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+            if DEBUG: print(f"[record] saved: {out_path}")
+            return out_path
+        if DEBUG:
+            print(f"[record] variant failed (ret={ret}). stderr:")
+            print(err)
+        try:
+            if os.path.exists(out_path) and os.path.getsize(out_path) == 0:
+                os.remove(out_path)
+        except Exception:
+            pass
 
     raise RuntimeError("record failed: all variants failed\n" + last_err)
 
@@ -1,52 +1,24 @@
 from __future__ import annotations
-import os, sys, json, time, signal, shlex, subprocess, threading
-from typing import Optional, Tuple, Dict, Any, List
+import os, sys, time, shlex, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Dict, Any, List, Sequence
 
-from .screencast_portal import start_screencast_session
-from .config import ensure_videos_dir, get_screencast_restore_token, load_settings
-from .drive_uploader import upload_and_share
+from .screencast_portal import start_screencast_session, plan_region_sources
+from .config import ensure_videos_dir, get_screencast_restore_token, get_settings, EncodeProfile
+from .drive_uploader import upload_and_share, warm_up
 from .clipboard import copy_to_clipboard
 from .notify import notify
+from .audio_devices import get_audio_registry
+from .tracing import span
+from .gst_supervisor import GstSupervisor
+from .record_controller import get_controller
+from .stream_upload import StreamUpload
 
 DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
 def _dbg(msg: str) -> None:
     if DEBUG: print(f"[rec] {msg}", file=sys.stderr, flush=True)
 
-# ------ state file ------
-def _config_dir() -> str:
-    xdg = os.environ.get("XDG_CONFIG_HOME")
-    base = xdg if xdg else os.path.expanduser("~/.config")
-    d = os.path.join(base, "ss2gdrive")
-    os.makedirs(d, exist_ok=True)
-    return d
-STATE_PATH = os.path.join(_config_dir(), "record_state.json")
-def _save_state(d: Dict[str, Any]) -> None:
-    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH, "w", encoding="utf-8") as f: json.dump(d, f)
-def _load_state() -> Optional[Dict[str, Any]]:
-    try:
-        with open(STATE_PATH, "r", encoding="utf-8") as f: return json.load(f)
-    except Exception:
-        return None
-def _clear_state() -> None:
-    try: os.remove(STATE_PATH)
-    except Exception: pass
-
 # ------ audio detection ------
-def _list_sources() -> List[str]:
-    try:
-        r = subprocess.run(["pactl", "list", "short", "sources"],
-                           capture_output=True, text=True, check=False)
-        out = []
-        for ln in r.stdout.splitlines():
-            cols = ln.split()
-            if len(cols) >= 2:
-                out.append(cols[1])
-        return out
-    except Exception as e:
-        _dbg(f"pactl list sources failed: {e}")
-        return []
-
 def _detect_monitor_source() -> Optional[str]:
     # 1) 環境変数が最優先
     env = os.environ.get("SS2GD_AUDIO_MONITOR")
@@ -55,9 +27,8 @@ def _detect_monitor_source() -> Optional[str]:
         return env
 
     # 2) 設定（audio.mode: auto | none | device）
-    st = load_settings() or {}
-    audio = st.get("audio") or {}
-    mode = (audio.get("mode") or "auto").lower().strip()
+    st = get_settings()
+    mode = st.audio_mode
 
     if mode == "none":
         _dbg("audio mode: none")
@@ -65,7 +36,7 @@ def _detect_monitor_source() -> Optional[str]:
 
     if mode == "device":
         # ★ ユーザー指定を厳密に優先（列挙一致チェックで落とさない）
-        dev = (audio.get("device") or "").strip()
+        dev = st.audio_device
         if dev:
             _dbg(f"audio mode: device -> {dev}")
             return dev
@@ -73,136 +44,475 @@ def _detect_monitor_source() -> Optional[str]:
         return None
 
     # 3) 自動（Default Sink の .monitor → 無ければ最初の monitor）
-    try:
-        r = subprocess.run(["pactl","info"], capture_output=True, text=True, check=False)
-        sink = None
-        for line in r.stdout.splitlines():
-            if "Default Sink:" in line:
-                sink = line.split(":",1)[1].strip(); break
-        if sink:
-            cand = sink + ".monitor"
-            _dbg(f"audio monitor from default sink: {cand}")
-            return cand
-        r2 = subprocess.run(["pactl","list","short","sources"], capture_output=True, text=True, check=False)
-        for ln in r2.stdout.splitlines():
-            cols = ln.split()
-            if len(cols) >= 2 and "monitor" in cols[1]:
-                _dbg(f"audio monitor from sources: {cols[1]}")
-                return cols[1]
-    except Exception as e:
-        _dbg(f"pactl detect failed: {e}")
-    return None
+    cand = get_audio_registry().default_monitor()
+    _dbg(f"audio monitor from registry: {cand!r}")
+    return cand
 
 # ------ gstreamer args ------
-def _build_gst_args(fd_num: int, node_id: int, crop: Tuple[int,int,int,int],
-                    fps: int, out_path: str, audio_device: Optional[str]) -> List[str]:
-    top,left,right,bottom = crop
-    args = [
-        "gst-launch-1.0", "-e",
-        "webmmux", "name=mux", "streamable=true", "!", "filesink", f"location={out_path}", "sync=true",
-        # video
-        "pipewiresrc", f"fd={fd_num}", f"path={node_id}", "do-timestamp=true",
-        "!", "queue", "!", "videoconvert", "!", "videoscale", "!", "videorate",
-        "!", f"video/x-raw,format=I420,framerate={fps}/1",
-        "!", "videocrop", f"top={top}", f"left={left}", f"right={right}", f"bottom={bottom}",
-        "!", "queue", "!", "vp8enc", "deadline=1", "threads=4",
-        "!", "queue", "!", "mux.",
-    ]
+# ベンチ/CI 用：PipeWire/PulseAudio の代わりに videotestsrc/audiotestsrc を使う
+FAKE_SOURCES = bool(os.environ.get("SS2GD_FAKE_SOURCES"))
+
+# 偽ソースの更新頻度（SS2GD_FAKE_FPS=1 で「1 秒に 1 回だけ変化する画面」を模擬）
+FAKE_FPS = int(os.environ.get("SS2GD_FAKE_FPS") or 60)
+# VFR 時、画面が止まっていても最後のフレームを送り直す間隔（ms）。シーク性と末尾の表示用
+VFR_KEEPALIVE_MS = int(os.environ.get("SS2GD_VFR_KEEPALIVE_MS") or 1000)
+
+def _video_src(fd_num: int, node_id: int, src_size: Tuple[int,int], vfr: bool = False,
+               target: Optional[str] = "path") -> List[str]:
+    """target: ノードを指すプロパティ（古い gst-pipewire は target-object。None は PipeWire 任せ）"""
+    if FAKE_SOURCES:
+        w, h = src_size
+        return ["videotestsrc", "is-live=true", "pattern=ball",
+                "!", f"video/x-raw,width={int(w)},height={int(h)},framerate={FAKE_FPS}/1"]
+    src = ["pipewiresrc", f"fd={fd_num}", "do-timestamp=true"]
+    if target:
+        src.append(f"{target}={node_id}")
+    if vfr:
+        # PipeWire は画面に変化（damage）があった時だけバッファを送る。止まっている間は keepalive のみ
+        src.append(f"keepalive-time={VFR_KEEPALIVE_MS}")
+    return src
+
+# dual 出力で各エンコーダの前に置く queue の上限（生フレーム数。0 = fps ぶん ≒ 1 秒）
+DUAL_QUEUE = int(os.environ.get("SS2GD_DUAL_QUEUE") or 0)
+
+def _vp8enc(vfr: bool = False, kbps: int = 0) -> List[str]:
+    enc = ["vp8enc", "deadline=1", "threads=4"]
+    if kbps:
+        enc.append(f"target-bitrate={int(kbps) * 1000}")
+    if vfr:
+        # 変化の無いマクロブロックは符号化を省略。タイムスタンプはミリ秒精度で保持
+        enc += ["static-threshold=100", "timebase=1/1000"]
+    return enc
+
+def _audio_src(audio_device: Optional[str]) -> List[str]:
+    if FAKE_SOURCES:
+        return ["audiotestsrc", "is-live=true", "wave=ticks"]
     if audio_device:
-        args += [
-            "pulsesrc", f"device={audio_device}",
-            "!", "audioconvert", "!", "audioresample", "!", "queue",
-            "!", "opusenc", "bitrate=128000",
-            "!", "queue", "!", "mux.",
-        ]
+        return ["pulsesrc", f"device={audio_device}"]
+    return []
+
+def _fit(w: int, h: int, max_w: int = 0, max_h: int = 0) -> Tuple[int,int]:
+    """アスペクト比を保って max_w x max_h に収める（0 は無制限）。I420 なので偶数に丸める"""
+    r = 1.0
+    if max_w and w > max_w: r = min(r, max_w / w)
+    if max_h and h > max_h: r = min(r, max_h / h)
+    return (max(2, int(w * r) // 2 * 2), max(2, int(h * r) // 2 * 2))
+
+def _calc_crop(p: Dict[str, Any], scale: float, pixel_mode: str) -> Tuple[int,int,int,int]:
+    """
+    plan の切り出し量（論理座標）を、videocrop に渡すバッファ上のピクセルへ。
+    physical: バッファは物理解像度のまま → 論理 px × scale
+    logical : 先にバッファを論理サイズへ縮めるので論理 px のまま
+    """
+    k = 1.0 if pixel_mode == "logical" else scale
+    top, left, right, bottom = p["crop"]
+    return (round(top * k), round(left * k), round(right * k), round(bottom * k))
+
+def _video_chain(fd_num: int, plan: Sequence[Dict[str, Any]], rect: Tuple[int,int,int,int],
+                 fps: int, downstream: Sequence[str], *, scale: float = 1.0,
+                 pixel_mode: str = "physical", max_size: Tuple[int,int] = (0, 0), vfr: bool = False,
+                 target: Optional[str] = "path", fmt: str = "I420", fixed_rate: bool = True) -> List[str]:
+    """
+    rect の I420 映像を downstream（"!" で始まる後段）へ流すチェーン。
+    ストリームが 1 本なら切り出すだけ。矩形が複数モニタにまたがる場合は、必要なストリームだけを
+    読んでそれぞれ先に切り出してから compositor で並べる（仮想デスクトップ全体はエンコードしない）。
+    fd_num は ScreenCast の PipeWire リモート。gst-pipewire は fd 番号ごとに接続を 1 つ共有するので、
+    全ての pipewiresrc に同じ番号を渡す（番号を分けると 1 つのソケットに別々の接続を張ってしまう）。
+    scale は矩形がある画面の devicePixelRatio（出力の大きさを決める）。plan の各要素に "scale" があれば
+    そのストリーム（画面）自身の比率で切り出し、出力の比率に揃えてから並べる。
+    max_size を超える場合は切り出し後に縮小する。
+    vfr=True では videorate で複製フレームを作らず（drop-only、上限 fps）、ソースが送ってきた
+    フレームだけをタイムスタンプ付きで流す（静止画面ではほぼ keepalive だけになる）。
+    target / fmt / fixed_rate は 1 本の時のフォールバック用（pipewiresrc のノード指定、受け取る形式、
+    caps にフレームレートを書くか）。
+    """
+    scale = float(scale or 1.0)
+    k = 1.0 if pixel_mode == "logical" else scale
+    _x, _y, w, h = rect
+    cw, ch = round(w * k), round(h * k)          # 切り出し直後の大きさ
+    ow, oh = _fit(cw, ch, *max_size)
+    resize = [] if (ow, oh) == (cw, ch) else ["!", "videoscale", "!", f"video/x-raw,width={ow},height={oh}"]
+
+    rate = ["videorate", "drop-only=true", f"max-rate={fps}"] if vfr else ["videorate"]
+    def head(p: Dict[str, Any], caps: str) -> List[str]:
+        s = float(p.get("scale") or scale)
+        lw, lh = p["size"]
+        out = [*_video_src(fd_num, p["node_id"], (round(lw * s), round(lh * s)), vfr, target),
+               "!", "queue", "!", "videoconvert", "!", *rate, "!", caps]
+        if pixel_mode == "logical" and s != 1.0:
+            # 物理解像度のバッファを論理サイズへ縮めてから論理座標で切り出す
+            out += ["!", "videoscale", "!", f"video/x-raw,width={lw},height={lh}"]
+        top, left, right, bottom = _calc_crop(p, s, pixel_mode)
+        out += ["!", "videocrop", f"top={top}", f"left={left}", f"right={right}", f"bottom={bottom}"]
+        if pixel_mode != "logical" and s != k:
+            # 画面ごとに比率が違う：出力の比率（k）に揃える
+            ct, cl, cr, cb = p["crop"]
+            out += ["!", "videoscale", "!",
+                    f"video/x-raw,width={round((lw - cl - cr) * k)},height={round((lh - ct - cb) * k)}"]
+        return out
+
+    if len(plan) == 1:
+        caps = f"video/x-raw,format={fmt}" + ("" if vfr or not fixed_rate else f",framerate={fps}/1")
+        conv = [] if fmt == "I420" else ["!", "videoconvert", "!", "video/x-raw,format=I420"]
+        return [*head(plan[0], caps), *conv, *resize, *downstream]
+    args = ["compositor", "name=comp", "background=black",
+            *[f"sink_{i}::{key}={round(p[key] * k)}" for i, p in enumerate(plan) for key in ("xpos", "ypos")],
+            "!", "videoconvert", "!", f"video/x-raw,format=I420,width={cw},height={ch},framerate={fps}/1",
+            *resize, *downstream]
+    # compositor は出力側が一定レートになるので、VFR では vp8enc の static-threshold だけが効く
+    for i, p in enumerate(plan):
+        args += [*head(p, "video/x-raw" if vfr else f"video/x-raw,framerate={fps}/1"),
+                 "!", "queue", "!", f"comp.sink_{i}"]
     return args
 
-def _calc_crop(rect: Tuple[int,int,int,int], monitor_pos: Tuple[int,int], monitor_size: Tuple[int,int]) -> Tuple[int,int,int,int]:
-    x,y,w,h = rect; mx,my = monitor_pos; mw,mh = monitor_size
-    top    = max(0, y - my)
-    left   = max(0, x - mx)
-    right  = max(0, (mx+mw) - (x+w))
-    bottom = max(0, (my+mh) - (y+h))
-    return (top,left,right,bottom)
+def record_geometry(scale: float = 1.0, max_size: Optional[Tuple[int,int]] = None,
+                    pixel_mode: Optional[str] = None) -> Dict[str, Any]:
+    """_video_chain に渡す解像度関連の引数（省略分は設定から）"""
+    st = get_settings()
+    if max_size is None:
+        max_size = (st.record_max_width, st.record_max_height)
+    return {"scale": float(scale or 1.0), "pixel_mode": pixel_mode or st.record_pixel_mode,
+            "max_size": (int(max_size[0] or 0), int(max_size[1] or 0))}
 
-# ------ public API ------
-def start_recording(*, fps: int = 30, rect: Tuple[int,int,int,int]) -> str:
+def output_size(rect: Tuple[int,int,int,int], *, scale: float = 1.0, pixel_mode: str = "physical",
+                max_size: Tuple[int,int] = (0, 0)) -> Tuple[int,int]:
+    """録画される映像の大きさ（UI 表示・ベンチ用）"""
+    k = 1.0 if pixel_mode == "logical" else float(scale or 1.0)
+    return _fit(round(rect[2] * k), round(rect[3] * k), *max_size)
+
+def share_path(out_path: str) -> str:
+    """dual 録画の共有用ファイル（保存用 REC_x.webm の隣の REC_x.share.webm）"""
+    return os.path.splitext(out_path)[0] + ".share.webm"
+
+def _file_sink(path: str) -> List[str]:
+    return ["filesink", f"location={path}", "sync=true"]
+
+def _bounded_queue(n: int) -> List[str]:
+    # 片方のエンコーダが遅れても生フレームを溜め込まない（満杯なら tee ごと待つ。フレームは捨てない）
+    return ["queue", f"max-size-buffers={n}", "max-size-bytes=0", "max-size-time=0"]
+
+def _build_gst_args(fd_num: int, plan: Sequence[Dict[str, Any]], rect: Tuple[int,int,int,int],
+                    fps: int, out_path: str, audio_device: Optional[str], vfr: bool = False,
+                    stream_fd: Optional[int] = None, archive: Optional[EncodeProfile] = None,
+                    share: Optional[EncodeProfile] = None, **geom: Any) -> List[str]:
     """
-    録画を非同期開始。矩形 rect=(x,y,w,h) は **UI で取得して渡すこと**。
-    戻り: 出力ファイルパス（まだ中身は録画中）
+    stream_fd: ファイルではなくパイプへ（StreamUpload がそのまま Drive へ送る）
+    share を渡すと、切り出し後の映像・音声を tee で 2 つのエンコーダに分けて 2 本書く（dual）。
+      mux   : archive（保存用）→ out_path
+      mux_s : share（共有用。縮小・低ビットレート）→ stream_fd か share_path(out_path)
+    後から再エンコードするのと違い、キャプチャ・変換・切り出しは 1 回で済む。
     """
-    if not rect or len(rect) != 4:
-        raise ValueError("rect is required: (x,y,w,h)")
+    archive = archive or EncodeProfile()
+    out_sink = ["fdsink", f"fd={stream_fd}"] if stream_fd is not None else None
+    if share is None:
+        args = [
+            "gst-launch-1.0", "-e",
+            "webmmux", "name=mux", "streamable=true", "!", *(out_sink or _file_sink(out_path)),
+            # video
+            *_video_chain(fd_num, plan, rect, fps, [
+                "!", "queue", "!", *_vp8enc(vfr, archive.video_kbps),
+                "!", "queue", "!", "mux.",
+            ], vfr=vfr, **geom),
+        ]
+    else:
+        q = _bounded_queue(DUAL_QUEUE or max(1, int(fps)))
+        # 共有用は保存用の出力をさらに share の上限に収める
+        aw, ah = output_size(rect, **geom)
+        sw, sh = _fit(aw, ah, share.max_width, share.max_height)
+        resize = [] if (sw, sh) == (aw, ah) else ["!", "videoscale", "!", f"video/x-raw,width={sw},height={sh}"]
+        args = [
+            "gst-launch-1.0", "-e",
+            "webmmux", "name=mux", "streamable=true", "!", *_file_sink(out_path),
+            "webmmux", "name=mux_s", "streamable=true", "!", *(out_sink or _file_sink(share_path(out_path))),
+            *_video_chain(fd_num, plan, rect, fps, [
+                "!", "tee", "name=vt",
+                "vt.", "!", *q, "!", *_vp8enc(vfr, archive.video_kbps), "!", "queue", "!", "mux.",
+                "vt.", "!", *q, *resize, "!", *_vp8enc(vfr, share.video_kbps), "!", "queue", "!", "mux_s.",
+            ], vfr=vfr, **geom),
+        ]
+    asrc = _audio_src(audio_device)
+    if asrc:
+        args += [*asrc, "!", "audioconvert", "!", "audioresample"]
+        if share is None:
+            args += ["!", "queue", "!", "opusenc", f"bitrate={archive.audio_kbps * 1000}", "!", "queue", "!", "mux."]
+        else:
+            args += ["!", "tee", "name=at",
+                     "at.", "!", "queue", "!", "opusenc", f"bitrate={archive.audio_kbps * 1000}", "!", "queue", "!", "mux.",
+                     "at.", "!", "queue", "!", "opusenc", f"bitrate={share.audio_kbps * 1000}", "!", "queue", "!", "mux_s."]
+    return args
 
-    _dbg("start_screencast_session()")
-    restore = get_screencast_restore_token()
-    fd, streams, _ = asyncio_run(start_screencast_session(restore_token=restore))
-    if not streams: raise RuntimeError("screencast: no streams")
-    s = streams[0]
-    node_id = int(s["node_id"])
-    mon_pos = s.get("position") or (0,0)
-    mon_sz  = s.get("size") or (1920,1080)
+# ------ start latency ------
+# start_recording の段階別所要時間（秒。録画 ID → 値）。first_frame は Start→最初のフレームが mux に届くまで。
+_start_metrics: Dict[str, Dict[str, Any]] = {}
+_first_frame: Dict[str, threading.Event] = {}
+FIRST_FRAME_TIMEOUT = float(os.environ.get("SS2GD_FIRST_FRAME_TIMEOUT", "5"))
+# 停止後、ストリーミングの残り（窓に溜まった分と最後のチャンク）を送り終えるまで待つ上限（秒）
+STREAM_TAIL_TIMEOUT = float(os.environ.get("SS2GD_STREAM_TAIL_TIMEOUT") or 600)
+
+# 録画中の gst-launch の出力監視（このプロセスが起動したものだけ。録画 ID → 監視役）
+_supervisors: Dict[str, GstSupervisor] = {}
+# ストリーミング録画のアップロード（録画 ID → StreamUpload）
+_uploads: Dict[str, StreamUpload] = {}
+# dual のストリーミング録画の保存用ファイル（録画 ID → パス。送信に失敗した時はこれを送る）
+_archives: Dict[str, str] = {}
+
+def recording_id(out_path: str) -> str:
+    """start_recording の戻り値（出力パス）から録画 ID"""
+    return os.path.splitext(os.path.basename(out_path))[0]
+
+def recording_health(rec_id: Optional[str] = None) -> Dict[str, Any]:
+    """警告数・フレーム落ち・"can't keep up" 等（省略時は最後に始めた録画。無ければ空）"""
+    if not rec_id and _supervisors:
+        rec_id = list(_supervisors)[-1]
+    sup = _supervisors.get(rec_id) if rec_id else None
+    if not sup:
+        return {}
+    h = sup.health()
+    if rec_id in _uploads:
+        h["upload"] = _uploads[rec_id].health()
+    return h
 
-    crop = _calc_crop(rect, mon_pos, mon_sz)
-    _dbg(f"node_id={node_id} rect={rect} crop={crop}")
+def has_stream_upload(rec_id: Optional[str]) -> bool:
+    """この録画のストリーミングアップロードをこのプロセスが持っているか（閉じると失われる）"""
+    return bool(rec_id) and rec_id in _uploads
 
+def _latest_id(rec_id: Optional[str]) -> Optional[str]:
+    if not rec_id and _start_metrics:
+        rec_id = list(_start_metrics)[-1]
+    return rec_id
+
+def last_start_metrics(rec_id: Optional[str] = None) -> Dict[str, Any]:
+    """省略時は最後に始めた録画"""
+    return dict(_start_metrics.get(_latest_id(rec_id) or "", {}))
+
+def wait_first_frame(timeout: float = FIRST_FRAME_TIMEOUT, rec_id: Optional[str] = None) -> Optional[float]:
+    """最初のフレームが書かれるまで待つ（省略時は最後に始めた録画）。戻り: Start からの秒数（タイムアウト/失敗は None）"""
+    rec_id = _latest_id(rec_id)
+    ev = _first_frame.get(rec_id or "")
+    if ev is None or not ev.wait(timeout):
+        return None
+    return _start_metrics.get(rec_id, {}).get("first_frame")
+
+def _watch_first_frame(p: subprocess.Popen, out_path: str, t0: float, rec_id: str) -> None:
+    """
+    webmmux は最初のバッファを受け取った時点でヘッダを書き出すので、
+    出力ファイル（ストリーミングならパイプ）が空でなくなった瞬間を「最初のエンコード済みフレーム」とみなす。
+    """
+    up = _uploads.get(rec_id)
+    m, ev = _start_metrics[rec_id], _first_frame[rec_id]
+    deadline = t0 + max(FIRST_FRAME_TIMEOUT, 1.0) * 6
+    while time.monotonic() < deadline:
+        try:
+            if (up.bytes_in if up else os.path.getsize(out_path)) > 0:
+                dt = time.monotonic() - t0
+                m["first_frame"] = dt
+                _dbg(f"first frame after {dt*1000:.0f} ms ({_fmt_metrics(m)})")
+                try: get_controller().update(rec_id, first_frame_ms=int(dt * 1000))
+                except Exception as e: _dbg(f"registry update failed: {e}")
+                ev.set()
+                return
+        except OSError:
+            pass
+        if p.poll() is not None:
+            _dbg(f"gst exited before first frame (ret={p.returncode})")
+            ev.set()
+            return
+        time.sleep(0.01)
+    _dbg("first frame not observed")
+    ev.set()
+
+def _fmt_metrics(m: Dict[str, Any]) -> str:
+    return ", ".join(f"{k}={v*1000:.0f}ms" for k, v in m.items() if isinstance(v, float))
+
+def _prepare_output(create: bool = True) -> str:
+    """出力パス。create=False（ローカルに保存しないストリーミング）はファイルを作らず名前だけ決める"""
     out_dir = ensure_videos_dir()
     base = time.strftime("REC_%Y%m%d_%H%M%S")
-    out_path = os.path.join(out_dir, f"{base}.webm")
+    # 同時録画で同じ秒に始まっても衝突しないように（ファイル名が録画 ID になる）
+    ctl = get_controller()
+    path, n = os.path.join(out_dir, f"{base}.webm"), 1
+    while True:
+        try:
+            if ctl.get(recording_id(path)) or (not create and os.path.exists(path)):
+                raise FileExistsError(path)
+            if create:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return path
+        except FileExistsError:
+            n += 1
+            path = os.path.join(out_dir, f"{base}_{n}.webm")
 
-    fd_child = os.dup(fd)
-    os.close(fd)
+# ------ public API ------
+def start_recording(*, fps: int = 30, rect: Tuple[int,int,int,int], scale: float = 1.0,
+                    max_size: Optional[Tuple[int,int]] = None, pixel_mode: Optional[str] = None,
+                    vfr: Optional[bool] = None, stream: Optional[bool] = None,
+                    keep_local: Optional[bool] = None, dual: Optional[bool] = None,
+                    screens: Optional[Sequence[Sequence[float]]] = None) -> str:
+    """
+    録画を非同期開始。矩形 rect=(x,y,w,h)（論理座標）は **UI で取得して渡すこと**。
+    scale はその画面の devicePixelRatio、screens は region_select.screen_scales()（モニタごとに比率が
+    違う時に、またがった矩形を各画面の比率で切り出す）。max_size / pixel_mode / vfr を省略すると設定値を使う。
+    stream=True なら出力をファイルに書かず、録画しながら Drive へ送る（keep_local でローカルにも保存）。
+    dual=True なら保存用（設定の record.archive）をローカルに、共有用（record.share）を
+    アップロード側（stream ならパイプ、でなければ share_path()）に同時に書く。
+    ポータルとの往復中に、音声デバイス解決と出力先の準備を並行して行う。
+    戻り: 出力ファイルパス（まだ中身は録画中。ローカル保存なしのストリーミングでは作られない）。
+    最初のフレームは wait_first_frame(rec_id=recording_id(戻り値)) で待てる。
+    """
+    if not rect or len(rect) != 4:
+        raise ValueError("rect is required: (x,y,w,h)")
+
+    t0 = time.monotonic()
+    m: Dict[str, Any] = {}    # 録画 ID が決まったら _start_metrics へ
+    st = get_settings()
+    stream = st.record_stream if stream is None else bool(stream)
+    keep_local = st.record_keep_local if keep_local is None else bool(keep_local)
+    dual = st.record_dual if dual is None else bool(dual)
+    local = keep_local or not stream or dual
 
-    audio_dev = _detect_monitor_source()
+    _dbg("start_screencast_session()")
+    restore = get_screencast_restore_token()
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="ss2gd-rec-prep") as ex:
+        f_audio = ex.submit(_detect_monitor_source)
+        f_out   = ex.submit(_prepare_output, local)
+        try:
+            fd, streams, _ = asyncio_run(start_screencast_session(restore_token=restore))
+        except Exception:
+            # 先に作った空の出力ファイルを残さない
+            if local:
+                try: os.remove(f_out.result())
+                except Exception: pass
+            raise
+        m["portal"] = time.monotonic() - t0
+        audio_dev = f_audio.result()
+        out_path  = f_out.result()
     _dbg(f"audio device resolved: {audio_dev!r}")
 
-    args = _build_gst_args(fd_child, node_id, crop, fps, out_path, audio_dev)
+    if not streams:
+        os.close(fd)
+        if local:
+            try: os.remove(out_path)
+            except OSError: pass
+        raise RuntimeError("screencast: no streams")
+    # 矩形と交差するストリームだけ（またがる場合は複数本を合成）
+    plan = plan_region_sources(streams, rect, screens)
+    m["streams"] = len(plan)
+    _dbg(f"rect={rect} plan={plan}")
+
+    geom = record_geometry(scale, max_size, pixel_mode)
+    m["output"] = output_size(rect, **geom)
+    _dbg(f"output {geom} -> {m['output']}")
+    if vfr is None:
+        vfr = st.record_vfr
+    m["vfr"] = bool(vfr)
+    rec_id = recording_id(out_path)
+    _start_metrics[rec_id], _first_frame[rec_id] = m, threading.Event()
+    up = None
+    if stream:
+        # パイプの向こうで resumable upload を始める（ローカル保存は I/O 優先度を下げて別スレッド）
+        # dual では保存用は gst が別に書くので、ここではコピーしない
+        name = os.path.basename(share_path(out_path) if dual else out_path)
+        up = StreamUpload(name, "video/webm", local_path=out_path if keep_local and not dual else None,
+                          description=name, region=rect)
+        _uploads[rec_id] = up
+        if dual:
+            _archives[rec_id] = out_path
+    m["stream"] = stream
+    m["dual"] = dual
+    # 全ストリームで 1 つの PipeWire fd を共有する
+    args = _build_gst_args(fd, plan, rect, fps, out_path, audio_dev, vfr=bool(vfr),
+                           stream_fd=up.writer_fd if up else None, archive=st.record_archive,
+                           share=st.record_share if dual else None, **geom)
     _dbg("launch gst-launch-1.0")
-    p = subprocess.Popen(args, pass_fds=(fd_child,), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    os.close(fd_child)
+    try:
+        p = subprocess.Popen(args, pass_fds=(fd, *([up.writer_fd] if up else [])),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finally:
+        os.close(fd)
+        if up: up.spawned()
+    # 出力を読み続けないと、パイプが埋まった時点で gst-launch が止まる
+    _supervisors[rec_id] = GstSupervisor(p, tag=rec_id)
+    m["spawn"] = time.monotonic() - t0
 
-    _save_state({"pid": p.pid, "file": out_path})
-    try: notify("Recording started")
-    except Exception: pass
+    get_controller().register(rec_id, p.pid, out_path, rect, stream=stream)
+    m["id"] = rec_id
+    threading.Thread(target=_watch_first_frame, args=(p, out_path, t0, rec_id),
+                     name="ss2gd-first-frame", daemon=True).start()
+    threading.Thread(target=_notify_quiet, args=("Recording started",), daemon=True).start()
     _dbg(f"recording pid={p.pid}, out={out_path}")
     return out_path
 
-def stop_recording(*, open_browser: bool = True, copy_link: bool = True) -> Optional[str]:
-    """録画停止 → Drive アップロード。リンクを返す。"""
-    st = _load_state()
-    if not st:
-        _dbg("no active state")
+def _copy_quiet(link: str) -> None:
+    try: copy_to_clipboard(link)
+    except Exception as e: _dbg(f"clipboard err: {e}")
+
+def _notify_quiet(msg: str) -> None:
+    try: notify(msg)
+    except Exception: pass
+
+def stop_recording(rec_id: Optional[str] = None, *, open_browser: bool = True,
+                   copy_link: bool = True) -> Optional[str]:
+    """
+    録画停止 → Drive アップロード。リンクを返す。
+    rec_id 省略時は最後に始まった録画。別プロセス（CLI ↔ UI）が始めた録画も止められる。
+    """
+    ctl = get_controller()
+    rec = ctl.get(rec_id) if rec_id else ctl.latest()
+    rid = rec.id if rec else rec_id
+    up = _uploads.pop(rid, None) if rid else None
+    archive = _archives.pop(rid, None) if rid else None
+    if not rec and not up:
+        _dbg(f"no active recording ({rec_id!r})")
         try: notify("No active recording")
         except Exception: pass
         return None
 
-    pid = int(st.get("pid", 0))
-    out_path = st.get("file")
-    _dbg(f"stopping pid={pid}")
+    if rec and rec.stream and up is None:
+        # ストリーミングのアップロードは録画を始めたプロセスが持っている：止めるだけ
+        with span("record.finalize", pid=rec.pid):
+            ctl.stop(rec.id)
+        try: notify("Recording stopped; uploading from the recording window")
+        except Exception: pass
+        return None
 
-    try: os.kill(pid, signal.SIGINT)  # EOS
-    except ProcessLookupError: pass
+    if rec:
+        _dbg(f"stopping {rec.id} pid={rec.pid}")
+        if up is None: warm_up()   # EOS の書き出しを待つ間に
+        # SIGINT → EOS → pidfd で終了を待つ（ポーリングしない）
+        with span("record.finalize", pid=rec.pid):
+            clean = ctl.stop(rec.id)
+        if not clean:
+            _dbg("gst did not finish EOS in time; killed")
+    # rec が無い＝別プロセスが止めて台帳も掃除済み。アップロードはこのプロセスで続いている
 
-    # 最大10秒待機
-    for _ in range(100):
-        try:
-            ret = os.waitpid(pid, os.WNOHANG)[1]
-            if ret != 0: break
-        except ChildProcessError:
-            break
-        time.sleep(0.1)
-
-    if not out_path or not os.path.exists(out_path) or os.path.getsize(out_path) == 0:
-        _clear_state()
+    _start_metrics.pop(rid, None); _first_frame.pop(rid, None)
+    sup = _supervisors.pop(rid, None)
+    if sup:
+        sup.join()
+        _dbg(f"health: {sup.health()}")
+
+    out_path = rec.file if rec else up.local_path
+    region = rec.rect if rec else up.region
+    written = up.bytes_in if up else (os.path.getsize(out_path) if out_path and os.path.exists(out_path) else 0)
+    if written == 0:
+        ctl.remove(rid)
         try: notify("Record failed: no output")
         except Exception: pass
-        raise RuntimeError("record failed: no output")
+        tail = sup.tail(20) if sup else ""
+        raise RuntimeError("record failed: no output" + (f"\n{tail}" if tail else ""))
 
-    _dbg(f"saved: {out_path}")
-    try: notify("Uploading video…")
-    except Exception: pass
-
-    link = upload_and_share(out_path, "video/webm", os.path.basename(out_path))
+    if up:
+        link = _stream_link(up, archive)
+    else:
+        _dbg(f"saved: {out_path}")
+        # dual なら共有用（低ビットレート）の方を送る。保存用はローカルに残す
+        sp = share_path(out_path)
+        if os.path.exists(sp) and os.path.getsize(sp) > 0:
+            out_path = sp
+        try: notify("Uploading video…")
+        except Exception: pass
+        link = upload_and_share(out_path, "video/webm", os.path.basename(out_path), kind="record", region=region,
+                                on_link=_copy_quiet if copy_link else None)
     _dbg(f"uploaded: {link}")
     try: notify("Uploaded video")
     except Exception: pass
@@ -212,12 +522,32 @@ def stop_recording(*, open_browser: bool = True, copy_link: bool = True) -> Opti
         except Exception as e: _dbg(f"clipboard err: {e}")
     if open_browser:
         try:
-            import webbrowser; webbrowser.open(link)
+            import webbrowser
+            with span("browser.open"): webbrowser.open(link)
         except Exception as e: _dbg(f"browser err: {e}")
 
-    _clear_state()
+    ctl.remove(rid)
     return link
 
+def _stream_link(up: StreamUpload, archive: Optional[str] = None) -> str:
+    """
+    録画中に送り終えた分の続き（最後のチャンク）を待つ。失敗してもローカル保存があればそこから送る
+    （dual では共有用のローカルコピーは無いので、保存用 archive を送る）
+    """
+    try:
+        with span("record.stream_tail", size=up.bytes_in):
+            return up.result(STREAM_TAIL_TIMEOUT)
+    except Exception as e:
+        local = up.local_path or archive
+        if not (local and os.path.exists(local) and os.path.getsize(local) > 0):
+            raise
+        _dbg(f"stream upload failed ({e}); uploading the local copy")
+        return upload_and_share(local, "video/webm", os.path.basename(local), kind="record", region=up.region)
+
+def list_recordings():
+    """生きている録画（他プロセスが始めたものも含む）"""
+    return get_controller().list()
+
 # ---- async helper ----
 def asyncio_run(coro):
     import asyncio
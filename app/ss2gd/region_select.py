@@ -1,12 +1,17 @@
 # app/ss2gd/region_select.py
 from __future__ import annotations
-import sys
-from typing import Tuple, Optional, List
+import os, sys, time
+from typing import Tuple, Optional, List, Dict
 
 from PySide6.QtCore import Qt, QRect, QPoint, Signal, QEventLoop
 from PySide6.QtGui import QGuiApplication, QPainter, QColor, QPen, QKeyEvent, QMouseEvent
 from PySide6.QtWidgets import QApplication, QWidget, QRubberBand
 
+from .config import set_last_region
+
+# ドラッグ中の描画時間を計測して選択終了時に表示（SS2GD_SELECT_PERF=1）
+PERF = bool(os.environ.get("SS2GD_SELECT_PERF"))
+
 class _SelectOverlay(QWidget):
     """各モニタ上に出す半透明オーバーレイ。ドラッグで矩形選択。"""
     finished = Signal(QRect)   # ウィンドウ座標の矩形を返す
@@ -23,13 +28,30 @@ class _SelectOverlay(QWidget):
         self._rubber.hide()
         self._dim_color = QColor(0, 0, 0, 100)
         self._frame_pen = QPen(QColor(255, 255, 255, 220), 2, Qt.DotLine)
+        # 再描画で広げる余白（ペン幅ぶん + アンチエイリアス）
+        self._margin = int(self._frame_pen.width()) + 2
+        self._paint_ms: List[float] = []
+        self._paint_ts: List[float] = []
+
+    def reset(self) -> None:
+        """再利用前に状態を初期化"""
+        self._dragging = False
+        self._rubber.hide()
+        self._paint_ms.clear(); self._paint_ts.clear()
 
-    def paintEvent(self, _event):
+    def paintEvent(self, event):
+        t0 = time.perf_counter() if PERF else 0.0
         p = QPainter(self)
-        p.fillRect(self.rect(), self._dim_color)
+        # 全面ではなく汚れた領域だけを塗る
+        p.fillRect(event.rect(), self._dim_color)
         if self._rubber.isVisible():
             p.setPen(self._frame_pen)
             p.drawRect(self._rubber.geometry())
+        if PERF and self._dragging:
+            p.end()
+            t1 = time.perf_counter()
+            self._paint_ms.append((t1 - t0) * 1000.0)
+            self._paint_ts.append(t1)
 
     def keyPressEvent(self, e: QKeyEvent):
         if e.key() in (Qt.Key_Escape, Qt.Key_Q):
@@ -46,9 +68,24 @@ class _SelectOverlay(QWidget):
 
     def mouseMoveEvent(self, e: QMouseEvent):
         if self._dragging:
+            old = self._rubber.geometry()
             rect = QRect(self._origin, e.pos()).normalized()
+            if rect == old:
+                return
             self._rubber.setGeometry(rect)
-            self.update()
+            # 旧矩形と新矩形の和だけを再描画（4K 多画面でも全面塗りを避ける）
+            m = self._margin
+            self.update(old.united(rect).adjusted(-m, -m, m, m))
+
+    def perf_report(self) -> Optional[str]:
+        if not self._paint_ms:
+            return None
+        ms = sorted(self._paint_ms)
+        gaps = [(b - a) * 1000.0 for a, b in zip(self._paint_ts, self._paint_ts[1:])]
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        frame = (sum(gaps) / len(gaps)) if gaps else 0.0
+        return (f"{self.width()}x{self.height()}: {len(ms)} paints, paint avg={sum(ms)/len(ms):.2f}ms "
+                f"p95={p95:.2f}ms max={ms[-1]:.2f}ms, frame interval avg={frame:.1f}ms")
 
     def mouseReleaseEvent(self, e: QMouseEvent):
         if e.button() == Qt.LeftButton and self._dragging:
@@ -60,18 +97,48 @@ class _SelectOverlay(QWidget):
                 return
             self.finished.emit(rect)  # ローカル座標（後でグローバルに直す）
 
+# ---- overlay pool ----
+# 常駐プロセス（トレイ/録画UI）では画面ごとのオーバーレイを作り置きして使い回す
+_pool: Dict[Tuple[str, int, int, int, int], _SelectOverlay] = {}
+
+def _screen_key(s) -> Tuple[str, int, int, int, int]:
+    g = s.geometry()
+    return (s.name(), g.x(), g.y(), g.width(), g.height())
+
+def _overlays_for(screens) -> List[_SelectOverlay]:
+    keys = [_screen_key(s) for s in screens]
+    # 構成が変わった画面のオーバーレイは破棄
+    for k in [k for k in _pool if k not in keys]:
+        try: _pool.pop(k).deleteLater()
+        except Exception: pass
+    out = []
+    for s, k in zip(screens, keys):
+        ov = _pool.get(k)
+        if ov is None:
+            ov = _SelectOverlay(s.geometry())
+            _pool[k] = ov
+        ov.reset()
+        out.append(ov)
+    return out
+
+def prepare_overlays() -> None:
+    """常駐プロセスの起動時に呼ぶと、初回の選択でもウィンドウ生成を待たずに済む"""
+    QApplication.instance() or QApplication(sys.argv)
+    _overlays_for(QGuiApplication.screens())
+
 def select_rect() -> Tuple[int, int, int, int]:
     """
     画面を暗転オーバーレイしてドラッグ矩形を選ばせる。
     戻り値は (x, y, w, h) の“グローバル座標”。Esc/0サイズでキャンセル時は RuntimeError。
     既に QApplication が動作中でも、ローカル QEventLoop だけを回すので安全。
+    オーバーレイは閉じずに隠して次回に再利用する。
     """
     app = QApplication.instance() or QApplication(sys.argv)
     screens = QGuiApplication.screens()
     if not screens:
         raise RuntimeError("No screens")
 
-    overlays: List[_SelectOverlay] = []
+    overlays = _overlays_for(screens)
     result_rect_global: Optional[QRect] = None
     loop = QEventLoop()
 
@@ -84,26 +151,49 @@ def select_rect() -> Tuple[int, int, int, int]:
             g.translate(ov.geometry().topLeft())  # ローカル→グローバル
             result_rect_global = g
         for w in overlays:
-            w.close()
+            w.hide()
         loop.quit()  # ← app.exec() は使わずローカルループだけを終了
 
-    for s in screens:
-        ov = _SelectOverlay(s.geometry())
+    for ov in overlays:
         ov.finished.connect(lambda rect, o=ov: on_finished_from(o, rect))
         ov.showFullScreen()
-        overlays.append(ov)
 
     # 常にローカルイベントループのみ実行（既存アプリに干渉しない）
     loop.exec()
 
+    for ov in overlays:
+        try: ov.finished.disconnect()
+        except Exception: pass
+        if PERF:
+            rep = ov.perf_report()
+            if rep: print(f"[select] {rep}", file=sys.stderr, flush=True)
+
     if not result_rect_global or result_rect_global.isNull():
         raise RuntimeError("Selection canceled")
 
-    return (
+    rect = (
         int(result_rect_global.x()),
         int(result_rect_global.y()),
         int(result_rect_global.width()),
         int(result_rect_global.height()),
     )
-
-__all__ = ["select_rect"]
+    # 「前回の矩形」ファストショット用に覚えておく
+    try: set_last_region(rect, rect_scale(rect), screen_scales())
+    except Exception: pass
+    return rect
+
+def rect_scale(rect: Tuple[int, int, int, int]) -> float:
+    """矩形（論理座標）がある画面の devicePixelRatio（物理 px / 論理 px）"""
+    x, y, w, h = rect
+    scr = QGuiApplication.screenAt(QPoint(x + w // 2, y + h // 2)) or QGuiApplication.primaryScreen()
+    return float(scr.devicePixelRatio()) if scr else 1.0
+
+def screen_scales() -> List[Tuple[int, int, int, int, float]]:
+    """画面ごとの (x,y,w,h,devicePixelRatio)（論理座標）。画面ごとに比率が違う構成の合成用"""
+    out = []
+    for scr in QGuiApplication.screens():
+        g = scr.geometry()
+        out.append((g.x(), g.y(), g.width(), g.height(), float(scr.devicePixelRatio())))
+    return out
+
+__all__ = ["select_rect", "prepare_overlays", "rect_scale", "screen_scales"]
@@ -0,0 +1,209 @@
+# app/ss2gd/retention.py
+"""
+ローカルに溜まる録画（~/Videos/SS2GDrive）とスクショの一時ファイル（/tmp/ss2gd-*）の掃除。
+
+  - 容量上限（retention.max_mb）と期限（retention.max_age_days）。0 はそれぞれ無制限
+  - アップロード済みか（ローカル履歴に同じパスがあるか）を先に見て、済みのものから LRU 順に消す
+  - 未アップロードの録画は retention.evict_unuploaded が有効な時だけ消す
+  - 一時ファイルはアップロード済みなら TMP_GRACE 秒後に消す（設定が無くても溜まらない）
+  - 録画中のファイル（台帳にあるもの）と書き込み直後のファイルには触らない
+
+毎回ディレクトリ全体を見ない：ファイル一覧はメモリに持ち、ディレクトリの mtime が
+変わった時だけ読み直す。トレイでは start() のバックグラウンドスレッドが少しずつ消す。
+"""
+from __future__ import annotations
+import os, sys, time, fnmatch, threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import ensure_videos_dir, get_settings
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[gc] {msg}", file=sys.stderr, flush=True)
+
+TMP_DIR = "/tmp"
+TMP_GRACE = float(os.environ.get("SS2GD_TMP_GRACE") or 3600)
+INTERVAL = float(os.environ.get("SS2GD_GC_INTERVAL") or 600)
+BATCH = 20             # バックグラウンドで 1 回に消す最大数
+MIN_AGE = 60.0         # 書き込み中かもしれないので、これより新しいファイルは対象外
+
+# (ディレクトリ, パターン, 種別)
+def _sources() -> List[Tuple[str, Tuple[str, ...], str]]:
+    return [(ensure_videos_dir(), ("REC_*.webm",), "record"),
+            (TMP_DIR, ("ss2gd-*.png", "ss2gd-*.jpg"), "tmp")]
+
+@dataclass
+class Entry:
+    path: str
+    kind: str              # "record" | "tmp"
+    size: int
+    mtime: float
+    last_used: float       # LRU の基準（atime と mtime の新しい方）
+    uploaded: bool
+
+def _is_uploaded(path: str) -> bool:
+    try:
+        from .history import get_history
+        e = get_history().find_by_path(path)
+        return bool(e and (e.drive_id or e.link))
+    except Exception as ex:
+        _dbg(f"history lookup failed: {ex}")
+        return False
+
+def _active_files() -> set:
+    try:
+        from .record_controller import get_controller
+        return {os.path.abspath(r.file) for r in get_controller().list(prune=False) if r.file}
+    except Exception:
+        return set()
+
+class RetentionManager:
+    def __init__(self, sources: Optional[List[Tuple[str, Tuple[str, ...], str]]] = None):
+        self._sources = sources
+        self._lock = threading.Lock()
+        self._index: Dict[str, Entry] = {}
+        self._dir_sig: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- index ----
+    def _entry(self, path: str, kind: str, st: os.stat_result) -> Entry:
+        old = self._index.get(path)
+        # 同じ大きさ・mtime なら履歴を引き直さない（アップロード済みは変わらない）
+        if old and old.size == st.st_size and old.mtime == st.st_mtime and old.uploaded:
+            old.last_used = max(st.st_atime, st.st_mtime)
+            return old
+        return Entry(path, kind, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime), _is_uploaded(path))
+
+    def refresh(self, force: bool = False) -> None:
+        """mtime が変わったディレクトリだけ読み直す"""
+        for d, patterns, kind in (self._sources or _sources()):
+            try:
+                sig = os.stat(d).st_mtime_ns
+            except OSError:
+                continue
+            if not force and self._dir_sig.get(d) == sig:
+                continue
+            seen: Dict[str, Entry] = {}
+            try:
+                with os.scandir(d) as it:
+                    for de in it:
+                        if not any(fnmatch.fnmatch(de.name, p) for p in patterns):
+                            continue
+                        try:
+                            st = de.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if de.is_file(follow_symlinks=False):
+                            seen[de.path] = self._entry(de.path, kind, st)
+            except OSError as e:
+                _dbg(f"scan {d} failed: {e}")
+                continue
+            with self._lock:
+                for p in [p for p, e in self._index.items() if os.path.dirname(p) == d]:
+                    self._index.pop(p)
+                self._index.update(seen)
+                self._dir_sig[d] = sig
+            _dbg(f"scanned {d}: {len(seen)} files")
+
+    # ---- policy ----
+    def plan(self, *, max_bytes: Optional[int] = None, max_age: Optional[float] = None,
+             evict_unuploaded: Optional[bool] = None, now: Optional[float] = None) -> List[Tuple[Entry, str]]:
+        """消す順の (エントリ, 理由)。引数を省略すると設定値"""
+        st = get_settings()
+        max_bytes = st.retention_max_mb << 20 if max_bytes is None else max_bytes
+        max_age = st.retention_max_age_days * 86400.0 if max_age is None else max_age
+        evict_unuploaded = st.retention_evict_unuploaded if evict_unuploaded is None else evict_unuploaded
+        now = time.time() if now is None else now
+        active = _active_files()
+        with self._lock:
+            entries = [e for e in self._index.values() if e.path not in active and now - e.mtime >= MIN_AGE]
+            total = sum(e.size for e in self._index.values())
+        # アップロードではディレクトリの mtime が変わらないので、未アップロードのものは毎回履歴を引き直す
+        for e in entries:
+            if not e.uploaded and _is_uploaded(e.path):
+                e.uploaded = True
+        out: List[Tuple[Entry, str]] = []
+        picked = set()
+        def take(e: Entry, why: str) -> None:
+            nonlocal total
+            out.append((e, why)); picked.add(e.path); total -= e.size
+
+        for e in sorted(entries, key=lambda e: e.last_used):
+            if e.kind == "tmp" and e.uploaded and now - e.mtime >= TMP_GRACE:
+                take(e, "uploaded temp file")
+            elif max_age and e.uploaded and now - e.mtime >= max_age:
+                take(e, f"older than {max_age / 86400:g} days")
+        if max_bytes and total > max_bytes:
+            # 容量超過：アップロード済み → 未アップロードの一時ファイル → （許可があれば）未アップロードの録画
+            tiers = [lambda e: e.uploaded, lambda e: e.kind == "tmp"]
+            if evict_unuploaded:
+                tiers.append(lambda e: True)
+            for tier in tiers:
+                for e in sorted(entries, key=lambda e: e.last_used):
+                    if total <= max_bytes:
+                        break
+                    if e.path not in picked and tier(e):
+                        take(e, "over budget" + ("" if e.uploaded else " (not uploaded)"))
+        return out
+
+    def collect(self, *, dry_run: bool = False, limit: Optional[int] = None, **policy: Any) -> Dict[str, Any]:
+        """plan に従って消す。戻り: レポート"""
+        self.refresh()
+        victims = self.plan(**policy)
+        if limit is not None:
+            victims = victims[:limit]
+        freed, removed, failed = 0, [], []
+        for e, why in victims:
+            if not dry_run:
+                try:
+                    os.remove(e.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as ex:
+                    failed.append((e.path, str(ex))); continue
+                with self._lock:
+                    self._index.pop(e.path, None)
+            freed += e.size
+            removed.append({"path": e.path, "size": e.size, "uploaded": e.uploaded, "reason": why})
+        with self._lock:
+            kept = sum(e.size for e in self._index.values())
+        if removed and not dry_run:
+            _dbg(f"evicted {len(removed)} files, {freed} bytes")
+        return {"removed": removed, "freed": freed, "failed": failed, "total_after": kept if not dry_run else kept - freed,
+                "dry_run": dry_run}
+
+    # ---- background ----
+    def start(self, interval: float = INTERVAL) -> None:
+        """常駐プロセス用。少し待ってから interval ごとに BATCH 件ずつ"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        def loop() -> None:
+            if self._stop.wait(30.0):
+                return
+            while True:
+                try:
+                    r = self.collect(limit=BATCH)
+                    wait = 1.0 if len(r["removed"]) >= BATCH else interval   # まだ残っていれば続けて
+                except Exception as e:
+                    _dbg(f"collect failed: {e}")
+                    wait = interval
+                if self._stop.wait(wait):
+                    return
+        self._thread = threading.Thread(target=loop, name="ss2gd-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+_manager: Optional[RetentionManager] = None
+
+def get_retention() -> RetentionManager:
+    global _manager
+    if _manager is None:
+        _manager = RetentionManager()
+    return _manager
+
+__all__ = ["RetentionManager", "Entry", "get_retention"]
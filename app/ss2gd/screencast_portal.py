@@ -5,6 +5,8 @@ from typing import Any, Dict, List, Tuple, Sequence, Optional
 from dbus_next.aio import MessageBus
 from dbus_next import Message, MessageType, Variant
 
+from .tracing import span
+
 PORTAL   = "org.freedesktop.portal.Desktop"
 OBJ      = "/org/freedesktop/portal/desktop"
 IF_SC    = "org.freedesktop.portal.ScreenCast"
@@ -13,6 +15,10 @@ IF_DBUS  = "org.freedesktop.DBus"
 
 DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
 
+# SelectSources の persist_mode
+PERSIST_WHILE_RUNNING = 1
+PERSIST_UNTIL_REVOKED = 2
+
 def _v(x):
     return x.value if isinstance(x, Variant) else x
 
@@ -86,8 +92,102 @@ async def start_screencast_session(
     multiple: bool = True,
     cursor_mode: int = 2,
     restore_token: Optional[str] = None,
+) -> Tuple[int, List[Dict[str, Any]], str]:
+    with span("portal.call", iface="ScreenCast", restore=bool(restore_token)):
+        return await _start_screencast_session(multiple, cursor_mode, restore_token)
+
+async def open_screencast_session(
+    multiple: bool = True,
+    cursor_mode: int = 2,
+    restore_token: Optional[str] = None,
+    persist_mode: int = PERSIST_UNTIL_REVOKED,
+) -> Tuple[int, List[Dict[str, Any]], str, MessageBus]:
+    """
+    start_screencast_session と同じだが、セッションを保持する D-Bus 接続も返す。
+    常駐プロセスで使い回す場合は接続を生かしておき、終了時に close_screencast_session()。
+    既定の persist_mode=2 は取り消されるまで有効なので、`ss2gd shot --last` のように
+    毎回別プロセスでも 2 回目以降はダイアログが出ない。
+    """
+    keep: Dict[str, Any] = {}
+    with span("portal.call", iface="ScreenCast", restore=bool(restore_token)):
+        fd, streams, session_path = await _start_screencast_session(multiple, cursor_mode, restore_token, keep,
+                                                                    persist_mode)
+    return fd, streams, session_path, keep["bus"]
+
+async def close_screencast_session(bus: MessageBus, session_path: str) -> None:
+    try:
+        msg = Message(destination=PORTAL, path=session_path, interface="org.freedesktop.portal.Session",
+                      member="Close", signature="", body=[])
+        await asyncio.wait_for(bus.call(msg), timeout=5.0)
+    except Exception as e:
+        if DEBUG: print(f"[portal] session close failed: {e}")
+    try:
+        bus.disconnect()
+    except Exception:
+        pass
+
+def streams_for_rect(streams: Sequence[Dict[str, Any]], rect: Tuple[int, int, int, int]) -> List[Dict[str, Any]]:
+    """rect=(x,y,w,h) と交差するストリームを、重なり面積の大きい順に返す（位置不明のものは末尾）"""
+    x, y, w, h = rect
+    scored = []
+    for i, s in enumerate(streams):
+        pos, size = s.get("position"), s.get("size")
+        if not (pos and size):
+            scored.append((-1, i, s)); continue
+        ix = min(x + w, pos[0] + size[0]) - max(x, pos[0])
+        iy = min(y + h, pos[1] + size[1]) - max(y, pos[1])
+        if ix > 0 and iy > 0:
+            scored.append((ix * iy, i, s))
+    scored.sort(key=lambda t: (-t[0], t[1]))
+    return [s for _, _, s in scored]
+
+def _screen_scale(screens: Sequence[Sequence[float]], x: int, y: int) -> Optional[float]:
+    """screens=[(x,y,w,h,devicePixelRatio), ...]（論理座標）のうち (x,y) を含む画面の比率"""
+    for sx, sy, sw, sh, dpr in screens:
+        if sx <= x < sx + sw and sy <= y < sy + sh:
+            return float(dpr)
+    return None
+
+def plan_region_sources(streams: Sequence[Dict[str, Any]], rect: Tuple[int, int, int, int],
+                        screens: Optional[Sequence[Sequence[float]]] = None) -> List[Dict[str, Any]]:
+    """
+    rect=(x,y,w,h) を撮るのに必要なストリームだけを選び、それぞれの切り出し量と
+    合成先の位置を決める。戻り: [{"node_id","size","crop":(top,left,right,bottom),"xpos","ypos"}, ...]
+    1 要素なら単一ストリームの切り出し、2 要素以上なら合成が必要。
+    screens（region_select.screen_scales()）を渡すと、ストリームの位置にある画面の比率を "scale" に入れる。
+    """
+    x, y, w, h = rect
+    cand = streams_for_rect(streams, rect) or list(streams[:1])
+    known = [s for s in cand if s.get("position") and s.get("size")]
+    if len(known) < 2:
+        known = cand[:1]
+    plan: List[Dict[str, Any]] = []
+    for s in known:
+        mx, my = s.get("position") or (0, 0)
+        mw, mh = s.get("size") or (1920, 1080)
+        plan.append({
+            "node_id": int(s["node_id"]),
+            "size": (int(mw), int(mh)),
+            "crop": (max(0, y - my), max(0, x - mx),
+                     max(0, (mx + mw) - (x + w)), max(0, (my + mh) - (y + h))),
+            "xpos": max(0, mx - x),
+            "ypos": max(0, my - y),
+        })
+        sc = _screen_scale(screens or (), int(mx), int(my))
+        if sc:
+            plan[-1]["scale"] = sc
+    return plan
+
+async def _start_screencast_session(
+    multiple: bool,
+    cursor_mode: int,
+    restore_token: Optional[str],
+    keep: Optional[Dict[str, Any]] = None,
+    persist_mode: int = PERSIST_WHILE_RUNNING,
 ) -> Tuple[int, List[Dict[str, Any]], str]:
     bus = await MessageBus(negotiate_unix_fd=True).connect()
+    if keep is not None:
+        keep["bus"] = bus
     await _add_match(bus, "type='signal',sender='org.freedesktop.portal.Desktop',interface='org.freedesktop.portal.Request'")
 
     # CreateSession
@@ -112,7 +212,7 @@ async def start_screencast_session(
         "types":        Variant("u", 1),                 # 1=MONITOR
         "multiple":     Variant("b", bool(multiple)),
         "cursor_mode":  Variant("u", int(cursor_mode)),  # 2=Embedded
-        "persist_mode": Variant("u", 1),                 # restorable
+        "persist_mode": Variant("u", int(persist_mode)), # restorable（1: アプリ実行中 / 2: 取り消すまで）
         "audio":        Variant("b", True),              # ★ 音声の共有も要求
     }
     if restore_token:
@@ -6,6 +6,8 @@ from urllib.parse import urlparse, unquote
 from dbus_next.aio import MessageBus
 from dbus_next import Message, MessageType, Variant
 
+from .tracing import span
+
 PORTAL  = "org.freedesktop.portal.Desktop"
 OBJ     = "/org/freedesktop/portal/desktop"
 IF_SS   = "org.freedesktop.portal.Screenshot"
@@ -17,6 +19,9 @@ DEFAULT_TIMEOUT = float(os.environ.get("SS2GD_SS_TIMEOUT", "60"))
 class PortalError(Exception):
     pass
 
+# 直近の呼び出しでダイアログ（ユーザーの操作）を待った秒数。所要時間の比較から除くため
+last_user_wait = 0.0
+
 def _v(x):
     return x.value if isinstance(x, Variant) else x
 
@@ -75,13 +80,22 @@ async def _call_with_handle(bus: MessageBus, interface: str, member: str, signat
     handle = reply.body[0]  # Request object path
     if DEBUG:
         print(f"[portal] request handle: {handle}")
-    code, results = await _wait_request_response(bus, handle, timeout=timeout)
+    global last_user_wait
+    t0 = time.monotonic()
+    try:
+        code, results = await _wait_request_response(bus, handle, timeout=timeout)
+    finally:
+        last_user_wait = time.monotonic() - t0
     if code != 0:
         # ユーザーキャンセル含む非0コード
         raise PortalError("Screenshot canceled or denied by portal")
     return results
 
 async def _do_screenshot() -> str:
+    with span("portal.call", iface="Screenshot"):
+        return await _do_screenshot_inner()
+
+async def _do_screenshot_inner() -> str:
     """
     戻り: ドキュメントポータルURI (file:///run/user/.../doc/.../Screenshot ...)
     実装差吸収のため、まず 'sa{sv}'（parent_window + options）を試し、InvalidArgs なら 'a{sv}' にフォールバック。
@@ -132,20 +146,23 @@ async def _copy_from_doc_portal_uri(uri: str) -> str:
     dst  = os.path.join("/tmp", f"ss2gd-{os.getpid()}-{int(time.time())}.png")
 
     # 0.1s × 最大40回（~4秒）待つ
-    for i in range(40):
-        try:
-            shutil.copyfile(path, dst)
-            if DEBUG:
-                print(f"[portal] copied: {path} -> {dst}")
-            return dst
-        except FileNotFoundError:
-            if DEBUG:
-                print(f"[portal] wait for file... {i}")
-            await asyncio.sleep(0.1)
-        except Exception as e:
-            if DEBUG:
-                print(f"[portal] copy failed: {e!r}")
-            await asyncio.sleep(0.1)
+    with span("portal.materialize") as sp:
+        for i in range(40):
+            try:
+                with span("copy"):
+                    shutil.copyfile(path, dst)
+                if DEBUG:
+                    print(f"[portal] copied: {path} -> {dst}")
+                sp.set(polls=i, size=os.path.getsize(dst))
+                return dst
+            except FileNotFoundError:
+                if DEBUG:
+                    print(f"[portal] wait for file... {i}")
+                await asyncio.sleep(0.1)
+            except Exception as e:
+                if DEBUG:
+                    print(f"[portal] copy failed: {e!r}")
+                await asyncio.sleep(0.1)
 
     raise PortalError("Screenshot file not available")
 
@@ -154,8 +171,35 @@ async def take_interactive_screenshot_async() -> str:
     uri = await _do_screenshot()
     return await _copy_from_doc_portal_uri(uri)
 
+async def _warm_portal_async(timeout: float) -> int:
+    bus = await MessageBus().connect()
+    try:
+        # 最初のメッセージで xdg-desktop-portal（と文書ポータル）が D-Bus 起動される
+        for dest in (PORTAL, "org.freedesktop.portal.Documents"):
+            msg = Message(destination=dest, path=OBJ if dest == PORTAL else "/org/freedesktop/portal/documents",
+                          interface="org.freedesktop.DBus.Peer", member="Ping")
+            await asyncio.wait_for(bus.call(msg), timeout=timeout)
+        msg = Message(destination=PORTAL, path=OBJ, interface="org.freedesktop.DBus.Properties",
+                      member="Get", signature="ss", body=[IF_SS, "version"])
+        reply = await asyncio.wait_for(bus.call(msg), timeout=timeout)
+        if reply.message_type != MessageType.METHOD_RETURN:
+            raise PortalError(reply.error_name or "Screenshot portal not available")
+        return int(_v(reply.body[0]))
+    finally:
+        try:
+            bus.disconnect()
+        except Exception:
+            pass
+
+def warm_portal(timeout: float = 10.0) -> int:
+    """ポータルを起動させておく（トレイのウォームスタート用）。戻り: Screenshot ポータルの version"""
+    with span("portal.warm"):
+        return asyncio.run(_warm_portal_async(timeout))
+
 def take_interactive_screenshot() -> str:
     """同期版（CLI 等から直接呼べるエントリ）"""
+    global last_user_wait
+    last_user_wait = 0.0
     return asyncio.run(take_interactive_screenshot_async())
 
-__all__ = ["take_interactive_screenshot", "PortalError"]
+__all__ = ["take_interactive_screenshot", "warm_portal", "PortalError"]
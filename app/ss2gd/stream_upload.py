@@ -0,0 +1,344 @@
+# app/ss2gd/stream_upload.py
+"""
+録画をディスクに書かずに Drive へ送る（capture-to-Drive）。
+
+gst-launch の webmmux（streamable=true）→ fdsink の出力をパイプで受け、
+resumable upload のチャンクとしてそのまま PUT する。
+  - 手元に残すのは「サーバが受領を確認していないバイト」だけ（上限 SS2GD_STREAM_BUFFER_MB）。
+    チャンクの送信に失敗しても、確認済みのオフセットから送り直せる
+  - 上限に達したらパイプを読むのを止める（背圧。gst 側は queue が溜まり、最後はフレームを落とす）
+  - ローカル保存は任意。別スレッドが I/O 優先度 idle で追記する（アップロードと取り合わない）
+  - アップロードが諦めた後もパイプは読み続ける（ローカル保存があればそこから送り直せる）
+  - 録画以外（並列 PNG エンコーダの出力など）も write() で流し込める。
+    書き手が途中で失敗したら abort()：最後のチャンクを送らず、セッションを取り消す
+    （close_input() の EOF は「ファイルの終わり」なので、途中で閉じると欠けたファイルが確定してしまう）
+"""
+from __future__ import annotations
+import os, sys, json, time, queue, ctypes, platform, threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .drive_uploader import GOOGLEAPIS, authorized_http, _service, _metadata, _finish, _refill_service
+from .drive_ids import get_id_pool, view_link
+from .history import record_upload
+from .bandwidth import get_scheduler, PRIO_VIDEO
+from .tracing import span
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[stream] {msg}", file=sys.stderr, flush=True)
+
+# Drive の resumable チャンクは 256 KiB の倍数
+CHUNK = max(1, int(os.environ.get("SS2GD_STREAM_CHUNK_MB") or 8)) << 20
+BUFFER_LIMIT = max(2 * CHUNK, int(os.environ.get("SS2GD_STREAM_BUFFER_MB") or 32) << 20)
+READ_SIZE = 1 << 20
+RETRIES = 6
+
+class StreamAborted(RuntimeError):
+    pass
+
+class _Window:
+    """未確認バイトの窓。base は buf[0] のファイル先頭からのオフセット"""
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._buf = bytearray()
+        self._base = 0
+        self._eof = False
+        self._discard = False
+        self._aborted = False
+        self._cond = threading.Condition()
+        self.total = 0
+
+    def feed(self, data: bytes) -> None:
+        with self._cond:
+            while len(self._buf) >= self._limit and not self._discard:
+                self._cond.wait()
+            if not self._discard:
+                self._buf += data
+            self.total += len(data)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def discard(self) -> None:
+        """アップロード中止：以降は溜めない（読み手を止めない）"""
+        with self._cond:
+            self._discard = True
+            self._buf = bytearray()
+            self._cond.notify_all()
+
+    def abort(self) -> None:
+        """書き手の中止：以降の take() は例外（EOF が来ても最後のチャンクにしない）"""
+        with self._cond:
+            self._aborted = True
+            self._discard = True
+            self._buf = bytearray()
+            self._cond.notify_all()
+
+    def ack(self, offset: int) -> None:
+        """サーバが offset まで受け取った → それより前は二度と要らない"""
+        with self._cond:
+            if offset > self._base:
+                del self._buf[:offset - self._base]
+                self._base = offset
+                self._cond.notify_all()
+
+    def take(self, begin: int, n: int) -> Tuple[bytes, bool]:
+        """begin から最大 n バイト。戻り: (データ, これで最後か)"""
+        with self._cond:
+            if begin < self._base and not self._aborted:
+                raise RuntimeError(f"stream upload: offset {begin} already dropped (base {self._base})")
+            # n より多く溜まるか EOF まで待つ（最後のチャンクかどうかを確定させるため）
+            while not self._aborted and not self._eof and len(self._buf) - (begin - self._base) <= n:
+                self._cond.wait()
+            if self._aborted:
+                raise StreamAborted("stream upload: aborted by the writer")
+            i = begin - self._base
+            data = bytes(self._buf[i:i + n])
+            return data, self._eof and i + len(data) == len(self._buf)
+
+    def buffered(self) -> int:
+        with self._cond:
+            return len(self._buf)
+
+_IOPRIO_SET = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273}
+
+def _ioprio_idle() -> None:
+    """呼び出したスレッドの I/O 優先度を idle クラスに（ioprio_set。失敗しても無視）"""
+    nr = _IOPRIO_SET.get(platform.machine())
+    if nr is None:
+        return
+    try:
+        # IOPRIO_WHO_PROCESS=1, who=0（このスレッド）, IOPRIO_CLASS_IDLE=3 << 13
+        ctypes.CDLL(None, use_errno=True).syscall(nr, 1, 0, 3 << 13)
+    except Exception as e:
+        _dbg(f"ioprio_set failed: {e}")
+
+def _acked(resp) -> int:
+    """308 の Range: bytes=0-N → 次に送るオフセット（Range が無ければ 0）"""
+    r = resp.get("range")
+    return int(r.rsplit("-", 1)[1]) + 1 if r else 0
+
+class StreamUpload:
+    """
+    パイプの書き込み側（writer_fd）を gst の fdsink に渡す。
+    spawned() で親側の writer_fd を閉じ、result() でリンクを待つ。
+    """
+    def __init__(self, name: str, mime: str = "video/webm", *, local_path: Optional[str] = None,
+                 description: str = "captured by SS2GDrive", kind: str = "record", region=None,
+                 prio: int = PRIO_VIDEO, on_link: Optional[Callable[[str], None]] = None):
+        """on_link: 先取りした ID が使えたら、セッションを開いた時点でリンクを渡す"""
+        self.name, self.mime, self.local_path = name, mime, local_path
+        self.region = region
+        self.early_link: Optional[str] = None
+        self._desc, self._kind, self._prio, self._on_link = description, kind, prio, on_link
+        self._rfd, self.writer_fd = os.pipe()
+        self._win = _Window(BUFFER_LIMIT)
+        self._local_q: Optional[queue.Queue] = queue.Queue(maxsize=64) if local_path else None
+        self._local_failed = False
+        self._done = threading.Event()
+        self._link: Optional[str] = None
+        self._err: Optional[BaseException] = None
+        self._sent = 0
+        self._svc = None
+        self._fid: Optional[str] = None
+        self._started = time.time()
+        self._threads = [threading.Thread(target=self._read, name="ss2gd-stream-read", daemon=True),
+                         threading.Thread(target=self._upload, name="ss2gd-stream-up", daemon=True)]
+        if self._local_q is not None:
+            self._threads.append(threading.Thread(target=self._write_local, name="ss2gd-stream-local", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    # ---- pipe → window / local copy ----
+    def _read(self) -> None:
+        try:
+            while True:
+                data = os.read(self._rfd, READ_SIZE)
+                if not data:
+                    break
+                if self._local_q is not None and not self._local_failed:
+                    self._local_q.put(data)
+                self._win.feed(data)
+        except OSError as e:
+            _dbg(f"pipe read failed: {e}")
+        finally:
+            os.close(self._rfd)
+            self._win.close()
+            if self._local_q is not None:
+                self._local_q.put(None)
+
+    def _write_local(self) -> None:
+        """
+        ローカル保存。書けなくなっても（ENOSPC・ディレクトリが無い等）アップロードは続ける：
+        コピーを諦めてキューは読み捨て続ける（_read が put で止まると gst まで詰まる）
+        """
+        _ioprio_idle()
+        path, f = self.local_path, None
+        try:
+            f = open(path, "wb")
+        except OSError as e:
+            self._drop_local(e)
+        while True:
+            data = self._local_q.get()
+            if data is None:
+                break
+            if f is None:
+                continue
+            try:
+                f.write(data)
+            except OSError as e:
+                self._drop_local(e)
+                try: f.close()
+                except OSError: pass
+                f = None
+        if f is not None:
+            try: f.close()
+            except OSError as e: self._drop_local(e)
+        if self._win._aborted or self._local_failed:
+            # 途中までの内容は残さない
+            try: os.remove(path)
+            except OSError: pass
+
+    def _drop_local(self, e: OSError) -> None:
+        _dbg(f"local copy failed ({e}); uploading only")
+        self._local_failed = True
+        self.local_path = None
+
+    # ---- window → Drive ----
+    def _put(self, http, uri: str, off: int, data: bytes, total: Optional[int]):
+        rng = f"bytes {off}-{off + len(data) - 1}/{'*' if total is None else total}" if data \
+              else f"bytes */{'*' if total is None else total}"
+        return http.request(uri, method="PUT", body=data,
+                            headers={"Content-Length": str(len(data)), "Content-Range": rng})
+
+    def _session(self, http) -> str:
+        url = (f"{GOOGLEAPIS}/upload/drive/v3/files?uploadType=resumable"
+               f"&supportsAllDrives=true&fields=id%2CwebViewLink")
+        self._svc = svc = _service()
+        pool = get_id_pool()
+        self._fid = pool.take(_refill_service)
+        refresh = False
+        for _attempt in range(3):
+            meta = _metadata(svc, self.name, self._desc, self._kind, refresh=refresh)
+            if self._fid:
+                meta["id"] = self._fid
+            resp, _ = http.request(url, method="POST", body=json.dumps(meta),
+                                   headers={"Content-Type": "application/json; charset=UTF-8",
+                                            "X-Upload-Content-Type": self.mime})
+            if self._fid and resp.status in (400, 409):
+                pool.discard(); self._fid = None       # 先取りした ID が使えない
+                continue
+            # 404 = キャッシュしたアップロード先フォルダが消えている → 引き直して 1 回だけ
+            if resp.status != 404 or "parents" not in meta or refresh:
+                break
+            refresh = True
+        if resp.status != 200 or "location" not in resp:
+            raise RuntimeError(f"stream upload: session failed (HTTP {resp.status})")
+        if self._fid and self._on_link:
+            self.early_link = view_link(self._fid)
+            self._on_link(self.early_link)
+        return resp["location"]
+
+    def _upload(self) -> None:
+        http = uri = None
+        try:
+            sched = get_scheduler()
+            with span("upload.stream", mime=self.mime) as sp, sched.transfer(self._prio):
+                http = authorized_http()
+                uri = self._session(http)
+                off, tries = 0, 0
+                while True:
+                    # 帯域上限があればチャンクを小さく（スクショの割り込みもチャンク境界）
+                    data, last = self._win.take(off, sched.chunk_size(CHUNK))
+                    total = off + len(data) if last else None
+                    sched.chunk(self._prio, len(data))
+                    try:
+                        resp, content = self._put(http, uri, off, data, total)
+                    except Exception as e:
+                        resp, content = None, str(e).encode()
+                    if resp is not None and resp.status in (200, 201):
+                        file_id = json.loads(content)["id"]
+                        sp.set(file_id=file_id, size=off + len(data))
+                        break
+                    if resp is not None and resp.status == 308:
+                        off, tries = _acked(resp), 0
+                        self._sent = off
+                        self._win.ack(off)
+                        continue
+                    if resp is not None and resp.status in (404, 410):
+                        raise RuntimeError("stream upload: session expired")
+                    tries += 1
+                    if tries > RETRIES:
+                        raise RuntimeError(f"stream upload failed: HTTP {getattr(resp, 'status', '-')} {content[:200]!r}")
+                    _dbg(f"chunk at {off} failed (try {tries}); resuming")
+                    time.sleep(min(30.0, 0.5 * 2 ** tries))
+                    # 受領済みの位置を問い合わせてそこから送り直す
+                    try:
+                        resp, _ = self._put(http, uri, 0, b"", None)
+                        if resp.status == 308:
+                            off = _acked(resp); self._win.ack(off)
+                    except Exception:
+                        pass
+            self._link = _finish(self._svc, file_id, view_link(file_id) if self._fid else None)
+            record_upload(name=self.name, link=self._link, local_path=self._local_abspath(), size=self._win.total,
+                          drive_id=file_id, kind=self._kind, region=self.region, mime=self.mime,
+                          created=self._started)
+        except BaseException as e:
+            self._err = e
+            self._win.discard()
+            _dbg(f"upload aborted: {e}")
+            if isinstance(e, StreamAborted) and uri:
+                # 送りかけのセッションを取り消す（サーバ側に欠けたファイルを残さない）
+                try: http.request(uri, method="DELETE")
+                except Exception as ex: _dbg(f"cancel session failed: {ex}")
+        finally:
+            self._done.set()
+
+    def _local_abspath(self) -> Optional[str]:
+        return os.path.abspath(self.local_path) if self.local_path else None
+
+    # ---- API ----
+    def spawned(self) -> None:
+        """gst-launch を起動したら呼ぶ（親の書き込み側を閉じないと EOF にならない）"""
+        self.close_input()
+
+    def write(self, data) -> None:
+        """プロセスを介さずに書き込む（画像エンコーダ等）。終わったら close_input()"""
+        mv = memoryview(data)
+        while mv:
+            mv = mv[os.write(self.writer_fd, mv):]
+
+    def abort(self) -> None:
+        """書き込み途中で中止。最後のチャンクは送らない（close_input() の代わりに呼ぶ）"""
+        self._win.abort()
+        self.close_input()
+
+    def close_input(self) -> None:
+        """書き終わり（EOF = ファイルの終わりとして確定させる）"""
+        fd, self.writer_fd = self.writer_fd, -1
+        if fd >= 0:
+            try: os.close(fd)
+            except OSError: pass
+
+    @property
+    def bytes_in(self) -> int:
+        return self._win.total
+
+    def health(self) -> Dict[str, Any]:
+        return {"received": self._win.total, "uploaded": self._sent, "buffered": self._win.buffered(),
+                "failed": self._err is not None}
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """アップロード完了を待ってリンクを返す（失敗なら例外。ローカル保存は書き終えてから）"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("stream upload did not finish")
+        for t in self._threads[2:]:
+            t.join()
+        if self._err is not None:
+            raise self._err
+        return self._link  # type: ignore[return-value]
+
+__all__ = ["StreamUpload", "StreamAborted", "CHUNK", "BUFFER_LIMIT"]
@@ -0,0 +1,143 @@
+# app/ss2gd/token_refresher.py
+"""
+OAuth アクセストークンを期限の少し前に更新しておく（常駐プロセス用）。
+
+これまでは期限が切れてから _service() の中で更新していたので、しばらく放置した後の
+最初のアップロードが「更新の往復 + token.json の書き直し」を待っていた。
+  - Credentials はプロセスで 1 つだけ持ち、全アップローダが同じものを使う（更新はその場で反映）
+  - 更新はスレッド間ロック + token.json.lock の flock 下で。先に他のプロセスが更新していれば
+    ファイルを読み直すだけで済ませる（同時に更新して片方の refresh が無駄になるのを防ぐ）
+  - token.json は一時ファイル → os.replace（save_settings と同じ。途中で落ちても壊れない）
+  - start() のスレッドが「期限 - LEAD 秒」に起きて更新する（トレイ・録画ウィンドウ）
+"""
+from __future__ import annotations
+import os, sys, fcntl, datetime, threading
+from typing import Optional
+
+from google.oauth2.credentials import Credentials
+
+from .config import TOKEN_PATH
+from .tracing import span
+
+SCOPES = ["https://www.googleapis.com/auth/drive.file"]
+LEAD = float(os.environ.get("SS2GD_TOKEN_LEAD") or 300)   # 期限の何秒前に更新するか
+RETRY = 60.0
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[auth] {msg}", file=sys.stderr, flush=True)
+
+def load_creds() -> Optional[Credentials]:
+    if os.path.exists(TOKEN_PATH):
+        try: return Credentials.from_authorized_user_file(os.fspath(TOKEN_PATH), SCOPES)
+        except Exception: return None
+    return None
+
+def save_creds(creds: Credentials) -> None:
+    """一時ファイル → os.replace（本人だけ読める権限で）"""
+    os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
+    tmp = f"{TOKEN_PATH}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(creds.to_json())
+    os.replace(tmp, TOKEN_PATH)
+
+def _left(creds: Credentials) -> float:
+    """期限までの秒数（期限が無ければ無限）。google-auth の expiry は naive UTC"""
+    if not creds.expiry:
+        return float("inf")
+    return (creds.expiry - datetime.datetime.utcnow()).total_seconds()
+
+class TokenRefresher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._creds: Optional[Credentials] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def credentials(self, margin: float = 60.0) -> Optional[Credentials]:
+        """少なくとも margin 秒は有効なトークン。サインインしていなければ None"""
+        with self._lock:
+            if self._creds is None:
+                self._creds = load_creds()
+            c = self._creds
+            if c is None or (c.valid and _left(c) >= margin):
+                return c
+            return self._refresh_locked(margin)
+
+    def _refresh_locked(self, margin: float) -> Optional[Credentials]:
+        c = self._creds
+        with open(f"{TOKEN_PATH}.lock", "a") as lk:
+            fcntl.flock(lk, fcntl.LOCK_EX)
+            try:
+                # 別プロセスが先に更新していないか
+                disk = load_creds()
+                if disk and disk.valid and _left(disk) >= margin and (not c or disk.token != c.token):
+                    _dbg("token refreshed by another process")
+                    self._adopt(disk)
+                    return self._creds
+                if not (c and c.refresh_token):
+                    return c if c and c.valid else None
+                from google.auth.transport.requests import Request
+                try:
+                    with span("auth.refresh", left_s=int(_left(c)) if c.expiry else None):
+                        c.refresh(Request())
+                except Exception as e:
+                    if not c.valid: raise
+                    _dbg(f"early refresh failed ({e}); keeping the current token")
+                    return c
+                save_creds(c)
+                _dbg(f"token refreshed; expires in {int(_left(c))}s")
+                return c
+            finally:
+                fcntl.flock(lk, fcntl.LOCK_UN)
+
+    def _adopt(self, disk: Credentials) -> None:
+        """同じオブジェクトを使っている AuthorizedHttp にも効くよう、中身だけ差し替える"""
+        if self._creds is None:
+            self._creds = disk
+            return
+        self._creds.token = disk.token
+        self._creds.expiry = disk.expiry
+        if disk.refresh_token:
+            self._creds._refresh_token = disk.refresh_token
+
+    def reload(self) -> None:
+        """サインインし直した後などに token.json を読み直す"""
+        with self._lock:
+            self._creds = None
+        self._wake.set()
+
+    # ---- background ----
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        def loop() -> None:
+            while not self._stop.is_set():
+                try:
+                    c = self.credentials(margin=LEAD)
+                    wait = max(RETRY, _left(c) - LEAD) if c and c.valid else RETRY
+                except Exception as e:
+                    _dbg(f"refresh failed: {e}")
+                    wait = RETRY
+                # 寝ている間にサスペンドされても、起きたら期限を見直す（上限 RETRY*10）
+                self._wake.wait(min(wait, RETRY * 10))
+                self._wake.clear()
+        self._thread = threading.Thread(target=loop, name="ss2gd-token", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+_refresher: Optional[TokenRefresher] = None
+
+def get_token_refresher() -> TokenRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = TokenRefresher()
+    return _refresher
+
+__all__ = ["TokenRefresher", "get_token_refresher", "load_creds", "save_creds", "SCOPES"]
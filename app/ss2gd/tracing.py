@@ -0,0 +1,121 @@
+# app/ss2gd/tracing.py
+"""
+キャプチャ→アップロード→共有の段階別トレース。
+
+  SS2GD_TRACE=1            ~/.config/ss2gdrive/traces/trace-<時刻>-<pid>.json に出力
+  SS2GD_TRACE=/path/x.json 指定パスに出力（{pid} は置換）
+
+出力は Chrome trace 形式（chrome://tracing / Perfetto で開ける）。
+無効時の span() は共有の no-op オブジェクトを返すだけ。
+"""
+from __future__ import annotations
+import os, sys, json, time, atexit, threading
+from typing import Any, Dict, List, Optional
+
+_ENV = (os.environ.get("SS2GD_TRACE") or "").strip()
+ENABLED = bool(_ENV) and _ENV.lower() not in ("0", "false", "no")
+
+_events: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_PID = os.getpid()
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def set(self, **_args) -> None: pass
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "args", "t0")
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.t0 = 0
+
+    def __enter__(self):
+        self.t0 = _now_us()
+        return self
+
+    def __exit__(self, et, ev, _tb):
+        t1 = _now_us()
+        if et is not None:
+            self.args["error"] = f"{et.__name__}: {ev}"
+        _emit({"name": self.name, "cat": "ss2gd", "ph": "X", "ts": self.t0, "dur": t1 - self.t0,
+               "pid": _PID, "tid": threading.get_native_id(), "args": self.args})
+        return False
+
+    def set(self, **args) -> None:
+        """span 内で判明した値（サイズ・ID 等）を後付けする"""
+        self.args.update(args)
+
+def span(name: str, **args):
+    """with span("upload.create", size=n): ... の形で使う"""
+    if not ENABLED:
+        return _NULL
+    return _Span(name, args)
+
+def instant(name: str, **args) -> None:
+    if not ENABLED:
+        return
+    _emit({"name": name, "cat": "ss2gd", "ph": "i", "s": "t", "ts": _now_us(),
+           "pid": _PID, "tid": threading.get_native_id(), "args": args})
+
+def _emit(ev: Dict[str, Any]) -> None:
+    with _lock:
+        _events.append(ev)
+
+def _out_path() -> str:
+    if _ENV.lower() in ("1", "true", "yes", "on"):
+        from .config import CFG_DIR
+        d = CFG_DIR / "traces"
+        d.mkdir(parents=True, exist_ok=True)
+        return str(d / f"trace-{time.strftime('%Y%m%d_%H%M%S')}-{_PID}.json")
+    return _ENV.replace("{pid}", str(_PID))
+
+_path: Optional[str] = None
+
+def flush() -> Optional[str]:
+    """記録済みイベントをファイルへ書き出す（常駐プロセスは操作ごとに呼ぶ）。戻り: 出力パス"""
+    global _path
+    if not ENABLED:
+        return None
+    with _lock:
+        events = list(_events)
+    if not events:
+        return None
+    if _path is None:
+        _path = _out_path()
+    names = {"name": "process_name", "ph": "M", "pid": _PID, "args": {"name": f"ss2gd {' '.join(sys.argv[1:2])}".strip()}}
+    tmp = _path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": [names] + events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp, _path)
+    except Exception as e:
+        print(f"[trace] write failed: {e}", file=sys.stderr, flush=True)
+        return None
+    return _path
+
+def summary() -> str:
+    """span 名ごとの合計時間（ms）を人間向けに整形"""
+    with _lock:
+        events = [e for e in _events if e.get("ph") == "X"]
+    tot: Dict[str, float] = {}
+    for e in events:
+        tot[e["name"]] = tot.get(e["name"], 0.0) + e["dur"] / 1000.0
+    return ", ".join(f"{k}={v:.0f}ms" for k, v in tot.items())
+
+def _at_exit() -> None:
+    p = flush()
+    if p:
+        print(f"[trace] {summary()}\n[trace] written: {p}", file=sys.stderr, flush=True)
+
+if ENABLED:
+    atexit.register(_at_exit)
+
+__all__ = ["ENABLED", "span", "instant", "flush", "summary"]
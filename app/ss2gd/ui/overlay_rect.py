@@ -1,105 +1,178 @@
 # app/ss2gd/ui/overlay_rect.py
 from __future__ import annotations
+import os
 from typing import List
 from PySide6.QtCore import Qt, QRect
-from PySide6.QtGui import QGuiApplication, QPainter, QPen, QColor, QScreen
+from PySide6.QtGui import QGuiApplication, QPainter, QPen, QColor, QScreen, QRegion
 from PySide6.QtWidgets import QWidget
 
-class _RectLayer(QWidget):
-    """各スクリーン全面に被せる透明・非干渉の描画レイヤ。選択矩形の枠だけ描く。"""
-    def __init__(self, screen: QScreen):
-        super().__init__(
-            None,
-            Qt.FramelessWindowHint
-            | Qt.Tool
-            | Qt.WindowStaysOnTopHint
-            | Qt.BypassWindowManagerHint
-        )
-        self.setAttribute(Qt.WA_TranslucentBackground, True)
-        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
-        self.setAttribute(Qt.WA_ShowWithoutActivating, True)
-        self.setFocusPolicy(Qt.NoFocus)
-        try:
-            # 可能ならコンポジタに完全クリックスルーを伝える
-            self.setWindowFlag(Qt.WindowTransparentForInput, True)
-        except Exception:
-            pass
+BORDER = 2
+# 色：録画前=シアン、録画中=赤
+COLOR_IDLE = QColor(0, 180, 255, 230)
+COLOR_REC  = QColor(255, 60, 60, 230)
 
-        self._screen = screen
-        self._global_rect = QRect()
-        # 色：録画前=シアン、録画中=赤
-        self._pen_idle = QPen(QColor(0, 180, 255, 230), 2)
-        self._pen_rec  = QPen(QColor(255, 60, 60, 230), 2)
-        self._recording = False
+def _overlay_mode() -> str:
+    """
+    edges: 枠の 4 辺だけの小さな不透明ウィンドウ（X11。ウィンドウ位置を指定できる環境）
+    mask : 画面ごとのレイヤだが、枠の部分だけを残す形状マスク付き（Wayland 等）
+    off  : 表示しない（計測用）
+    """
+    env = (os.environ.get("SS2GD_OVERLAY_MODE") or "").strip().lower()
+    if env in ("edges", "mask", "off"):
+        return env
+    app = QGuiApplication.instance()
+    return "edges" if app and app.platformName() == "xcb" else "mask"
 
-        self._update_geom()
+def _flags() -> Qt.WindowFlags:
+    return (Qt.FramelessWindowHint | Qt.Tool | Qt.WindowStaysOnTopHint
+            | Qt.BypassWindowManagerHint | Qt.WindowTransparentForInput)
 
-    def _update_geom(self):
-        # パネル/タイトルバーの影響を受けない「物理的な」画面座標
-        g = self._screen.geometry()
-        self.setGeometry(g)
+def _passive(w: QWidget) -> None:
+    w.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+    w.setAttribute(Qt.WA_ShowWithoutActivating, True)
+    w.setFocusPolicy(Qt.NoFocus)
 
-    def set_global_rect(self, r: QRect, recording: bool):
-        self._global_rect = QRect(r)
-        self._recording = bool(recording)
+class _EdgeWindow(QWidget):
+    """枠の 1 辺（数 px 幅の不透明ウィンドウ）。全面の半透明合成が発生しない。"""
+    def __init__(self, geom: QRect, color: QColor):
+        super().__init__(None, _flags())
+        _passive(self)
+        self.setAutoFillBackground(True)
+        self.set_color(color)
+        self.setGeometry(geom)
+
+    def set_color(self, color: QColor) -> None:
+        pal = self.palette()
+        pal.setColor(self.backgroundRole(), QColor(color.red(), color.green(), color.blue()))
+        self.setPalette(pal)
+
+class _MaskedLayer(QWidget):
+    """
+    画面全面のレイヤだが、枠の輪（ring）以外を形状マスクで切り落とす。
+    合成・入力の対象が枠の数 px だけになる。
+    """
+    def __init__(self, screen: QScreen):
+        super().__init__(None, _flags())
+        self.setAttribute(Qt.WA_TranslucentBackground, True)
+        _passive(self)
+        self._screen = screen
+        self._local = QRect()
+        self._pen = QPen(COLOR_IDLE, BORDER)
+        self.setGeometry(screen.geometry())
+
+    def set_rect(self, local: QRect, color: QColor) -> None:
+        self.setGeometry(self._screen.geometry())
+        self._local = QRect(local)
+        self._pen = QPen(color, BORDER)
+        outer = QRegion(local.adjusted(-BORDER, -BORDER, BORDER, BORDER))
+        inner = QRegion(local)
+        self.setMask(outer.subtracted(inner).intersected(QRegion(self.rect())))
         self.update()
 
     def paintEvent(self, _ev):
-        if self._global_rect.isNull():
+        if self._local.isNull():
             return
         p = QPainter(self)
-        # グローバル→この画面ローカル
-        g = self._screen.geometry()
-        local = QRect(self._global_rect)
-        local.translate(-g.topLeft())
-        local = local.intersected(self.rect())
-        if not local.isNull():
-            p.setPen(self._pen_rec if self._recording else self._pen_idle)
-            p.drawRect(local.adjusted(0, 0, -1, -1))
+        p.setPen(self._pen)
+        # 枠は矩形の外側に描く（録画内容に映り込まない）
+        half = BORDER // 2
+        p.drawRect(self._local.adjusted(-half - 1, -half - 1, half, half))
+
+def _edge_rects(r: QRect, screen: QRect) -> List[QRect]:
+    """矩形の外側 4 辺（画面外にはみ出す辺は省く）を、この画面内の部分だけ返す"""
+    b = BORDER
+    edges = [
+        QRect(r.left() - b, r.top() - b, r.width() + 2 * b, b),    # top
+        QRect(r.left() - b, r.bottom() + 1, r.width() + 2 * b, b), # bottom
+        QRect(r.left() - b, r.top(), b, r.height()),                # left
+        QRect(r.right() + 1, r.top(), b, r.height()),               # right
+    ]
+    out = []
+    for e in edges:
+        e = e.intersected(screen)
+        if not e.isEmpty():
+            out.append(e)
+    return out
 
 class RectHintOverlayManager:
-    """矩形ヒントの表示/非表示を管理（完全クリックスルーで操作を妨げない）。"""
+    """
+    矩形ヒントの表示/非表示を管理（完全クリックスルーで操作を妨げない）。
+    矩形と交差する画面にだけ、枠の部分だけのウィンドウを出す。
+    """
     def __init__(self):
-        self._layers: List[_RectLayer] = []
+        self._edges: List[_EdgeWindow] = []
+        self._layers: List[_MaskedLayer] = []
         self._global_rect = QRect()
         self._recording   = False
-        self._build_layers()
+        self._mode = _overlay_mode()
 
         app = QGuiApplication.instance()
         if app:
             app.screenAdded.connect(self._rebuild)
             app.screenRemoved.connect(self._rebuild)
 
+    @property
+    def mode(self) -> str:
+        return self._mode
+
     def show_rect(self, rect: QRect, recording: bool = False):
         """グローバル座標の矩形を表示（recording=True で色を赤に）。"""
+        same_rect = QRect(rect) == self._global_rect and (self._edges or self._layers)
         self._global_rect = QRect(rect)
         self._recording = bool(recording)
-        if not self._layers:
-            self._build_layers()
-        for ly in self._layers:
-            ly._update_geom()
-            ly.set_global_rect(self._global_rect, self._recording)
-            ly.show()
-            ly.raise_()
+        color = COLOR_REC if self._recording else COLOR_IDLE
+        if self._mode == "off":
+            return
+        if same_rect:
+            # 色替えだけ（ウィンドウは作り直さない）
+            for e in self._edges:
+                e.set_color(color); e.update()
+            for ly in self._layers:
+                ly.set_rect(ly._local, color)
+            for w in self._windows():
+                w.show()
+            return
+        self.close()
+        for s in QGuiApplication.screens():
+            g = s.geometry()
+            if not g.intersects(self._global_rect.adjusted(-BORDER, -BORDER, BORDER, BORDER)):
+                continue
+            if self._mode == "edges":
+                for er in _edge_rects(self._global_rect, g):
+                    self._edges.append(_EdgeWindow(er, color))
+            else:
+                local = QRect(self._global_rect)
+                local.translate(-g.topLeft())
+                ly = _MaskedLayer(s)
+                ly.set_rect(local, color)
+                self._layers.append(ly)
+        for w in self._windows():
+            w.show()
+            w.raise_()
 
     def hide(self):
-        for ly in self._layers:
-            ly.hide()
+        for w in self._windows():
+            w.hide()
 
     def close(self):
-        for ly in self._layers:
+        for w in self._windows():
             try:
-                ly.close()
+                w.close()
+                w.deleteLater()
             except Exception:
                 pass
+        self._edges.clear()
         self._layers.clear()
 
+    def window_count(self) -> int:
+        return len(self._edges) + len(self._layers)
+
     # ---- internal ----
-    def _build_layers(self):
-        self._layers = [ _RectLayer(s) for s in QGuiApplication.screens() ]
+    def _windows(self) -> List[QWidget]:
+        return [*self._edges, *self._layers]
 
     def _rebuild(self, *args):
-        self.hide()
-        self._build_layers()
-        if not self._global_rect.isNull():
+        visible = any(w.isVisible() for w in self._windows())
+        self.close()
+        if visible and not self._global_rect.isNull():
             self.show_rect(self._global_rect, self._recording)
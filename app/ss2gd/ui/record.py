@@ -10,9 +10,12 @@ from PySide6.QtWidgets import (
 from PySide6.QtGui import QDesktopServices, QIcon
 from PySide6.QtCore import QTimer, QUrl, QObject, Signal, Slot, Qt, QRect
 
-from ..region_select import select_rect
-from ..recorder import start_recording, stop_recording
+from ..region_select import select_rect, prepare_overlays, rect_scale, screen_scales
+from ..recorder import (start_recording, stop_recording, wait_first_frame, record_geometry, output_size,
+                        recording_health, recording_id, has_stream_upload)
 from .overlay_rect import RectHintOverlayManager
+from ..audio_devices import get_audio_registry
+from ..token_refresher import get_token_refresher
 
 # keep_clipboard_alive が無い環境でも落ちないようフォールバック
 try:
@@ -40,14 +43,26 @@ class _GuiInvoker(QObject):
             _dbg(f"invoker func error: {e}")
 
 class RecordWindow(QWidget):
-    def __init__(self, fps:int=30):
+    def __init__(self, fps:int=30, *, max_size: Optional[Tuple[int,int]] = None, pixel_mode: Optional[str] = None,
+                 vfr: Optional[bool] = None, stream: Optional[bool] = None, dual: Optional[bool] = None):
         super().__init__()
         self.setWindowTitle("SS2GDrive Record")
         self.setWindowIcon(QIcon.fromTheme("com.ss2gd.SS2GDrive-record") or QIcon.fromTheme("com.ss2gd.SS2GDrive"))
         self._fps = int(fps)
+        self._scale = 1.0
+        self._screens = None
+        # None は設定値（settings.json の record）に従う
+        self._geom_override = {"max_size": max_size, "pixel_mode": pixel_mode}
+        self._vfr = vfr
+        self._stream = stream
+        self._dual = dual
+        self._rec_id: Optional[str] = None
         self._rect: Optional[Tuple[int,int,int,int]] = None
         self._is_recording = False
         self._started_ts: Optional[float] = None
+        self._first_frame_ms: Optional[int] = None
+        self._uploading = False
+        self._close_after_upload = False
         self._invoker = _GuiInvoker(self)
 
         lay = QVBoxLayout(self)
@@ -79,12 +94,18 @@ class RecordWindow(QWidget):
         self.timer.setInterval(500)
         self.timer.timeout.connect(self._tick)
 
-        # 起動時に矩形選択
+        # 選択オーバーレイを作り置き（Reselect のたびに作り直さない）→ 起動時に矩形選択
+        try: prepare_overlays()
+        except Exception as e: _dbg(f"prepare overlays failed: {e}")
         QTimer.singleShot(150, self.on_select)
 
         # 選択領域の可視化（常時表示用オーバーレイ）
         self._hint = RectHintOverlayManager()
 
+        # 音声デバイスを先に把握しておき、Start 時の問い合わせをゼロにする
+        try: get_audio_registry().watch()
+        except Exception as e: _dbg(f"audio registry watch failed: {e}")
+
     # -------- helpers ----------
     def _set_status(self, text:str) -> None:
         self.lbl_status.setText(f"Status: {text}")
@@ -93,7 +114,8 @@ class RecordWindow(QWidget):
     def _update_rect_label(self):
         if self._rect:
             x,y,w,h = self._rect
-            self.lbl_rect.setText(f"Region: x={x}, y={y}, w={w}, h={h}")
+            ow, oh = output_size(self._rect, **record_geometry(self._scale, **self._geom_override))
+            self.lbl_rect.setText(f"Region: x={x}, y={y}, w={w}, h={h}  →  {ow}×{oh}")
         else:
             self.lbl_rect.setText("Region: (not selected)")
 
@@ -105,8 +127,32 @@ class RecordWindow(QWidget):
 
     def _tick(self):
         if self._is_recording and self._started_ts:
+            h = recording_health(self._rec_id)
+            if h.get("running") is False and h.get("upload"):
+                # 別プロセス（CLI の stop など）が止めた：アップロードはこのウィンドウが持っているので仕上げる
+                _dbg("encoder exited with a pending stream upload; finishing")
+                self.on_stop()
+                return
             sec = int(time.time() - self._started_ts)
-            self._set_status(f"Recording… {sec}s")
+            extra = f" (first frame {self._first_frame_ms} ms)" if self._first_frame_ms is not None else ""
+            self._set_status(f"Recording… {sec}s{extra}{self._health_text(h)}")
+
+    def _health_text(self, h) -> str:
+        """gst の警告集計（問題が無ければ空）。詳細はツールチップへ"""
+        if not h:
+            return ""
+        if h.get("running") is False:
+            self.lbl_status.setToolTip(h.get("last_warning") or "")
+            return "  ⚠ encoder exited"
+        parts = []
+        if h.get("dropped"):      parts.append(f"{h['dropped']} dropped")
+        if h.get("cant_keep_up"): parts.append("can't keep up")
+        if h.get("warnings") and not parts: parts.append(f"{h['warnings']} warnings")
+        self.lbl_status.setToolTip(h.get("last_warning") or "")
+        up = h.get("upload")
+        sent = f"  ↑ {up['uploaded'] / 1e6:.1f} MB" if up and not up.get("failed") else ""
+        if up and up.get("failed"): parts.append("upload failed")
+        return sent + (f"  ⚠ {', '.join(parts)}" if parts else "")
 
     def _set_buttons_recording(self, recording: bool):
         self._is_recording = recording
@@ -135,6 +181,8 @@ class RecordWindow(QWidget):
                 self._set_status("Selection cancelled")
                 return
             self._rect = tuple(int(v) for v in r)
+            self._scale = rect_scale(self._rect)
+            self._screens = screen_scales()
             self._update_rect_label()
             self._set_status("Region selected")
             # 画面に枠を常時表示（録画前＝非録画色）
@@ -150,14 +198,20 @@ class RecordWindow(QWidget):
         if self._is_recording: return
         self._set_buttons_recording(True)
         self._started_ts = time.time()
-        self.timer.start()
+        self._first_frame_ms = None
         self._set_status("Starting…")
 
         def worker():
-            err = None
+            err = None; first = None
             try:
                 # 非同期で録画開始（UI で選んだ rect を渡す）
-                start_recording(fps=self._fps, rect=self._rect)
+                out = start_recording(fps=self._fps, rect=self._rect, scale=self._scale, vfr=self._vfr,
+                                      stream=self._stream, dual=self._dual, screens=self._screens,
+                                      **self._geom_override)
+                # このウィンドウの録画だけを止める（他の録画と同時に動いていてもよい）
+                self._rec_id = recording_id(out)
+                # 実際にフレームが届くまで「録画中」にしない
+                first = wait_first_frame(rec_id=self._rec_id)
             except Exception as e:
                 err = str(e)
 
@@ -168,7 +222,12 @@ class RecordWindow(QWidget):
                     self._set_status(f"Start failed: {err}")
                     QMessageBox.critical(self, "SS2GDrive", f"Start failed:\n{err}")
                 else:
-                    self._set_status("Recording…")
+                    if first is None:
+                        self._set_status("Recording… (no frames yet)")
+                    else:
+                        self._first_frame_ms = int(first * 1000)
+                        self._set_status(f"Recording… (first frame {self._first_frame_ms} ms)")
+                    self.timer.start()
                     # 録画中は赤系に切替
                     if self._rect:
                         x, y, w, h = self._rect
@@ -185,6 +244,7 @@ class RecordWindow(QWidget):
         self._set_status("Uploading…")
         self.timer.stop()
         self._is_recording = False
+        self._uploading = True
         # アップロード中は全部無効化
         self.btn_select.setEnabled(False)
         self.btn_start.setEnabled(False)
@@ -193,17 +253,19 @@ class RecordWindow(QWidget):
         def worker():
             link = None; err = None
             try:
-                link = stop_recording(open_browser=False, copy_link=False)
+                link = stop_recording(self._rec_id, open_browser=False, copy_link=False)
             except Exception as e:
                 err = str(e)
 
             def finish():
+                self._uploading = False
                 # UI を戻す
                 self.btn_select.setEnabled(True)
                 self.btn_start.setEnabled(True)
                 self.btn_stop.setEnabled(False)
 
                 if err:
+                    self._close_after_upload = False
                     self._set_status(f"Failed: {err}")
                     QMessageBox.critical(self, "SS2GDrive", f"Stop & Upload failed:\n{err}")
                     return
@@ -223,24 +285,48 @@ class RecordWindow(QWidget):
                         try: webbrowser.open(link)
                         except Exception:
                             pass
+                if self._close_after_upload:
+                    self.close()
 
             self._invoker.call_signal.emit(finish)
 
         threading.Thread(target=worker, daemon=True).start()
 
     def closeEvent(self, ev):
-        """ウィンドウ終了時の後片付け"""
+        """ウィンドウ終了時の後片付け（ストリーミングのアップロードはこのプロセスが持っているので待つ）"""
+        if self._uploading:
+            self._close_after_upload = True
+            self._set_status("Uploading… (closing when done)")
+            ev.ignore()
+            return
+        if self._is_recording and has_stream_upload(self._rec_id):
+            r = QMessageBox.question(
+                self, "SS2GDrive",
+                "This recording is being uploaded from this window.\n"
+                "Stop and finish the upload before closing? (No discards the upload)",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
+            if r != QMessageBox.No:
+                if r == QMessageBox.Yes:
+                    self._close_after_upload = True
+                    self.on_stop()
+                ev.ignore()
+                return
         try:
             self._hint.close()
         except Exception:
             pass
         super().closeEvent(ev)
 
-def run_window():
+def run_window(*, max_size: Optional[Tuple[int,int]] = None, pixel_mode: Optional[str] = None,
+               vfr: Optional[bool] = None, stream: Optional[bool] = None, dual: Optional[bool] = None):
     app = QApplication.instance() or QApplication(sys.argv)
-    w = RecordWindow()
+    w = RecordWindow(max_size=max_size, pixel_mode=pixel_mode, vfr=vfr, stream=stream, dual=dual)
     w.show(); w.raise_(); w.activateWindow()
-    app.exec()
+    get_token_refresher().start()   # 長い録画の後のアップロードで更新を待たない
+    try:
+        app.exec()
+    finally:
+        get_token_refresher().stop()
 
 if __name__ == "__main__":
     run_window()
@@ -2,10 +2,11 @@ from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QCheckBox, QComboBox,
     QSpinBox, QPushButton, QFileDialog, QMessageBox, QApplication
 )
-import json, os, shutil, subprocess
+import json, os, shutil
 
 from ..config import load_settings, save_settings, CLIENT_SECRET_PATH
 from ..drive_uploader import is_authorized, sign_in
+from ..audio_devices import get_audio_registry
 
 
 class SettingsDialog(QDialog):
@@ -42,6 +43,15 @@ class SettingsDialog(QDialog):
         row1.addWidget(self.ed_folder)
         lay.addLayout(row1)
 
+        row1b = QHBoxLayout()
+        row1b.addWidget(QLabel("Folder path:"))
+        self.ed_folder_path = QLineEdit(st.get("upload_folder_path") or "")
+        self.ed_folder_path.setPlaceholderText("e.g. SS2GDrive/{kind}/%Y/%m  (under the folder ID above)")
+        self.ed_folder_path.setToolTip("{kind} = Screenshots / Recordings, %Y %m %d = upload date.\n"
+                                       "Folders are created on first use and their IDs cached.")
+        row1b.addWidget(self.ed_folder_path)
+        lay.addLayout(row1b)
+
         self.cb_publish = QCheckBox("Anyone with the link can view")
         self.cb_publish.setChecked(bool(st.get("publish_anyone", True)))
         lay.addWidget(self.cb_publish)
@@ -84,6 +94,86 @@ class SettingsDialog(QDialog):
 
         self.cmb_audio_mode.currentIndexChanged.connect(self.on_audio_mode_changed)
 
+        # --- 録画の出力解像度 ---
+        rec = self._record = dict(st.get("record") or {})   # archive/share の手書き設定は温存
+        rowR = QHBoxLayout()
+        rowR.addWidget(QLabel("Max recording size:"))
+        self.sp_rec_w = QSpinBox(); self.sp_rec_w.setRange(0, 7680); self.sp_rec_w.setSingleStep(160)
+        self.sp_rec_h = QSpinBox(); self.sp_rec_h.setRange(0, 4320); self.sp_rec_h.setSingleStep(90)
+        for sp, key in ((self.sp_rec_w, "max_width"), (self.sp_rec_h, "max_height")):
+            sp.setSpecialValueText("any")
+            try: sp.setValue(int(rec.get(key) or 0))
+            except Exception: sp.setValue(0)
+        rowR.addWidget(self.sp_rec_w); rowR.addWidget(QLabel("×")); rowR.addWidget(self.sp_rec_h)
+        lay.addLayout(rowR)
+
+        rowP = QHBoxLayout()
+        rowP.addWidget(QLabel("Recording pixels:"))
+        self.cmb_pixels = QComboBox()
+        self.cmb_pixels.addItem("Physical (native, sharp on HiDPI)", "physical")
+        self.cmb_pixels.addItem("Logical (as scaled on screen)", "logical")
+        self.cmb_pixels.setCurrentIndex(1 if rec.get("pixel_mode") == "logical" else 0)
+        rowP.addWidget(self.cmb_pixels)
+        lay.addLayout(rowP)
+
+        self.cb_vfr = QCheckBox("Variable frame rate (skip frames where nothing changed)")
+        self.cb_vfr.setChecked(bool(rec.get("vfr", False)))
+        lay.addWidget(self.cb_vfr)
+
+        self.cb_stream = QCheckBox("Upload while recording (no temporary file)")
+        self.cb_stream.setChecked(bool(rec.get("stream", False)))
+        self.cb_keep_local = QCheckBox("Also keep a local copy in ~/Videos/SS2GDrive")
+        self.cb_keep_local.setChecked(bool(rec.get("keep_local", True)))
+        self.cb_keep_local.setEnabled(self.cb_stream.isChecked())
+        self.cb_stream.toggled.connect(self.cb_keep_local.setEnabled)
+        lay.addWidget(self.cb_stream)
+        lay.addWidget(self.cb_keep_local)
+
+        # 保存用と共有用（低ビットレート。こちらをアップロード）を 1 回の録画で同時に書く
+        rowD = QHBoxLayout()
+        self.cb_dual = QCheckBox("Also encode a smaller copy for sharing:")
+        self.cb_dual.setChecked(bool(rec.get("dual", False)))
+        share = rec.get("share") if isinstance(rec.get("share"), dict) else {}
+        self.sp_share_kbps = QSpinBox(); self.sp_share_kbps.setRange(100, 100_000); self.sp_share_kbps.setSingleStep(250)
+        self.sp_share_kbps.setSuffix(" kbit/s")
+        self.sp_share_h = QSpinBox(); self.sp_share_h.setRange(0, 8640); self.sp_share_h.setSingleStep(120)
+        self.sp_share_h.setSuffix(" px high"); self.sp_share_h.setSpecialValueText("full size")
+        for sp, key, default in ((self.sp_share_kbps, "video_kbps", 1000), (self.sp_share_h, "max_height", 720)):
+            try: sp.setValue(int(share.get(key, default)))
+            except Exception: sp.setValue(default)
+            sp.setEnabled(self.cb_dual.isChecked())
+            self.cb_dual.toggled.connect(sp.setEnabled)
+        rowD.addWidget(self.cb_dual); rowD.addWidget(self.sp_share_kbps); rowD.addWidget(self.sp_share_h)
+        lay.addLayout(rowD)
+
+        # --- ローカルの録画・一時ファイルの掃除 ---
+        ret = self._retention = dict(st.get("retention") or {})   # evict_unuploaded 等の手書き設定は温存
+        rowG = QHBoxLayout()
+        rowG.addWidget(QLabel("Keep local files up to:"))
+        self.sp_ret_mb = QSpinBox(); self.sp_ret_mb.setRange(0, 1 << 20); self.sp_ret_mb.setSingleStep(512)
+        self.sp_ret_mb.setSuffix(" MB"); self.sp_ret_mb.setSpecialValueText("no limit")
+        self.sp_ret_days = QSpinBox(); self.sp_ret_days.setRange(0, 3650)
+        self.sp_ret_days.setSuffix(" days"); self.sp_ret_days.setSpecialValueText("forever")
+        for sp, key in ((self.sp_ret_mb, "max_mb"), (self.sp_ret_days, "max_age_days")):
+            try: sp.setValue(int(ret.get(key) or 0))
+            except Exception: sp.setValue(0)
+        rowG.addWidget(self.sp_ret_mb); rowG.addWidget(QLabel("/")); rowG.addWidget(self.sp_ret_days)
+        lay.addLayout(rowG)
+
+        # --- アップロードの帯域上限（時間帯ごとの schedule は settings.json で） ---
+        bw = self._bandwidth = dict(st.get("bandwidth") or {})
+        rowB = QHBoxLayout()
+        rowB.addWidget(QLabel("Upload limit:"))
+        self.sp_bw = QSpinBox(); self.sp_bw.setRange(0, 10_000_000); self.sp_bw.setSingleStep(1000)
+        self.sp_bw.setSuffix(" kbit/s"); self.sp_bw.setSpecialValueText("no limit")
+        self.sp_bw_metered = QSpinBox(); self.sp_bw_metered.setRange(0, 10_000_000); self.sp_bw_metered.setSingleStep(500)
+        self.sp_bw_metered.setSuffix(" kbit/s"); self.sp_bw_metered.setSpecialValueText("same")
+        for sp, key in ((self.sp_bw, "limit_kbps"), (self.sp_bw_metered, "metered_kbps")):
+            try: sp.setValue(int(bw.get(key) or 0))
+            except Exception: sp.setValue(0)
+        rowB.addWidget(self.sp_bw); rowB.addWidget(QLabel("metered:")); rowB.addWidget(self.sp_bw_metered)
+        lay.addLayout(rowB)
+
         # 初期反映
         self._init_audio_from_settings(st)
 
@@ -134,25 +224,19 @@ class SettingsDialog(QDialog):
                 else "client_secret.json: 🟠 Not found (will prompt on Sign in)")
 
     # ========= Audio UI helpers =========
-    def _monitor_sources(self) -> list[str]:
-        """*.monitor を列挙。失敗時は空配列"""
+    def _monitor_sources(self, refresh: bool = False) -> list[str]:
+        """*.monitor を列挙（レジストリのキャッシュ）。失敗時は空配列"""
         try:
-            r = subprocess.run(
-                ["pactl", "list", "short", "sources"],
-                capture_output=True, text=True, check=False
-            )
-            out = []
-            for ln in r.stdout.splitlines():
-                cols = ln.split()
-                if len(cols) >= 2 and ".monitor" in cols[1]:
-                    out.append(cols[1])
-            return out
+            reg = get_audio_registry()
+            if refresh:
+                reg.refresh()
+            return reg.monitor_sources()
         except Exception:
             return []
 
-    def on_refresh_devices(self):
+    def on_refresh_devices(self, _checked: bool = False, *, force: bool = True):
         want = self.cmb_audio_dev.currentData() or self.cmb_audio_dev.currentText()
-        devices = self._monitor_sources()
+        devices = self._monitor_sources(refresh=force)
 
         self.cmb_audio_dev.clear()
         if not devices:
@@ -182,7 +266,7 @@ class SettingsDialog(QDialog):
         self.cmb_audio_dev.setEnabled(is_dev)
         self.btn_audio_refresh.setEnabled(is_dev)
         if is_dev and self.cmb_audio_dev.count() == 0:
-            self.on_refresh_devices()
+            self.on_refresh_devices(force=False)
 
     def _init_audio_from_settings(self, st: dict):
         audio = st.get("audio") or {}
@@ -196,7 +280,7 @@ class SettingsDialog(QDialog):
         self.cmb_audio_mode.setCurrentIndex(idx)
 
         # デバイス一覧を読んで選択
-        self.on_refresh_devices()
+        self.on_refresh_devices(force=False)
         if mode == "device":
             want = (audio.get("device") or "").strip()
             if want:
@@ -210,6 +294,7 @@ class SettingsDialog(QDialog):
     def get_values(self) -> dict:
         d = {
             "upload_folder_id": self.ed_folder.text().strip() or None,
+            "upload_folder_path": self.ed_folder_path.text().strip() or None,
             "publish_anyone": self.cb_publish.isChecked(),
             "image_format": self.cmb_fmt.currentText(),
             "jpeg_quality": self.sp_qual.value(),
@@ -222,6 +307,22 @@ class SettingsDialog(QDialog):
             if dev and not dev.startswith("("):
                 audio["device"] = dev
         d["audio"] = audio
+        share = self._record.get("share") if isinstance(self._record.get("share"), dict) else {}
+        d["record"] = dict(
+            self._record,
+            max_width=self.sp_rec_w.value(),
+            max_height=self.sp_rec_h.value(),
+            pixel_mode=self.cmb_pixels.currentData(),
+            vfr=self.cb_vfr.isChecked(),
+            stream=self.cb_stream.isChecked(),
+            keep_local=self.cb_keep_local.isChecked(),
+            dual=self.cb_dual.isChecked(),
+            share=dict(share, video_kbps=self.sp_share_kbps.value(), max_height=self.sp_share_h.value()),
+        )
+        d["retention"] = dict(self._retention, max_mb=self.sp_ret_mb.value(),
+                              max_age_days=self.sp_ret_days.value())
+        d["bandwidth"] = dict(self._bandwidth, limit_kbps=self.sp_bw.value(),
+                              metered_kbps=self.sp_bw_metered.value())
         return d
 
     def accept(self):
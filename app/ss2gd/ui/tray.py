@@ -8,9 +8,9 @@ from PySide6.QtWidgets import (
     QVBoxLayout, QLabel, QPushButton, QMessageBox
 )
 from PySide6.QtGui import QIcon, QDesktopServices
-from PySide6.QtCore import QTimer, QUrl, QObject, Signal, Slot, Qt
+from PySide6.QtCore import QTimer, QUrl, QObject, Signal, Slot, Qt, QFileSystemWatcher
 
-from ..config import load_settings
+from ..config import get_settings, refresh_settings, subscribe_settings, get_last_region, SETTINGS_PATH
 
 # keep_clipboard_alive が無い環境でも落ちないようフォールバック
 try:
@@ -22,7 +22,20 @@ except Exception:
 
 # ★ PortalError を捕捉できるように import
 from ..screenshot_portal import take_interactive_screenshot, PortalError
-from ..drive_uploader import upload_and_share
+from .. import screenshot_portal
+from ..drive_uploader import upload_and_share, warm_up
+from ..fast_shot import get_fast_shooter
+from ..region_select import select_rect
+from ..audio_devices import get_audio_registry
+from ..history import get_history
+from ..retention import get_retention
+from ..token_refresher import get_token_refresher
+from ..warmstart import get_warmstart
+from .. import tracing
+from ..tracing import span
+
+
+RECENT_LINKS = 10
 
 
 def _dbg(msg: str) -> None:
@@ -58,6 +71,9 @@ class TrayApp:
 
         # ★ 多重実行ガード（Tray/Window共通）
         self._shot_lock = threading.Lock()
+        self._copied_link: str | None = None   # アップロード完了前にコピーしたリンク
+        self._user_wait = 0.0                  # スナップ中にユーザーの操作を待った秒数（所要時間から除く）
+        self.lbl_status: QLabel | None = None
 
         if not self._force_window and QSystemTrayIcon.isSystemTrayAvailable():
             self._make_tray()
@@ -65,6 +81,23 @@ class TrayApp:
             _dbg("using fallback window")
             self._make_fallback_window()
 
+        # ★ 設定ダイアログ（別プロセス）の保存を inotify 経由で即時反映
+        self._watch_settings()
+
+        # 音声デバイスは変更イベント購読でキャッシュ（録画開始時に pactl を fork しない）
+        try: get_audio_registry().watch()
+        except Exception as e: _dbg(f"audio registry watch failed: {e}")
+
+        # 録画・一時ファイルの掃除（容量上限/期限。バックグラウンドで少しずつ）
+        get_retention().start()
+
+        # アクセストークンは期限の少し前に更新（放置後の最初のアップロードで待たない）
+        get_token_refresher().start()
+
+        # 最初のスナップが遅くならないよう、Drive クライアント・ポータルを低優先度で先に用意
+        get_warmstart().start(on_progress=lambda _st: self._invoker.call_signal.emit(self._show_status))
+        self._show_status()
+
     # ---------- UI building ----------
 
     def _make_tray(self) -> None:
@@ -73,11 +106,14 @@ class TrayApp:
         menu = QMenu()
 
         act_shot = menu.addAction("Snap && Upload")
+        act_last = menu.addAction("Snap last region")
+        menu.addMenu(self._make_recent_menu())
         act_set = menu.addAction("Settings…")
         menu.addSeparator()
         act_quit = menu.addAction("Quit")
 
         act_shot.triggered.connect(self.on_shot)
+        act_last.triggered.connect(self.on_shot_last)
         act_set.triggered.connect(self.on_settings)
         act_quit.triggered.connect(self.app.quit)
 
@@ -92,26 +128,83 @@ class TrayApp:
 
         lay = QVBoxLayout(self.win)
         lay.addWidget(QLabel("Tray is not available.\nUse this window instead."))
+        self.lbl_status = QLabel("")
+        lay.addWidget(self.lbl_status)
 
         self.btn_shot = QPushButton("Snap & Upload")
+        self.btn_last = QPushButton("Snap last region")
+        self.btn_recent = QPushButton("Recent links")
+        self.btn_recent.setMenu(self._make_recent_menu())
         self.btn_set = QPushButton("Settings…")
         self.btn_quit = QPushButton("Quit")
 
         self.btn_shot.clicked.connect(self.on_shot)
+        self.btn_last.clicked.connect(self.on_shot_last)
         self.btn_set.clicked.connect(self.on_settings)
         self.btn_quit.clicked.connect(self.app.quit)
 
-        lay.addWidget(self.btn_shot); lay.addWidget(self.btn_set); lay.addWidget(self.btn_quit)
+        lay.addWidget(self.btn_shot); lay.addWidget(self.btn_last); lay.addWidget(self.btn_recent)
+        lay.addWidget(self.btn_set); lay.addWidget(self.btn_quit)
 
         self.win.show()
         self.win.raise_(); self.win.activateWindow(); self.win.showNormal()
         _dbg("fallback window shown")
 
+    def _show_status(self) -> None:
+        """ウォームスタートの進み具合とスナップの所要時間（GUI スレッドで）"""
+        text = get_warmstart().describe()
+        if self.tray:
+            self.tray.setToolTip(f"SS2GDrive — {text}" if text else "SS2GDrive")
+        if self.lbl_status:
+            self.lbl_status.setText(text)
+
+    def _watch_settings(self) -> None:
+        self._settings_watcher = QFileSystemWatcher(self.app)
+        # os.replace で差し替えられるので、ファイルではなくディレクトリを監視する
+        self._settings_watcher.addPath(str(SETTINGS_PATH.parent))
+        self._settings_watcher.directoryChanged.connect(lambda _p: refresh_settings())
+        self._unsub_settings = subscribe_settings(
+            lambda st: self._invoker.call_signal.emit(lambda: self._on_settings_changed(st)))
+
+    def _on_settings_changed(self, st) -> None:
+        _dbg(f"settings changed: format={st.image_format} folder={st.upload_folder_id!r}")
+
+    def _make_recent_menu(self) -> QMenu:
+        """最近のリンク（ローカル履歴から、開く度に読み直す）"""
+        self.menu_recent = QMenu("Recent links")
+        self.menu_recent.aboutToShow.connect(self._fill_recent_menu)
+        return self.menu_recent
+
+    def _fill_recent_menu(self) -> None:
+        m = self.menu_recent
+        m.clear()
+        try:
+            rows = get_history().recent(RECENT_LINKS)
+        except Exception as e:
+            _dbg(f"history err: {e}")
+            rows = []
+        if not rows:
+            m.addAction("(no uploads yet)").setEnabled(False)
+            return
+        for r in rows:
+            ts = time.strftime("%m-%d %H:%M", time.localtime(r.uploaded))
+            act = m.addAction(f"{ts}  {r.name}")
+            act.setToolTip(r.link)
+            act.triggered.connect(lambda _=False, link=r.link: self._copy_recent(link))
+
+    def _copy_recent(self, link: str) -> None:
+        try:
+            copy_to_clipboard(link)
+        except Exception as e:
+            _dbg(f"clipboard err: {e}")
+            return
+        if self.tray:
+            self.tray.showMessage("SS2GDrive", f"Link copied:\n{link}", QSystemTrayIcon.Information, 2000)
+
     # ---------- helpers ----------
 
     def _mime_from_settings(self) -> str:
-        st = load_settings()
-        fmt = (st.get("image_format") or "png").lower()
+        fmt = get_settings().image_format
         return "image/jpeg" if fmt in ("jpg", "jpeg") else "image/png"
 
     def _open_settings(self) -> None:
@@ -133,60 +226,111 @@ class TrayApp:
 
     def on_shot(self) -> None:
         """Snap & Upload（UI非ブロッキング、失敗はダイアログ）。ポータル不調は1回だけ自動リトライ。"""
+        self._run_shot(self._portal_shot)
+
+    def on_shot_last(self) -> None:
+        """前回の矩形をダイアログ無しで（ScreenCast の復元セッションを保持して使い回す）"""
+        rect = get_last_region()
+        warm_up()
+        if not rect:
+            # まだ矩形が無ければ GUI スレッドで一度だけ選ばせる
+            try:
+                rect = select_rect()
+            except RuntimeError as e:
+                _dbg(f"select canceled: {e}")
+                return
+        rect = tuple(rect)
+        self._run_shot(lambda: get_fast_shooter().shoot(rect, on_link=self._early_link), last=True)
+
+    def _portal_shot(self) -> str:
+        warm_up()   # ポータルのダイアログ中にトークン・接続を用意
+        # 1回目
+        _dbg("take_interactive_screenshot() [attempt 1]")
+        try:
+            path = take_interactive_screenshot()
+        except PortalError as e1:
+            _dbg(f"portal error attempt1: {e1}")
+            self._user_wait += screenshot_portal.last_user_wait
+            # 短い待ちを挟んで1回だけ再試行
+            time.sleep(float(os.environ.get("SS2GD_SHOT_RETRY_DELAY", "0.6")))
+            _dbg("take_interactive_screenshot() [attempt 2]")
+            try:
+                path = take_interactive_screenshot()
+            finally:
+                self._user_wait += screenshot_portal.last_user_wait
+        else:
+            self._user_wait += screenshot_portal.last_user_wait
+
+        _dbg(f"screenshot path: {path!r}")
+        if not path or not os.path.exists(path):
+            raise RuntimeError("Screenshot canceled or not saved")
+
+        mime = self._mime_from_settings()
+        base = time.strftime("SS_%Y%m%d_%H%M%S")
+        _dbg(f"upload_and_share({mime}, {base})")
+        return upload_and_share(path, mime, base, on_link=self._early_link)
+
+    def _early_link(self, link: str) -> None:
+        """ID を先取りできた時：アップロード完了前にリンクをクリップボードへ（GUI スレッドで）"""
+        self._copied_link = link
+        def copy() -> None:
+            try:
+                copy_to_clipboard(link); _keep_clipboard_alive(2000)
+            except Exception as e:
+                _dbg(f"clipboard err: {e}")
+        self._invoker.call_signal.emit(copy)
+
+    def _run_shot(self, capture, last: bool = False) -> None:
         # ★ 多重起動防止（ボタンの有効/無効とは別レイヤ）
         if not self._shot_lock.acquire(False):
             _dbg("shot is already running; ignore")
             return
 
-        btn = getattr(self, "btn_shot", None)
+        self._copied_link = None
+        self._user_wait = 0.0
+        btn = getattr(self, "btn_last" if last else "btn_shot", None)
+        label = btn.text() if btn else ""
         if btn:
             btn.setEnabled(False); btn.setText("Working…")
 
         def worker() -> None:
             link = None; err = None
             try:
-                # 1回目
-                _dbg("take_interactive_screenshot() [attempt 1]")
-                try:
-                    path = take_interactive_screenshot()
-                except PortalError as e1:
-                    _dbg(f"portal error attempt1: {e1}")
-                    # 短い待ちを挟んで1回だけ再試行
-                    time.sleep(float(os.environ.get("SS2GD_SHOT_RETRY_DELAY", "0.6")))
-                    _dbg("take_interactive_screenshot() [attempt 2]")
-                    path = take_interactive_screenshot()
-
-                _dbg(f"screenshot path: {path!r}")
-                if not path or not os.path.exists(path):
-                    raise RuntimeError("Screenshot canceled or not saved")
-
-                mime = self._mime_from_settings()
-                base = time.strftime("SS_%Y%m%d_%H%M%S")
-                _dbg(f"upload_and_share({mime}, {base})")
-                link = upload_and_share(path, mime, base)
-                _dbg(f"uploaded: {link}")
-            except Exception as e:
-                err = str(e); _dbg(f"error: {err}")
+                # span はこのスレッドで開いて閉じる（子の span と同じ tid、GUI への受け渡し待ちを含めない）
+                with span("shot", last=last) as sp:
+                    t0 = time.perf_counter()
+                    try:
+                        link = capture()
+                        _dbg(f"uploaded: {link}")
+                        get_warmstart().record_shot(time.perf_counter() - t0 - self._user_wait)
+                    except Exception as e:
+                        err = str(e); _dbg(f"error: {err}")
+                        sp.set(error=err)
             finally:
                 # GUIスレッドへディスパッチ
                 def finish() -> None:
                     _dbg("finish() on GUI thread")
                     if btn:
-                        btn.setEnabled(True); btn.setText("Snap & Upload")
+                        btn.setEnabled(True); btn.setText(label)
                     if link:
                         try:
                             copy_to_clipboard(link); _keep_clipboard_alive(2000)
                         except Exception as e2:
                             _dbg(f"clipboard err: {e2}")
                         try:
-                            QDesktopServices.openUrl(QUrl(link))
+                            with span("browser.open"): QDesktopServices.openUrl(QUrl(link))
                         except Exception as e3:
                             _dbg(f"QDesktopServices err: {e3}")
                             try: webbrowser.open(link)
                             except Exception as e4: _dbg(f"webbrowser err: {e4}")
+                        tracing.flush()
                     else:
+                        tracing.flush()
+                        stale = ("\n\nThe link already copied to the clipboard will not work."
+                                 if self._copied_link else "")
                         QMessageBox.critical(self.win if self.win else None, "SS2GDrive",
-                                             f"Snap & Upload failed:\n{err or 'unknown error'}")
+                                             f"Snap & Upload failed:\n{err or 'unknown error'}{stale}")
+                    self._show_status()
                     # ★ ロック解除
                     try: self._shot_lock.release()
                     except Exception: pass
@@ -198,7 +342,14 @@ class TrayApp:
     # ---------- lifecycle ----------
 
     def run(self) -> None:
-        self.app.exec()
+        try:
+            self.app.exec()
+        finally:
+            # 保持している ScreenCast セッションを閉じる
+            get_fast_shooter().close()
+            get_retention().stop()
+            get_token_refresher().stop()
+            get_warmstart().stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+# app/ss2gd/warmstart.py
+"""
+トレイ起動後のウォームスタート（重い部品を先に読み込んでおく）。
+
+TrayApp はメニューを作るだけなので、その日最初の「Snap & Upload」が
+  Drive クライアントの import → トークン読み込み・更新 → サービス構築・接続 → D-Bus 接続・ポータル起動
+を全部払って遅くなる。トレイが出た後、低優先度のバックグラウンドスレッドでこれを段階的に済ませる。
+  - 各段は独立。失敗しても次へ進む（未サインインなら credentials 以降の Drive 段は飛ばす）
+  - スレッドは nice（SS2GD_WARMSTART_NICE）＋ I/O idle。段の間で少し譲り、GUI スレッドを詰まらせない
+    （nice / ioprio は子スレッドに引き継がれるので、撮影でも使う常駐スレッドは下げる前に作る）
+  - 進み具合は on_progress(state) で通知（トレイのツールチップに出す）
+  - SS2GD_WARMSTART=0 で無効、SS2GD_WARMSTART_DELAY 秒後に始める
+「前回の矩形」用の ScreenCast セッションは先に開かない（起動直後から画面共有中の表示が出るため）。
+
+効果は最初のスナップと 2 枚目以降の所要時間（ユーザーの操作待ちを除く）で比べる。
+プロセスごとの値を CFG_DIR/latency.json に残す（warm の有無で first_ms / steady_ms を見比べる）。
+"""
+from __future__ import annotations
+import os, sys, json, time, statistics, threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import CFG_DIR
+from . import tracing
+from .tracing import span
+
+DEBUG = bool(os.environ.get("SS2GD_DEBUG"))
+def _dbg(msg: str) -> None:
+    if DEBUG: print(f"[warm] {msg}", file=sys.stderr, flush=True)
+
+ENABLED = os.environ.get("SS2GD_WARMSTART", "1").lower() not in ("0", "no", "false")
+DELAY = float(os.environ.get("SS2GD_WARMSTART_DELAY") or 1.5)
+NICE = int(os.environ.get("SS2GD_WARMSTART_NICE") or 10)
+YIELD = 0.05            # 段の間に GUI へ譲る秒数
+LATENCY_PATH = CFG_DIR / "latency.json"
+KEEP_SESSIONS = 30
+
+# ---- 段 ----
+
+def _import_client() -> None:
+    from .drive_uploader import import_client
+    import_client()
+
+def _credentials() -> bool:
+    from .token_refresher import get_token_refresher
+    creds = get_token_refresher().credentials()
+    return bool(creds and creds.valid)
+
+def _service() -> None:
+    from .drive_uploader import warm_up
+    warm_up(background=False)
+
+def _portal() -> None:
+    from .screenshot_portal import warm_portal
+    warm_portal()
+
+# (名前, 関数, サインインが必要か)
+STAGES: List[Tuple[str, Callable[[], Any], bool]] = [
+    ("import", _import_client, False),
+    ("credentials", _credentials, False),
+    ("service", _service, True),
+    ("portal", _portal, False),
+]
+
+def _start_shared_threads() -> None:
+    """撮影・アップロードと共有する常駐スレッドを、優先度を下げる前に作っておく。
+    async クライアントのイベントループは最初に触ったスレッドの nice / ioprio を引き継ぐ（下げた nice は戻せない）"""
+    from .drive_uploader import CLIENT
+    if CLIENT == "async":
+        from .drive_async import _get_loop
+        _get_loop()
+
+def _lower_priority() -> None:
+    """呼び出したスレッドだけ nice を上げ、I/O を idle クラスに（Linux はスレッド単位）"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICE)
+    except (AttributeError, OSError) as e:
+        _dbg(f"setpriority failed: {e}")
+    try:
+        from .stream_upload import _ioprio_idle
+        _ioprio_idle()
+    except Exception as e:
+        _dbg(f"ioprio failed: {e}")
+
+class WarmStart:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+        self.state: Dict[str, Any] = {"stage": None, "done": [], "failed": [], "signed_in": None, "ms": {}}
+        # レイテンシ（ユーザーの操作待ちを除く秒数）
+        self._shots: List[float] = []
+        self._started = time.time()
+
+    # ---- preload ----
+    def start(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+              delay: float = DELAY) -> None:
+        if not ENABLED:
+            _dbg("disabled")
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(on_progress, delay),
+                                            name="ss2gd-warmstart", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """同期版（ベンチなど）。戻り: state"""
+        self._run(on_progress, 0.0)
+        return self.state
+
+    def _notify(self, on_progress) -> None:
+        if on_progress:
+            try: on_progress(dict(self.state))
+            except Exception as e: _dbg(f"progress callback: {e}")
+
+    def _run(self, on_progress, delay: float) -> None:
+        if delay and self._stop.wait(delay):
+            return
+        try:
+            _start_shared_threads()
+        except Exception as e:
+            _dbg(f"shared threads: {e}")
+        _lower_priority()
+        with span("warmstart") as sp:
+            for name, fn, need_auth in STAGES:
+                if self._stop.is_set():
+                    return
+                if need_auth and not self.state["signed_in"]:
+                    continue
+                self.state["stage"] = name
+                self._notify(on_progress)
+                t0 = time.perf_counter()
+                try:
+                    with span(f"warmstart.{name}"):
+                        r = fn()
+                    if name == "credentials":
+                        self.state["signed_in"] = r
+                    self.state["done"].append(name)
+                except Exception as e:
+                    _dbg(f"{name} failed: {e}")
+                    self.state["failed"].append(name)
+                self.state["ms"][name] = int((time.perf_counter() - t0) * 1000)
+                _dbg(f"{name}: {self.state['ms'][name]} ms")
+                self._stop.wait(YIELD)
+            self.state["stage"] = None
+            sp.set(**{f"{k}_ms": v for k, v in self.state["ms"].items()})
+        self.ready.set()
+        self._notify(on_progress)
+
+    def describe(self) -> str:
+        """ツールチップ用の一行"""
+        st = self.state
+        if not ENABLED:
+            text = ""
+        elif not self.ready.is_set():
+            text = f"warming up ({st['stage'] or 'waiting'}…)"
+        elif st["signed_in"] is False:
+            text = "not signed in"
+        else:
+            text = "ready" + (f" ({', '.join(st['failed'])} failed)" if st["failed"] else "")
+        lat = self.latency()
+        if lat.get("first_ms") is not None:
+            text += f" · first snap {lat['first_ms'] / 1000:.1f}s"
+            if lat.get("steady_ms") is not None:
+                text += f" / steady {lat['steady_ms'] / 1000:.1f}s"
+        return text.lstrip(" ·")
+
+    # ---- latency ----
+    def record_shot(self, seconds: float) -> None:
+        """1 回のスナップの所要秒数（ユーザーの操作待ちを除く）"""
+        warm = self.ready.is_set()
+        with self._lock:
+            first = not self._shots
+            self._shots.append(seconds)
+            if first:
+                self.state["ready_at_first"] = warm
+        tracing.instant("shot.latency", ms=int(seconds * 1000), first=first, warm=warm)
+        _dbg(f"shot latency {seconds:.3f}s first={first} warm={warm}")
+        try:
+            self._save()
+        except Exception as e:
+            _dbg(f"latency save failed: {e}")
+
+    def latency(self) -> Dict[str, Any]:
+        with self._lock:
+            shots = list(self._shots)
+        if not shots:
+            return {"first_ms": None, "steady_ms": None, "n": 0}
+        steady = statistics.median(shots[1:]) if len(shots) > 1 else None
+        return {"first_ms": int(shots[0] * 1000),
+                "steady_ms": int(steady * 1000) if steady is not None else None,
+                "n": len(shots)}
+
+    def _save(self) -> None:
+        """プロセスごとに 1 行（同じプロセスの行は上書き）。最新 KEEP_SESSIONS 件"""
+        try:
+            rows = json.loads(LATENCY_PATH.read_text(encoding="utf-8"))
+            if not isinstance(rows, list):
+                rows = []
+        except Exception:
+            rows = []
+        key = f"{os.getpid()}:{int(self._started)}"
+        rows = [r for r in rows if r.get("session") != key]
+        rows.append({"session": key, "started": int(self._started), "warmstart": ENABLED,
+                     "ready_at_first": self.state.get("ready_at_first"), **self.latency()})
+        LATENCY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = LATENCY_PATH.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(rows[-KEEP_SESSIONS:], ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, LATENCY_PATH)
+
+_warmstart: Optional[WarmStart] = None
+
+def get_warmstart() -> WarmStart:
+    global _warmstart
+    if _warmstart is None:
+        _warmstart = WarmStart()
+    return _warmstart
+
+__all__ = ["WarmStart", "get_warmstart", "STAGES", "LATENCY_PATH"]
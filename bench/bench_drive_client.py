@@ -0,0 +1,82 @@
+# bench/bench_drive_client.py
+"""
+Drive クライアントの比較：googleapiclient（スレッドで並列） vs drive_async（1 つのイベントループ）。
+
+  python bench/bench_drive_client.py [--uploads 16] [--kb 500] [--latency-ms 20] [--connect-ms 50]
+
+ローカルの fake_drive に向け、クライアントごとに新しいプロセスで測る。
+  import_s   : ss2gd.drive_uploader と使うクライアントの import にかかった秒数
+  rss_mb     : プロセスの最大 RSS
+  threads    : アップロード中のスレッド数の最大
+  upload_s   : --uploads 本を同時にアップロードしてリンクが揃うまで
+  MBps       : 合計サイズ / upload_s
+"""
+from __future__ import annotations
+import os, sys, json, argparse, tempfile, subprocess
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import synth
+from run import _prepare_home
+from fake_drive import FakeDriveServer
+
+CHILD = r"""
+import os, sys, json, time, resource, threading
+sys.path.insert(0, sys.argv[1])
+n, path, client = int(sys.argv[2]), sys.argv[3], os.environ["SS2GD_DRIVE_CLIENT"]
+t0 = time.perf_counter()
+from ss2gd import drive_uploader
+if client == "async":
+    from ss2gd import drive_async
+else:
+    import googleapiclient.discovery, googleapiclient.http, httplib2, google_auth_httplib2
+t_import = time.perf_counter() - t0
+peak = [threading.active_count()]
+def sample():
+    while True:
+        peak[0] = max(peak[0], threading.active_count()); time.sleep(0.01)
+threading.Thread(target=sample, daemon=True).start()
+t0 = time.perf_counter()
+if client == "async":
+    import asyncio
+    async def many():
+        return await asyncio.gather(*[drive_async.upload_and_share_async(path, "image/png", "bench") for _ in range(n)])
+    links = drive_async.run(many())
+else:
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(n) as ex:
+        links = list(ex.map(lambda _i: drive_uploader.upload_and_share(path, "image/png", "bench"), range(n)))
+dt = time.perf_counter() - t0
+assert len(links) == n
+print(json.dumps({"import_s": t_import, "upload_s": dt, "threads": peak[0],
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--uploads", type=int, default=16)
+    ap.add_argument("--kb", type=int, default=500, help="size of each upload")
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--connect-ms", type=float, default=50.0)
+    a = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="ss2gd-client-")
+    _prepare_home(tmp)
+    blob = os.path.join(tmp, "shot.png")
+    synth.write_blob(blob, a.kb << 10)
+    with FakeDriveServer(latency_ms=a.latency_ms, connect_ms=a.connect_ms) as srv:
+        for client in ("googleapiclient", "async"):
+            env = dict(os.environ, SS2GD_DRIVE_ENDPOINT=srv.endpoint, SS2GD_DRIVE_CLIENT=client)
+            p = subprocess.run([sys.executable, "-c", CHILD, str(HERE.parent / "app"), str(a.uploads), blob],
+                               env=env, capture_output=True, text=True)
+            if p.returncode != 0:
+                print(f"{client:<16} SKIP: {(p.stderr.strip().splitlines() or ['failed'])[-1]}")
+                continue
+            r = json.loads(p.stdout.strip().splitlines()[-1])
+            mbps = a.uploads * (a.kb << 10) / 1e6 / max(r["upload_s"], 1e-9)
+            print(f"{client:<16} import_s={r['import_s']:.3f}  rss_mb={r['rss_mb']:.1f}  threads={r['threads']}"
+                  f"  upload_s={r['upload_s']:.3f}  MBps={mbps:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench/bench_dual.py
+"""
+保存用＋共有用の 2 本を書く方法の比較：dual（1 本のパイプラインで tee） vs 録画後に再エンコード。
+
+  python bench/bench_dual.py [--frames 300] [--rect 0,0,1920,1080] [--archive-kbps 8000]
+                             [--share-kbps 1000] [--share-height 720]
+
+recorder の _build_gst_args をそのまま使い、入力だけを非ライブの videotestsrc / audiotestsrc に
+差し替えて全速で流す（bench_scale と同じ）。
+  sequential : 保存用だけを録画 → それをデコードして共有用にエンコードし直す（今までの運用）
+  dual       : 切り出した生の映像・音声を tee で 2 つのエンコーダへ
+  cpu_s      : gst-launch の user+sys 秒（子プロセスの合計）
+  wall_s     : 経過秒
+  archive_bytes / share_bytes : 出力の大きさ
+"""
+from __future__ import annotations
+import os, sys, time, shutil, resource, argparse, tempfile, subprocess
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+def _child_cpu() -> float:
+    r = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return r.ru_utime + r.ru_stime
+
+def _run(args: List[str]) -> float:
+    c0 = _child_cpu()
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+    return _child_cpu() - c0
+
+def _pipeline(rect, frames: int, out: str, archive, share=None) -> List[str]:
+    from ss2gd import recorder
+    plan = [{"node_id": 0, "size": (rect[2], rect[3]), "crop": (0, 0, 0, 0), "xpos": 0, "ypos": 0}]
+    def vsrc(_fd, _node, size, *_a, **_kw):
+        w, h = size
+        return ["videotestsrc", f"num-buffers={frames}", "pattern=ball",
+                "!", f"video/x-raw,width={int(w)},height={int(h)},framerate=30/1"]
+    def asrc(_dev):
+        # 1 バッファ = 1 フレーム分（48000 / 30）
+        return ["audiotestsrc", f"num-buffers={frames}", "samplesperbuffer=1600", "wave=ticks",
+                "!", "audio/x-raw,rate=48000"]
+    saved = recorder._video_src, recorder._audio_src, recorder._file_sink
+    recorder._video_src, recorder._audio_src = vsrc, asrc
+    recorder._file_sink = lambda path: ["filesink", f"location={path}"]   # 全速で流す（sync しない）
+    try:
+        args = recorder._build_gst_args(0, plan, tuple(rect), 30, out, "bench", archive=archive, share=share,
+                                        scale=1.0, pixel_mode="physical", max_size=(0, 0))
+    finally:
+        recorder._video_src, recorder._audio_src, recorder._file_sink = saved
+    return args
+
+def _reencode(src: str, out: str, share, size) -> List[str]:
+    """保存用の WebM → 共有用（今までの「後から作り直す」手順）"""
+    w, h = size
+    return ["gst-launch-1.0", "-q",
+            "webmmux", "name=mux", "!", "filesink", f"location={out}",
+            "filesrc", f"location={src}", "!", "matroskademux", "name=d",
+            "d.video_0", "!", "queue", "!", "vp8dec", "!", "videoconvert", "!", "videoscale",
+            "!", f"video/x-raw,format=I420,width={w},height={h}",
+            "!", "vp8enc", "deadline=1", "threads=4", f"target-bitrate={share.video_kbps * 1000}",
+            "!", "queue", "!", "mux.",
+            "d.audio_0", "!", "queue", "!", "opusdec", "!", "audioconvert", "!", "audioresample",
+            "!", "opusenc", f"bitrate={share.audio_kbps * 1000}", "!", "queue", "!", "mux."]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--rect", default="0,0,1920,1080", help="x,y,w,h of the recorded region")
+    ap.add_argument("--archive-kbps", type=int, default=8000)
+    ap.add_argument("--share-kbps", type=int, default=1000)
+    ap.add_argument("--share-height", type=int, default=720)
+    a = ap.parse_args()
+    if not shutil.which("gst-launch-1.0"):
+        sys.exit("gst-launch-1.0 not found")
+    from ss2gd.config import EncodeProfile, SHARE_PROFILE
+    from ss2gd.recorder import share_path, _fit
+    rect = tuple(int(v) for v in a.rect.split(","))
+    archive = EncodeProfile(video_kbps=a.archive_kbps)
+    share = EncodeProfile(video_kbps=a.share_kbps, audio_kbps=SHARE_PROFILE.audio_kbps,
+                          max_width=0, max_height=a.share_height)
+    size = _fit(rect[2], rect[3], share.max_width, share.max_height)
+    tmp = tempfile.mkdtemp(prefix="ss2gd-dual-")
+    rows: Dict[str, Dict[str, float]] = {}
+    try:
+        # sequential
+        arch = os.path.join(tmp, "REC_seq.webm")
+        t0 = time.perf_counter()
+        cpu = _run(_pipeline(rect, a.frames, arch, archive))
+        cpu += _run(_reencode(arch, share_path(arch), share, size))
+        rows["sequential"] = {"cpu_s": cpu, "wall_s": time.perf_counter() - t0,
+                              "archive_bytes": os.path.getsize(arch), "share_bytes": os.path.getsize(share_path(arch))}
+        # dual
+        arch = os.path.join(tmp, "REC_dual.webm")
+        t0 = time.perf_counter()
+        cpu = _run(_pipeline(rect, a.frames, arch, archive, share))
+        rows["dual"] = {"cpu_s": cpu, "wall_s": time.perf_counter() - t0,
+                        "archive_bytes": os.path.getsize(arch), "share_bytes": os.path.getsize(share_path(arch))}
+        print(f"{rect[2]}x{rect[3]} -> share {size[0]}x{size[1]}, {a.frames} frames")
+        for name, r in rows.items():
+            print(f"  {name:<11} cpu_s={r['cpu_s']:.2f}  wall_s={r['wall_s']:.2f}"
+                  f"  archive_bytes={int(r['archive_bytes'])}  share_bytes={int(r['share_bytes'])}")
+        print(f"  dual/sequential cpu={rows['dual']['cpu_s'] / max(rows['sequential']['cpu_s'], 1e-9):.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
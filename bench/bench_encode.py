@@ -0,0 +1,62 @@
+# bench/bench_encode.py
+"""
+大きなスクリーンショットの PNG エンコード：1 スレッドの zlib vs image_encoder（並列 deflate）。
+
+  python bench/bench_encode.py [--mon 8k multi] [--threads 1 4 8] [--level 6]
+
+synth の合成画像（8K / マルチモニタの外接矩形）を使う。
+  encode_s     : エンコード全体の秒数
+  first_byte_s : 最初の IDAT が出るまで（ここからアップロードを始められる）
+  MPps         : メガピクセル / 秒
+  size_bytes   : 出力 PNG の大きさ（1 スレッド zlib との差が圧縮率の損失）
+"""
+from __future__ import annotations
+import os, sys, time, zlib, argparse
+from pathlib import Path
+from typing import Dict, List
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent / "app"))
+
+import synth
+from ss2gd.image_encoder import encode_png
+
+def single(rgb: bytes, w: int, h: int, level: int) -> Dict[str, float]:
+    """gst の pngenc 相当：フィルタ後の全体を 1 回の zlib.compress"""
+    t0 = time.perf_counter()
+    stride = w * 3
+    raw = b"".join(b"\x00" + rgb[y * stride:(y + 1) * stride] for y in range(h))
+    n = len(zlib.compress(raw, level))
+    dt = time.perf_counter() - t0
+    return {"encode_s": dt, "first_byte_s": dt, "size_bytes": n}
+
+def parallel(rgb: bytes, w: int, h: int, level: int, threads: int) -> Dict[str, float]:
+    first: List[float] = []
+    t0 = time.perf_counter()
+    def out(b: bytes) -> None:
+        if not first and b[4:8] == b"IDAT":
+            first.append(time.perf_counter() - t0)
+    n = encode_png(rgb, w, h, out, level=level, threads=threads)
+    dt = time.perf_counter() - t0
+    return {"encode_s": dt, "first_byte_s": first[0] if first else dt, "size_bytes": n}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mon", nargs="*", default=["8k", "multi"], choices=list(synth.MONITORS))
+    ap.add_argument("--threads", nargs="*", type=int, default=sorted({1, os.cpu_count() or 1}))
+    ap.add_argument("--level", type=int, default=6)
+    a = ap.parse_args()
+    for mon in a.mon:
+        w, h = synth.bbox(synth.MONITORS[mon])
+        rgb = synth.make_rgb(w, h)
+        mp = w * h / 1e6
+        rows = [("zlib-1thread", single(rgb, w, h, a.level))]
+        rows += [(f"parallel-{t}", parallel(rgb, w, h, a.level, t)) for t in a.threads]
+        print(f"{mon} ({w}x{h}, {mp:.1f} MP)")
+        for name, r in rows:
+            print(f"  {name:<14} encode_s={r['encode_s']:.3f}  first_byte_s={r['first_byte_s']:.3f}"
+                  f"  MPps={mp / max(r['encode_s'], 1e-9):.1f}  size_bytes={int(r['size_bytes'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench/bench_first_shot.py
+"""
+トレイのウォームスタート：起動直後の最初のスナップと 2 枚目以降の所要時間。
+
+  python bench/bench_first_shot.py [--shots 4] [--idle 2] [--client googleapiclient|async]
+                                   [--latency-ms 20] [--connect-ms 50]
+
+fake_portal（専用の dbus-daemon）と fake_drive に向け、条件ごとに新しいプロセスで測る。
+子プロセスはトレイと同じモジュールを import した状態から始める（＝トレイが出た直後）。
+  cold : そのまま撮る
+  warm : warmstart の全段を済ませ、--idle 秒置いてから撮る
+  first_s      : 1 枚目（ポータル呼び出し→リンク。ダイアログ待ちは除く）
+  steady_s     : 2 枚目以降の中央値
+  warmstart_ms : 段ごとの所要（warm のみ）
+"""
+from __future__ import annotations
+import os, sys, json, argparse, tempfile, subprocess
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import synth
+from run import _prepare_home
+from fake_drive import FakeDriveServer
+
+CHILD = r"""
+import os, sys, json, time, statistics
+sys.path.insert(0, sys.argv[1])
+n, warm, idle = int(sys.argv[2]), sys.argv[3] == "warm", float(sys.argv[4])
+from ss2gd import screenshot_portal, drive_uploader, warmstart
+ms = {}
+if warm:
+    ms = warmstart.get_warmstart().run()["ms"]
+    time.sleep(idle)
+times = []
+for i in range(n):
+    t0 = time.perf_counter()
+    path = screenshot_portal.take_interactive_screenshot()
+    link = drive_uploader.upload_and_share(path, "image/png", os.path.basename(path))
+    assert link.startswith("https://")
+    times.append(time.perf_counter() - t0 - screenshot_portal.last_user_wait)
+    os.remove(path)
+print(json.dumps({"first_s": times[0], "steady_s": statistics.median(times[1:] or times), "warmstart_ms": ms}))
+"""
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--shots", type=int, default=4)
+    ap.add_argument("--idle", type=float, default=2.0, help="seconds between warm-start and the first snap")
+    ap.add_argument("--client", default="googleapiclient", choices=["googleapiclient", "async"])
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--connect-ms", type=float, default=50.0)
+    a = ap.parse_args()
+    try:
+        from fake_portal import PrivateSessionBus, FakePortal
+    except Exception as e:
+        print(f"SKIP: fake_portal unavailable ({e.__class__.__name__}: {e})")
+        return
+    tmp = tempfile.mkdtemp(prefix="ss2gd-first-")
+    _prepare_home(tmp)
+    w, h = synth.bbox(synth.MONITORS["4k"])
+    png = os.path.join(tmp, "shot-4k.png")
+    synth.write_png(png, w, h, synth.make_rgb(w, h))
+    with FakeDriveServer(latency_ms=a.latency_ms, connect_ms=a.connect_ms) as srv, \
+         PrivateSessionBus(), FakePortal(screenshot_path=png, response_delay=0.005):
+        env = dict(os.environ, SS2GD_DRIVE_ENDPOINT=srv.endpoint, SS2GD_DRIVE_CLIENT=a.client)
+        for mode in ("cold", "warm"):
+            p = subprocess.run([sys.executable, "-c", CHILD, str(HERE.parent / "app"), str(a.shots), mode, str(a.idle)],
+                               env=env, capture_output=True, text=True)
+            if p.returncode != 0:
+                print(f"{mode:<5} SKIP: {(p.stderr.strip().splitlines() or ['failed'])[-1]}")
+                continue
+            r = json.loads(p.stdout.strip().splitlines()[-1])
+            stages = " ".join(f"{k}={v}" for k, v in r["warmstart_ms"].items())
+            print(f"{mode:<5} first_s={r['first_s']:.3f}  steady_s={r['steady_s']:.3f}"
+                  f"  first/steady={r['first_s'] / max(r['steady_s'], 1e-9):.2f}"
+                  + (f"  warmstart_ms: {stages}" if stages else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench/bench_overlay.py
+"""
+録画中の枠オーバーレイのコスト計測（要デスクトップセッション）。
+
+  python bench/bench_overlay.py [--seconds 10] [--modes off,mask,edges]
+
+モードごとに、
+  - 録画相当の負荷（videotestsrc → vp8enc の gst-launch）を流しつつ
+  - RectHintOverlayManager で枠を表示し（off は非表示）
+  - 自プロセス / gst / コンポジタ（gnome-shell, kwin, sway, Xorg 等）の CPU 時間を /proc から採取
+して比較する。枠の下の画面を動かすため、全画面の動画等を再生しながら実行すると差が出やすい。
+"""
+from __future__ import annotations
+import os, sys, time, shutil, argparse, subprocess
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+COMPOSITORS = ("gnome-shell", "kwin_wayland", "kwin_x11", "sway", "Hyprland", "weston",
+               "mutter", "Xorg", "Xwayland", "labwc", "wayfire", "river")
+_TICK = os.sysconf("SC_CLK_TCK")
+
+def _cpu_of(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _TICK
+    except Exception:
+        return None
+
+def _find_compositors() -> Dict[int, str]:
+    out = {}
+    for d in os.listdir("/proc"):
+        if not d.isdigit():
+            continue
+        try:
+            with open(f"/proc/{d}/comm") as f:
+                name = f.read().strip()
+        except Exception:
+            continue
+        if name in COMPOSITORS:
+            out[int(d)] = name
+    return out
+
+def run_mode(mode: str, seconds: float, rect) -> Dict[str, float]:
+    os.environ["SS2GD_OVERLAY_MODE"] = mode
+    from PySide6.QtCore import QRect, QEventLoop, QTimer
+    from ss2gd.ui.overlay_rect import RectHintOverlayManager
+
+    enc = subprocess.Popen(["gst-launch-1.0", "-q", "videotestsrc", "is-live=true", "pattern=ball", "!",
+                            "video/x-raw,width=1920,height=1080,framerate=30/1", "!", "vp8enc", "deadline=1",
+                            "!", "fakesink"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    mgr = RectHintOverlayManager()
+    mgr.show_rect(QRect(*rect), recording=True)
+    comps = _find_compositors()
+
+    # 表示が落ち着くまで少し待ってから採取
+    loop = QEventLoop(); QTimer.singleShot(500, loop.quit); loop.exec()
+    t0 = time.perf_counter()
+    base = {"self": _cpu_of(os.getpid()), "gst": _cpu_of(enc.pid), **{f"comp:{n}": _cpu_of(p) for p, n in comps.items()}}
+    loop = QEventLoop(); QTimer.singleShot(int(seconds * 1000), loop.quit); loop.exec()
+    wall = time.perf_counter() - t0
+    now = {"self": _cpu_of(os.getpid()), "gst": _cpu_of(enc.pid), **{f"comp:{n}": _cpu_of(p) for p, n in comps.items()}}
+
+    res = {"windows": float(mgr.window_count())}    # close() で消えるので先に数える
+    mgr.close()
+    enc.terminate(); enc.wait()
+    for k, v0 in base.items():
+        v1 = now.get(k)
+        if v0 is not None and v1 is not None:
+            res[f"{k}_pct"] = (v1 - v0) / wall * 100.0
+    return res
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--modes", default="off,mask,edges")
+    ap.add_argument("--rect", default="200,200,1280,720", help="x,y,w,h")
+    a = ap.parse_args()
+    if not shutil.which("gst-launch-1.0"):
+        sys.exit("gst-launch-1.0 not found")
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    print(f"platform: {app.platformName()}")
+    rect = tuple(int(v) for v in a.rect.split(","))
+    for mode in a.modes.split(","):
+        r = run_mode(mode.strip(), a.seconds, rect)
+        cols = "  ".join(f"{k}={v:.1f}" for k, v in sorted(r.items()))
+        print(f"{mode:<6} {cols}")
+
+if __name__ == "__main__":
+    main()
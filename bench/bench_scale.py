@@ -0,0 +1,69 @@
+# bench/bench_scale.py
+"""
+録画の出力解像度（上限 / 論理・物理ピクセル）ごとのエンコード速度とファイルサイズ。
+
+  python bench/bench_scale.py [--frames 300] [--scale 2] [--rect 0,0,1920,1080]
+
+recorder の映像チェーン（_video_chain）をそのまま使い、入力だけを非ライブの
+videotestsrc（HiDPI 画面を想定して論理サイズ × scale）に差し替えて全速で流す。
+  encode_fps : 処理フレーム数 / 経過秒
+  size_bytes : 出力 WebM の大きさ
+"""
+from __future__ import annotations
+import os, sys, time, shutil, argparse, tempfile, subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+CASES: List[Tuple[str, str, Tuple[int, int]]] = [
+    # name, pixel_mode, max_size
+    ("physical",        "physical", (0, 0)),
+    ("physical-1080p",  "physical", (0, 1080)),
+    ("physical-720p",   "physical", (0, 720)),
+    ("logical",         "logical",  (0, 0)),
+    ("logical-720p",    "logical",  (0, 720)),
+]
+
+def run_case(rect, scale: float, frames: int, pixel_mode: str, max_size, tmp: str) -> Dict[str, float]:
+    from ss2gd import recorder
+    plan = [{"node_id": 0, "size": (rect[2], rect[3]), "crop": (0, 0, 0, 0), "xpos": 0, "ypos": 0}]
+
+    def src(_fd, _node, size, *_a, **_kw):
+        w, h = size
+        return ["videotestsrc", f"num-buffers={frames}", "pattern=ball",
+                "!", f"video/x-raw,width={int(w)},height={int(h)},framerate=30/1"]
+    orig, recorder._video_src = recorder._video_src, src
+    try:
+        out = os.path.join(tmp, f"{pixel_mode}-{max_size[0]}x{max_size[1]}.webm")
+        args = ["gst-launch-1.0", "-q", *recorder._video_chain(0, plan, rect, 30, [
+            "!", "queue", "!", "vp8enc", "deadline=1", "threads=4",
+            "!", "webmmux", "!", "filesink", f"location={out}",
+        ], scale=scale, pixel_mode=pixel_mode, max_size=max_size)]
+    finally:
+        recorder._video_src = orig
+    t0 = time.perf_counter()
+    subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+    dt = time.perf_counter() - t0
+    ow, oh = recorder.output_size(rect, scale=scale, pixel_mode=pixel_mode, max_size=max_size)
+    return {"output": f"{ow}x{oh}", "encode_fps": frames / dt, "size_bytes": os.path.getsize(out)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--scale", type=float, default=2.0, help="devicePixelRatio of the simulated screen")
+    ap.add_argument("--rect", default="0,0,1920,1080", help="logical x,y,w,h")
+    a = ap.parse_args()
+    if not shutil.which("gst-launch-1.0"):
+        sys.exit("gst-launch-1.0 not found")
+    rect = tuple(int(v) for v in a.rect.split(","))
+    tmp = tempfile.mkdtemp(prefix="ss2gd-scale-")
+    try:
+        for name, mode, max_size in CASES:
+            r = run_case(rect, a.scale, a.frames, mode, max_size, tmp)
+            print(f"{name:<16} {r['output']:>10}  encode_fps={r['encode_fps']:.1f}  size_bytes={r['size_bytes']}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
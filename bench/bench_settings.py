@@ -0,0 +1,72 @@
+# bench/bench_settings.py
+"""
+設定アクセスのコスト計測（shot パス相当）。
+
+  python bench/bench_settings.py [-n 20000]
+
+一時 XDG_CONFIG_HOME に settings.json を作り、
+  - 旧実装相当（毎回 read + json.loads）
+  - get_settings()（stat のみで検証）
+  - load_settings()（変更用コピー）
+  - shot パス 1 回分（mime 判定 + upload_and_share の設定参照）
+を比較する。
+"""
+from __future__ import annotations
+import os, sys, json, time, argparse, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+def _bench(label: str, fn, n: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    us = (time.perf_counter() - t0) / n * 1e6
+    print(f"{label:<32} {us:9.2f} us/call")
+    return us
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=20000)
+    a = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ss2gd-bench-")
+    os.environ["XDG_CONFIG_HOME"] = tmp
+    from ss2gd import config
+
+    sample = {
+        "upload_folder_id": "1AbCdEfGhIjKlMnOpQrStUvWxYz",
+        "publish_anyone": True,
+        "image_format": "png",
+        "jpeg_quality": 90,
+        "audio": {"mode": "auto"},
+        "screencast_restore_token": "x" * 36,
+    }
+    config.save_settings(sample)
+    path = config.SETTINGS_PATH
+
+    def legacy():
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def shot_path():
+        st = config.get_settings()
+        _ = "image/jpeg" if st.image_format in ("jpg", "jpeg") else "image/png"
+        st = config.get_settings()
+        _ = (st.upload_folder_id, st.publish_anyone)
+
+    def shot_path_legacy():
+        st = legacy()
+        _ = (st.get("image_format") or "png").lower()
+        st = legacy()
+        _ = (st.get("upload_folder_id"), bool(st.get("publish_anyone", True)))
+
+    base = _bench("legacy read+parse", legacy, a.n)
+    hot = _bench("get_settings()", config.get_settings, a.n)
+    _bench("load_settings() (copy)", config.load_settings, a.n)
+    _bench("shot path (legacy)", shot_path_legacy, a.n)
+    _bench("shot path (cached)", shot_path, a.n)
+    print(f"speedup get_settings vs legacy: x{base / max(hot, 1e-9):.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# bench/fake_drive.py
+"""
+Drive v3 のローカル代替サーバ（ベンチ/検証用）。
+
+  python bench/fake_drive.py --port 8765 --latency-ms 40 --bandwidth-kbps 20000 --connect-ms 150
+
+アプリ側は SS2GD_DRIVE_ENDPOINT=http://127.0.0.1:8765 で向け先を差し替える。
+対応:
+  POST /upload/drive/v3/files?uploadType=resumable   → Location にセッション URI
+  PUT  <session URI>                                 → 308（途中）/ 200（完了）
+  DELETE <session URI>                               → 499（セッションの取り消し）
+  POST /upload/drive/v3/files?uploadType=multipart
+  POST /drive/v3/files                               → メタデータだけ（フォルダ作成）
+  GET  /drive/v3/files?q=name='..' and '..' in parents
+  GET  /drive/v3/files/generateIds?count=N           → 事前割り当ての ID（create の "id" で使える）
+  POST /drive/v3/files/<id>/permissions
+  GET  /drive/v3/files/<id>
+  GET  /drive/v3/about                               → 接続の温め（warm-up）用
+parents に知らないフォルダ ID があれば 404（消されたフォルダの模擬）。
+リクエスト毎の遅延（latency）、新しい接続毎の遅延（connect: DNS + TLS の模擬）、受信帯域（bandwidth）を設定できる。
+"""
+from __future__ import annotations
+import re, json, time, uuid, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+class DriveState:
+    def __init__(self, latency_ms: float = 0.0, bandwidth_kbps: float = 0.0, connect_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.connect = connect_ms / 1000.0
+        self.bandwidth = bandwidth_kbps * 1000.0 / 8.0   # bytes/s（0 = 無制限）
+        self.lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "connections": 0, "bytes_in": 0, "uploads": 0, "permissions": 0}
+
+    def new_file(self, meta: Dict[str, Any], size: int) -> Dict[str, Any]:
+        fid = meta.get("id") or uuid.uuid4().hex[:28]
+        f = dict(meta, id=fid, size=size,
+                 webViewLink=f"https://drive.google.com/file/d/{fid}/view?usp=drivesdk")
+        with self.lock:
+            self.files[fid] = f
+            self.stats["uploads"] += 1
+        return f
+
+    def missing_parent(self, meta: Dict[str, Any]) -> Optional[str]:
+        with self.lock:
+            for p in meta.get("parents") or []:
+                if p != "root" and p not in self.files:
+                    return p
+        return None
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive
+    state: DriveState
+
+    def log_message(self, *_a):  # 静かに
+        pass
+
+    def setup(self):
+        super().setup()
+        # 接続ごとに 1 回（keep-alive で使い回せば払わない）
+        with self.state.lock:
+            self.state.stats["connections"] += 1
+        if self.state.connect:
+            time.sleep(self.state.connect)
+
+    # ---- io ----
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        bw = self.state.bandwidth
+        out = bytearray()
+        t0 = time.monotonic()
+        while len(out) < n:
+            chunk = self.rfile.read(min(64 * 1024, n - len(out)))
+            if not chunk:
+                break
+            out += chunk
+            if bw > 0:
+                # 受信量に見合う時間まで待つ（帯域制限の模擬）
+                ahead = len(out) / bw - (time.monotonic() - t0)
+                if ahead > 0:
+                    time.sleep(ahead)
+        with self.state.lock:
+            self.state.stats["bytes_in"] += len(out)
+        return bytes(out)
+
+    def _send(self, code: int, obj: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(obj).encode() if obj is not None else b""
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if obj is not None:
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _begin(self):
+        with self.state.lock:
+            self.state.stats["requests"] += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        u = urlparse(self.path)
+        return u.path, {k: v[-1] for k, v in parse_qs(u.query).items()}
+
+    # ---- verbs ----
+    def do_POST(self):
+        path, q = self._begin()
+        body = self._read_body()
+        if path in ("/upload/drive/v3/files", "/drive/v3/files"):
+            if q.get("uploadType") == "multipart":
+                meta = _parse_multipart(self.headers.get("Content-Type", ""), body)[0]
+            else:
+                meta = json.loads(body or b"{}")
+            bad = self.state.missing_parent(meta)
+            if bad:
+                return self._send(404, {"error": {"code": 404, "message": f"File not found: {bad}."}})
+        if path == "/drive/v3/files":
+            return self._send(200, self.state.new_file(meta, 0))
+        if path == "/upload/drive/v3/files" and q.get("uploadType") == "resumable":
+            sid = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.sessions[sid] = {"meta": meta, "received": 0}
+            host = self.headers.get("Host")
+            return self._send(200, {}, {"Location": f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={sid}"})
+        if path == "/upload/drive/v3/files" and q.get("uploadType") == "multipart":
+            meta, size = _parse_multipart(self.headers.get("Content-Type", ""), body)
+            return self._send(200, self.state.new_file(meta, size))
+        if path.startswith("/drive/v3/files/") and path.endswith("/permissions"):
+            with self.state.lock:
+                self.state.stats["permissions"] += 1
+            return self._send(200, {"id": "anyoneWithLink", "type": "anyone", "role": "reader"})
+        return self._send(404, {"error": {"code": 404, "message": f"not found: {path}"}})
+
+    def do_PUT(self):
+        path, q = self._begin()
+        sid = q.get("upload_id")
+        with self.state.lock:
+            sess = self.state.sessions.get(sid or "")
+        body = self._read_body()
+        if not sess:
+            return self._send(404, {"error": {"code": 404, "message": "no such upload session"}})
+        sess["received"] += len(body)
+        cr = self.headers.get("Content-Range", "")
+        total = cr.rsplit("/", 1)[-1] if "/" in cr else str(sess["received"])
+        if total != "*" and sess["received"] >= int(total):
+            with self.state.lock:
+                self.state.sessions.pop(sid, None)
+            return self._send(200, self.state.new_file(sess["meta"], sess["received"]))
+        hdr = {"Range": f"bytes=0-{sess['received'] - 1}"} if sess["received"] else {}
+        return self._send(308, None, hdr)
+
+    def do_DELETE(self):
+        _path, q = self._begin()
+        with self.state.lock:
+            sess = self.state.sessions.pop(q.get("upload_id") or "", None)
+            if sess:
+                self.state.stats["cancelled"] = self.state.stats.get("cancelled", 0) + 1
+        if not sess:
+            return self._send(404, {"error": {"code": 404, "message": "no such upload session"}})
+        return self._send(499, None)
+
+    def do_GET(self):
+        path, q = self._begin()
+        if path == "/drive/v3/files":
+            # name='x' and mimeType='...' and 'parent' in parents だけ解釈
+            name = re.search(r"name='((?:[^'\\]|\\.)*)'", q.get("q", ""))
+            parent = re.search(r"'((?:[^'\\]|\\.)*)' in parents", q.get("q", ""))
+            with self.state.lock:
+                hits = [{"id": f["id"]} for f in self.state.files.values()
+                        if (not name or f.get("name") == name.group(1).replace("\\'", "'"))
+                        and (not parent or parent.group(1) in (f.get("parents") or ["root"]))]
+            return self._send(200, {"files": hits[:int(q.get("pageSize") or 100)]})
+        if path == "/drive/v3/about":
+            return self._send(200, {"kind": "drive#about"})
+        if path == "/drive/v3/files/generateIds":
+            n = int(q.get("count") or 10)
+            return self._send(200, {"kind": "drive#generatedIds", "space": "drive",
+                                    "ids": [uuid.uuid4().hex[:28] for _ in range(n)]})
+        if path.startswith("/drive/v3/files/"):
+            fid = path.rsplit("/", 1)[-1]
+            with self.state.lock:
+                f = self.state.files.get(fid)
+            if not f:
+                return self._send(404, {"error": {"code": 404, "message": "File not found"}})
+            return self._send(200, f)
+        return self._send(404, {"error": {"code": 404, "message": f"not found: {path}"}})
+
+def _parse_multipart(ctype: str, body: bytes):
+    """multipart/related の 1 パート目(JSON)とメディアサイズだけ取り出す"""
+    boundary = ctype.split("boundary=", 1)[-1].strip('"').encode()
+    parts = [p for p in body.split(b"--" + boundary) if p.strip() not in (b"", b"--")]
+    meta: Dict[str, Any] = {}
+    size = 0
+    for i, part in enumerate(parts):
+        _, _, payload = part.partition(b"\r\n\r\n")
+        payload = payload.rstrip(b"\r\n")
+        if i == 0:
+            try: meta = json.loads(payload or b"{}")
+            except Exception: meta = {}
+        else:
+            size += len(payload)
+    return meta, size
+
+class FakeDriveServer:
+    """with FakeDriveServer(latency_ms=..., bandwidth_kbps=...) as srv: srv.endpoint"""
+    def __init__(self, port: int = 0, latency_ms: float = 0.0, bandwidth_kbps: float = 0.0,
+                 connect_ms: float = 0.0):
+        self.state = DriveState(latency_ms, bandwidth_kbps, connect_ms)
+        handler = type("Handler", (_Handler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self._t: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self) -> "FakeDriveServer":
+        self._t = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._t.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self): return self.start()
+    def __exit__(self, *exc): self.stop()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--bandwidth-kbps", type=float, default=0.0)
+    ap.add_argument("--connect-ms", type=float, default=0.0)
+    a = ap.parse_args()
+    srv = FakeDriveServer(a.port, a.latency_ms, a.bandwidth_kbps, a.connect_ms)
+    print(f"fake drive on {srv.endpoint}", flush=True)
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# bench/fake_portal.py
+"""
+プライベート dbus-daemon 上の org.freedesktop.portal.Desktop 代替（Screenshot / ScreenCast）。
+
+  with PrivateSessionBus() as bus_addr:          # DBUS_SESSION_BUS_ADDRESS を差し替え
+      with FakePortal(screenshot_path=...):       # 別スレッドでサービス
+          ...
+
+Screenshot は指定ファイルの file:// URI を返す。
+ScreenCast は指定サイズのモニタを 1 つ（または複数）返し、OpenPipeWireRemote は /dev/null の fd を返す。
+録画側は SS2GD_FAKE_SOURCES=1 で pipewiresrc/pulsesrc を videotestsrc/audiotestsrc に置き換える。
+"""
+import os, re, shutil, asyncio, tempfile, threading, subprocess
+from typing import List, Optional, Sequence, Tuple
+
+from dbus_next.aio import MessageBus
+from dbus_next.service import ServiceInterface, method, signal
+from dbus_next import BusType, Variant
+
+# ※ dbus-next は型注釈文字列を D-Bus シグネチャとして読むので from __future__ import annotations は使わない
+
+PORTAL = "org.freedesktop.portal.Desktop"
+OBJ    = "/org/freedesktop/portal/desktop"
+
+class PrivateSessionBus:
+    """dbus-daemon --session を一時起動し、環境変数を差し替える"""
+    def __init__(self):
+        self.proc: Optional[subprocess.Popen] = None
+        self.address = ""
+        self._saved: Optional[str] = None
+
+    def __enter__(self) -> str:
+        exe = shutil.which("dbus-daemon")
+        if not exe:
+            raise RuntimeError("dbus-daemon not found")
+        self.proc = subprocess.Popen([exe, "--session", "--nofork", "--print-address=1"],
+                                     stdout=subprocess.PIPE, text=True)
+        self.address = self.proc.stdout.readline().strip()
+        self._saved = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+        os.environ["DBUS_SESSION_BUS_ADDRESS"] = self.address
+        return self.address
+
+    def __exit__(self, *exc):
+        if self._saved is None:
+            os.environ.pop("DBUS_SESSION_BUS_ADDRESS", None)
+        else:
+            os.environ["DBUS_SESSION_BUS_ADDRESS"] = self._saved
+        if self.proc:
+            self.proc.terminate()
+            try: self.proc.wait(timeout=3)
+            except Exception: self.proc.kill()
+
+class _Request(ServiceInterface):
+    def __init__(self):
+        super().__init__("org.freedesktop.portal.Request")
+
+    @signal()
+    def Response(self, code, results) -> "ua{sv}":
+        return [code, results]
+
+class _Base(ServiceInterface):
+    def __init__(self, name: str, portal: "FakePortal"):
+        super().__init__(name)
+        self.portal = portal
+
+    def _respond(self, token: str, results: dict, code: int = 0) -> str:
+        """Request オブジェクトを公開し、少し遅らせて Response を送る"""
+        handle = f"{OBJ}/request/ss2gd_bench/{re.sub(r'[^A-Za-z0-9_]', '_', token)}"
+        req = _Request()
+        bus = self.portal.bus
+        bus.export(handle, req)
+        def fire():
+            req.Response(code, results)
+            bus.unexport(handle, req)
+        asyncio.get_running_loop().call_later(self.portal.response_delay, fire)
+        return handle
+
+class _Screenshot(_Base):
+    def __init__(self, portal: "FakePortal"):
+        super().__init__("org.freedesktop.portal.Screenshot", portal)
+
+    @method()
+    def Screenshot(self, parent_window: "s", options: "a{sv}") -> "o":
+        tok = options.get("handle_token")
+        uri = "file://" + self.portal.screenshot_path
+        return self._respond(tok.value if tok else "shot", {"uri": Variant("s", uri)})
+
+class _ScreenCast(_Base):
+    def __init__(self, portal: "FakePortal"):
+        super().__init__("org.freedesktop.portal.ScreenCast", portal)
+
+    @method()
+    def CreateSession(self, options: "a{sv}") -> "o":
+        stok = options.get("session_handle_token")
+        sess = f"{OBJ}/session/ss2gd_bench/{stok.value if stok else 'sess'}"
+        return self._respond(options["handle_token"].value, {"session_handle": Variant("s", sess)})
+
+    @method()
+    def SelectSources(self, session: "o", options: "a{sv}") -> "o":
+        return self._respond(options["handle_token"].value, {})
+
+    @method()
+    def Start(self, session: "o", parent_window: "s", options: "a{sv}") -> "o":
+        streams = []
+        for i, (x, y, w, h) in enumerate(self.portal.monitors):
+            streams.append([40 + i, {
+                "position":    Variant("(ii)", [x, y]),
+                "size":        Variant("(ii)", [w, h]),
+                "source_type": Variant("u", 1),
+            }])
+        return self._respond(options["handle_token"].value, {
+            "streams":       Variant("a(ua{sv})", streams),
+            "restore_token": Variant("s", "ss2gd-bench-restore"),
+        })
+
+    @method()
+    def OpenPipeWireRemote(self, session: "o", options: "a{sv}") -> "h":
+        return os.open("/dev/null", os.O_RDONLY)
+
+class FakePortal:
+    """
+    別スレッドのイベントループで portal 代替を提供する。
+    monitors: [(x, y, w, h), ...]（ScreenCast のストリーム）
+    """
+    def __init__(self, screenshot_path: str = "", monitors: Sequence[Tuple[int, int, int, int]] = ((0, 0, 1920, 1080),),
+                 response_delay: float = 0.005):
+        self.screenshot_path = screenshot_path
+        self.monitors: List[Tuple[int, int, int, int]] = list(monitors)
+        self.response_delay = response_delay
+        self.bus: Optional[MessageBus] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready = threading.Event()
+        self._err: Optional[BaseException] = None
+        self._t: Optional[threading.Thread] = None
+
+    async def _serve(self) -> None:
+        self.bus = await MessageBus(bus_type=BusType.SESSION, negotiate_unix_fd=True).connect()
+        self.bus.export(OBJ, _Screenshot(self))
+        self.bus.export(OBJ, _ScreenCast(self))
+        await self.bus.request_name(PORTAL)
+        self._ready.set()
+        await self.bus.wait_for_disconnect()
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except BaseException as e:
+            self._err = e
+            self._ready.set()
+
+    def __enter__(self) -> "FakePortal":
+        self._t = threading.Thread(target=self._run, daemon=True)
+        self._t.start()
+        if not self._ready.wait(10) or self._err:
+            raise RuntimeError(f"fake portal failed to start: {self._err}")
+        return self
+
+    def __exit__(self, *exc):
+        if self._loop and self.bus:
+            self._loop.call_soon_threadsafe(self.bus.disconnect)
+        if self._t:
+            self._t.join(timeout=3)
+
+def temp_dir() -> str:
+    return tempfile.mkdtemp(prefix="ss2gd-bench-")
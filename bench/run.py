@@ -0,0 +1,339 @@
+# bench/run.py
+"""
+ヘッドレス E2E ベンチ（プレーンな Linux で動く）。
+
+  python bench/run.py                       # 全シナリオ
+  python bench/run.py shot upload-64m       # 一部だけ
+  python bench/run.py --latency-ms 40 --bandwidth-kbps 50000
+  python bench/run.py --connect-ms 150 shot-select shot-select-warm   # 接続確立が重い回線で warm-up の効果
+  python bench/run.py upload-shaped shot-during-upload   # 帯域上限と、アップロード中のスクショの割り込み
+  python bench/run.py --save-baseline bench/baseline.json
+  python bench/run.py --baseline bench/baseline.json   # 比較（悪化があれば exit 1）
+
+構成:
+  - プライベート dbus-daemon + 偽 org.freedesktop.portal.Desktop（fake_portal.py）
+  - Drive v3 のローカル代替（fake_drive.py、別プロセス。遅延・帯域を設定可）
+  - 録画は SS2GD_FAKE_SOURCES=1 で videotestsrc/audiotestsrc
+出力: シナリオ毎の time_to_link_s / throughput_MBps / cpu_s（自プロセス + 回収済み子プロセス）
+依存（dbus-next, google-api-python-client, PySide6, gst-launch-1.0）が無いシナリオは skip。
+"""
+from __future__ import annotations
+import os, sys, json, time, shutil, argparse, contextlib, resource, statistics, subprocess, tempfile, traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent / "app"))
+
+import synth
+
+# 値が小さいほど良い指標 / 大きいほど良い指標
+LOWER_IS_BETTER = ("time_", "cpu_", "size_")
+HIGHER_IS_BETTER = ("throughput_", "fps")
+
+class Skip(Exception):
+    pass
+
+# ------ environment ------
+def _cpu() -> float:
+    a = resource.getrusage(resource.RUSAGE_SELF)
+    b = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return a.ru_utime + a.ru_stime + b.ru_utime + b.ru_stime
+
+def _prepare_home(tmp: str) -> None:
+    """設定・トークン・動画置き場を一時ディレクトリに隔離"""
+    os.environ["HOME"] = tmp
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(tmp, "config")
+    cfg = Path(tmp, "config", "ss2gdrive")
+    cfg.mkdir(parents=True, exist_ok=True)
+    (cfg / "token.json").write_text(json.dumps({
+        "token": "bench-token", "refresh_token": "bench-refresh",
+        "client_id": "bench.apps.googleusercontent.com", "client_secret": "bench",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "scopes": ["https://www.googleapis.com/auth/drive.file"],
+        "expiry": "2099-01-01T00:00:00Z",
+    }))
+    (cfg / "settings.json").write_text(json.dumps({"publish_anyone": True, "audio": {"mode": "none"}}))
+
+def _start_fake_drive(latency_ms: float, bandwidth_kbps: float, connect_ms: float = 0.0) -> subprocess.Popen:
+    p = subprocess.Popen([sys.executable, str(HERE / "fake_drive.py"), "--port", "0",
+                          "--latency-ms", str(latency_ms), "--bandwidth-kbps", str(bandwidth_kbps),
+                          "--connect-ms", str(connect_ms)],
+                         stdout=subprocess.PIPE, text=True)
+    line = p.stdout.readline().strip()
+    if "http://" not in line:
+        p.kill()
+        raise RuntimeError(f"fake drive failed: {line!r}")
+    os.environ["SS2GD_DRIVE_ENDPOINT"] = line.split()[-1]
+    return p
+
+def _need(*mods: str) -> None:
+    import importlib
+    for m in mods:
+        try: importlib.import_module(m)
+        except Exception as e: raise Skip(f"{m} unavailable ({e.__class__.__name__})")
+
+def _need_exe(exe: str) -> None:
+    if not shutil.which(exe):
+        raise Skip(f"{exe} not found")
+
+# ------ scenarios ------
+def _measure(fn: Callable[[], Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    runs: List[Dict[str, Any]] = []
+    for _ in range(repeat):
+        c0, t0 = _cpu(), time.perf_counter()
+        extra = fn() or {}
+        runs.append(dict(extra, time_to_link_s=time.perf_counter() - t0, cpu_s=_cpu() - c0))
+    out: Dict[str, Any] = {}
+    for k in runs[0]:
+        vals = [r[k] for r in runs if isinstance(r.get(k), (int, float))]
+        if vals:
+            out[k] = statistics.median(vals)
+    return out
+
+def scenario_shot(ctx: Dict[str, Any], mon: str = "4k", warm: bool = False, select_s: float = 0.005) -> Dict[str, Any]:
+    _need("dbus_next", "googleapiclient")
+    _need_exe("dbus-daemon")
+    from fake_portal import PrivateSessionBus, FakePortal
+    w, h = synth.bbox(synth.MONITORS[mon])
+    png = os.path.join(ctx["tmp"], f"shot-{mon}.png")
+    size = synth.write_png(png, w, h, synth.make_rgb(w, h))
+
+    from ss2gd.screenshot_portal import take_interactive_screenshot
+    from ss2gd import drive_uploader
+    from ss2gd.drive_uploader import upload_and_share, warm_up
+    def once():
+        if warm:
+            warm_up()   # アプリと同じ：ポータルのダイアログと並行
+        else:
+            drive_uploader._take_warm()   # 前の回の残りを使わない
+        path = take_interactive_screenshot()
+        link = upload_and_share(path, "image/png", os.path.basename(path))
+        assert link.startswith("https://")
+        os.remove(path)
+        return {"size_bytes": size}
+    # select_s: ダイアログで矩形を選んでいる時間（warm-up はこの間に進む）
+    with PrivateSessionBus(), FakePortal(screenshot_path=png, response_delay=select_s):
+        r = _measure(once, ctx["repeat"])
+    r["throughput_MBps"] = size / 1e6 / max(r["time_to_link_s"], 1e-9)
+    return r
+
+def scenario_upload(ctx: Dict[str, Any], mb: int) -> Dict[str, Any]:
+    _need("googleapiclient")
+    blob = os.path.join(ctx["tmp"], f"blob-{mb}m.webm")
+    synth.write_blob(blob, mb << 20)
+    from ss2gd.drive_uploader import upload_and_share
+    def once():
+        t0, early = time.perf_counter(), {}
+        link = upload_and_share(blob, "video/webm", "bench",
+                                on_link=lambda _l: early.setdefault("t", time.perf_counter() - t0))
+        assert link.startswith("https://")
+        # 先取り ID があればアップロード前にリンクが出る（無ければ完了時と同じ）
+        return {"time_to_clipboard_s": early.get("t", time.perf_counter() - t0)}
+    r = _measure(once, ctx["repeat"])
+    r["throughput_MBps"] = (mb << 20) / 1e6 / max(r["time_to_link_s"], 1e-9)
+    return r
+
+@contextlib.contextmanager
+def _with_settings(extra: Dict[str, Any]):
+    """シナリオの間だけ settings.json に extra を足す"""
+    from ss2gd.config import load_settings, save_settings
+    old = load_settings()
+    save_settings(dict(old, **extra))
+    try: yield
+    finally: save_settings(old)
+
+def scenario_upload_shaped(ctx: Dict[str, Any], mb: int = 16, kbps: int = 40000) -> Dict[str, Any]:
+    """帯域上限（トークンバケット）を掛けたアップロード：throughput_MBps が上限付近に収まるか"""
+    _need("googleapiclient")
+    blob = os.path.join(ctx["tmp"], f"blob-{mb}m.webm")
+    synth.write_blob(blob, mb << 20)
+    from ss2gd.drive_uploader import upload_and_share
+    with _with_settings({"bandwidth": {"limit_kbps": kbps}}):
+        r = _measure(lambda: {"ok": bool(upload_and_share(blob, "video/webm", "bench"))}, ctx["repeat"])
+    r.pop("ok", None)
+    r["throughput_MBps"] = (mb << 20) / 1e6 / max(r["time_to_link_s"], 1e-9)
+    r["limit_MBps"] = kbps * 1000 / 8 / 1e6
+    return r
+
+def scenario_shot_during_upload(ctx: Dict[str, Any], mb: int = 64, kbps: int = 80000) -> Dict[str, Any]:
+    """録画のアップロード中に撮ったスクショ：チャンク境界で割り込めるか（time_to_link_s はスクショ分）"""
+    _need("googleapiclient")
+    import threading
+    blob = os.path.join(ctx["tmp"], f"blob-{mb}m.webm")
+    synth.write_blob(blob, mb << 20)
+    w, h = synth.bbox(synth.MONITORS["4k"])
+    png = os.path.join(ctx["tmp"], "shot-4k.png")
+    synth.write_png(png, w, h, synth.make_rgb(w, h))
+    from ss2gd.drive_uploader import upload_and_share
+    video: Dict[str, float] = {}
+    def once():
+        t0 = time.perf_counter()
+        th = threading.Thread(target=lambda: (upload_and_share(blob, "video/webm", "bench"),
+                                              video.setdefault("t", time.perf_counter() - t0)))
+        th.start()
+        time.sleep(1.0)
+        t1 = time.perf_counter()
+        upload_and_share(png, "image/png", "bench")
+        shot = time.perf_counter() - t1
+        th.join()
+        return {"time_shot_s": shot, "time_video_s": video.pop("t")}
+    with _with_settings({"bandwidth": {"limit_kbps": kbps}}):
+        return _measure(once, ctx["repeat"])
+
+def scenario_record(ctx: Dict[str, Any], mon: str = "1080p", seconds: float = 5.0,
+                    span: bool = False, vfr: bool = False, damage_fps: Optional[int] = None,
+                    stream: bool = False) -> Dict[str, Any]:
+    _need("dbus_next", "googleapiclient", "PySide6")
+    _need_exe("dbus-daemon"); _need_exe("gst-launch-1.0")
+    from fake_portal import PrivateSessionBus, FakePortal
+    from ss2gd import recorder
+    mons = synth.MONITORS[mon]
+    x, y, w, h = mons[0]
+    rect = (x + w // 4, y + h // 4, w // 2, h // 2)
+    if span:
+        # 1 枚目と 2 枚目のモニタにまたがる矩形（合成パイプライン）
+        rect = (x + w - 640, y + h // 4, 1280, 720)
+    res: Dict[str, Any] = {}
+    # damage_fps: 偽ソースが新しいフレームを出す頻度（ほぼ静止した画面の模擬）
+    fake_fps, recorder.FAKE_FPS = recorder.FAKE_FPS, damage_fps or recorder.FAKE_FPS
+    with PrivateSessionBus(), FakePortal(monitors=mons):
+        c0 = _cpu()
+        t_start = time.perf_counter()
+        try:
+            out = recorder.start_recording(fps=30, rect=rect, vfr=vfr, stream=stream, keep_local=False)
+        finally:
+            recorder.FAKE_FPS = fake_fps
+        rec_id = recorder.recording_id(out)
+        first = recorder.wait_first_frame(rec_id=rec_id)
+        res["streams"] = recorder.last_start_metrics(rec_id).get("streams", 1)
+        res["time_first_frame_s"] = first if first is not None else float("nan")
+        time.sleep(max(0.0, seconds - (time.perf_counter() - t_start)))
+        t_stop = time.perf_counter()
+        link = recorder.stop_recording(open_browser=False, copy_link=False)
+        res["time_to_link_s"] = time.perf_counter() - t_stop
+        res["cpu_s"] = _cpu() - c0
+        if stream:
+            # ファイルは作られない：送ったバイト数は履歴から
+            from ss2gd.history import get_history
+            size = get_history().search("", limit=1)[0].size or 0
+        else:
+            size = os.path.getsize(out)
+        res["size_bytes"] = size
+        res["throughput_MBps"] = size / 1e6 / max(res["time_to_link_s"], 1e-9)
+        assert link
+    return res
+
+SCENARIOS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "shot":          lambda c: scenario_shot(c, "4k"),
+    "shot-multi":    lambda c: scenario_shot(c, "multi"),
+    # 矩形選択に 0.5 秒：その間にトークン・接続を温めるかどうか（--connect-ms で接続確立の重さを変える）
+    "shot-select":      lambda c: scenario_shot(c, "4k", select_s=0.5),
+    "shot-select-warm": lambda c: scenario_shot(c, "4k", warm=True, select_s=0.5),
+    "upload-8m":     lambda c: scenario_upload(c, 8),
+    "upload-64m":    lambda c: scenario_upload(c, 64),
+    # 帯域上限 5 MB/s / 10 MB/s の録画アップロード中にスクショ
+    "upload-shaped":      lambda c: scenario_upload_shaped(c),
+    "shot-during-upload": lambda c: scenario_shot_during_upload(c),
+    "record":        lambda c: scenario_record(c, "1080p"),
+    "record-4k":     lambda c: scenario_record(c, "4k"),
+    "record-span":   lambda c: scenario_record(c, "multi", span=True),
+    # 録画しながらアップロード：停止→リンクは最後のチャンク分だけ
+    "record-stream": lambda c: scenario_record(c, "1080p", stream=True),
+    # 1 秒に 1 回しか変化しない画面：固定 30fps と VFR の比較（cpu_s / size_bytes）
+    "record-static":     lambda c: scenario_record(c, "1080p", seconds=10.0, damage_fps=1),
+    "record-static-vfr": lambda c: scenario_record(c, "1080p", seconds=10.0, damage_fps=1, vfr=True),
+}
+
+# ------ baseline ------
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tol: float) -> List[str]:
+    bad: List[str] = []
+    for name, cur in results.items():
+        base = baseline.get(name) or {}
+        for k, b in base.items():
+            v = cur.get(k)
+            if not isinstance(v, (int, float)) or not isinstance(b, (int, float)) or b == 0:
+                continue
+            delta = (v - b) / b
+            if k.startswith(LOWER_IS_BETTER) and delta > tol:
+                bad.append(f"{name}.{k}: {b:.4g} -> {v:.4g} (+{delta*100:.0f}%)")
+            elif k.startswith(HIGHER_IS_BETTER) and -delta > tol:
+                bad.append(f"{name}.{k}: {b:.4g} -> {v:.4g} ({delta*100:.0f}%)")
+    return bad
+
+def _print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    for name, r in results.items():
+        if "skipped" in r or "error" in r:
+            print(f"{name:<14} {'SKIP' if 'skipped' in r else 'ERROR'}: {r.get('skipped') or r.get('error')}")
+            continue
+        cols = []
+        for k, v in sorted(r.items()):
+            b = (baseline.get(name) or {}).get(k)
+            rel = f" ({(v - b) / b * 100:+.0f}%)" if isinstance(b, (int, float)) and b else ""
+            cols.append(f"{k}={v:.4g}{rel}")
+        print(f"{name:<14} " + "  ".join(cols))
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("scenarios", nargs="*", help=f"default: all ({', '.join(SCENARIOS)})")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--bandwidth-kbps", type=float, default=0.0, help="0 = unlimited")
+    ap.add_argument("--connect-ms", type=float, default=0.0, help="per-connection setup cost (DNS + TLS)")
+    ap.add_argument("--baseline", default=str(HERE / "baseline.json"))
+    ap.add_argument("--save-baseline", metavar="PATH")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    ap.add_argument("--json", metavar="PATH", help="write results as JSON")
+    a = ap.parse_args()
+
+    names = a.scenarios or list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    tmp = tempfile.mkdtemp(prefix="ss2gd-bench-")
+    _prepare_home(tmp)
+    os.environ["SS2GD_FAKE_SOURCES"] = "1"
+    drive = _start_fake_drive(a.latency_ms, a.bandwidth_kbps, a.connect_ms)
+    ctx = {"tmp": tmp, "repeat": max(1, a.repeat)}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for n in names:
+            try:
+                results[n] = SCENARIOS[n](ctx)
+            except Skip as e:
+                results[n] = {"skipped": str(e)}
+            except Exception as e:
+                results[n] = {"error": f"{e.__class__.__name__}: {e}"}
+                if os.environ.get("SS2GD_DEBUG"):
+                    traceback.print_exc()
+    finally:
+        drive.terminate()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if a.baseline and os.path.exists(a.baseline) and not a.save_baseline:
+        with open(a.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    _print_table(results, baseline)
+    measured = {k: v for k, v in results.items() if "skipped" not in v and "error" not in v}
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if a.save_baseline:
+        with open(a.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(measured, f, indent=2, sort_keys=True)
+        print(f"baseline saved: {a.save_baseline}")
+        return 0
+    if baseline:
+        bad = compare(measured, baseline, a.tolerance)
+        for b in bad:
+            print(f"REGRESSION {b}")
+        return 1 if bad else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# bench/synth.py
+"""ベンチ用の合成画像（外部ライブラリ不要）"""
+from __future__ import annotations
+import os, zlib, struct
+from typing import Tuple
+
+def make_rgb(w: int, h: int, seed: int = 1) -> bytes:
+    """
+    スクリーンショットらしい合成 RGB（ベタ塗りのパネル + 文字っぽいノイズ帯）。
+    16 行周期で行パターンを使い回すので巨大サイズでも高速に作れる。
+    """
+    rnd = bytearray(os.urandom(w * 3)) if seed else bytearray(w * 3)
+    rows = []
+    for i in range(16):
+        row = bytearray()
+        for x in range(0, w, 64):
+            n = min(64, w - x)
+            shade = (x // 64 * 37 + i * 3) & 0xFF
+            row += bytes((shade, 255 - shade, 128)) * n
+        if 4 <= i < 12:
+            # 文字列帯：一部をノイズで置き換える
+            for x0 in range(0, w * 3, 192):
+                row[x0:x0 + 48] = rnd[x0:x0 + 48]
+        rows.append(bytes(row[: w * 3]))
+    return b"".join(rows[y % 16] for y in range(h))
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+def write_png(path: str, w: int, h: int, rgb: bytes, level: int = 6) -> int:
+    stride = w * 3
+    raw = b"".join(b"\x00" + rgb[y * stride:(y + 1) * stride] for y in range(h))
+    png = (b"\x89PNG\r\n\x1a\n"
+           + _chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+           + _chunk(b"IDAT", zlib.compress(raw, level))
+           + _chunk(b"IEND", b""))
+    with open(path, "wb") as f:
+        f.write(png)
+    return len(png)
+
+def write_blob(path: str, size: int) -> None:
+    """非圧縮性のデータ（録画ファイル相当）"""
+    with open(path, "wb") as f:
+        left = size
+        block = os.urandom(1 << 20)
+        while left > 0:
+            n = min(left, len(block))
+            f.write(block[:n]); left -= n
+
+MONITORS = {
+    "1080p": [(0, 0, 1920, 1080)],
+    "4k":    [(0, 0, 3840, 2160)],
+    "8k":    [(0, 0, 7680, 4320)],
+    "multi": [(0, 0, 3840, 2160), (3840, 0, 3840, 2160), (7680, 0, 2560, 1440)],
+}
+
+def bbox(mons) -> Tuple[int, int]:
+    return (max(x + w for x, y, w, h in mons), max(y + h for x, y, w, h in mons))